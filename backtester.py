@@ -1,12 +1,21 @@
-import time
+import os
+import asyncio
+from time import perf_counter
 from tqdm import tqdm
 import numpy as np
 import pandas as pd
 from collections import defaultdict
-from utils import Status, Side
+from functools import partial
+from utils import Status
 from typing import Tuple, List, Dict
 
 from preprocessor import Preprocessor   
+from position_book import PositionBook
+from recorder import BalanceRecorder, FillRecorder
+from columnar import ColumnarFrame, LiveFrame, write_mapped_column
+from online import OnlineIndicators
+from indicator_cache import fingerprint
+from data.resample import resample_ohlcv, align_to_base
     
 class Backtesting:
     def __init__(self
@@ -14,7 +23,15 @@ class Backtesting:
                  , total_balance=10000
                  , max_strategy_cnt=5
                  , max_strategy_simultaneously_cnt=3
-                 , min_trading_amount=100):
+                 , min_trading_amount=100
+                 , use_signals=True
+                 , indicator_cache=None
+                 , timeframe=None
+                 , mmap_dir=None
+                 , record_every=1
+                 , record_events_only=False
+                 , record_sink=None
+                 , profiler=None):
         """Backtesting Infra for multi-asset, multi-strategy trading.
 
         Args:
@@ -28,75 +45,252 @@ class Backtesting:
             max_strategy_cnt (int, optional): 최대 전략 개수. Defaults to 5.
             max_strategy_simultaneously_cnt (int, optional): 동일 전략의 최대 동시 진입 개수. Defaults to 3.
             min_trading_amount (int, optional): 최소 거래 금액. Defaults to 100.
+            use_signals (bool, optional): 전략이 open_signals/close_signals를 구현했다면 벡터화 신호를 미리 계산해서 사용. Defaults to True.
+            indicator_cache (IndicatorCache, optional): 지표 캐시. 같은 데이터로 여러 번 실행할 때 지표 계산을 생략. Defaults to None.
+            timeframe (str, optional): 데이터 timeframe. 지표 캐시 key에 사용. Defaults to None.
+            mmap_dir (str, optional): datalist에 ColumnarFrame(memory-map)을 넣었을 때 생성한 지표 컬럼을 저장하고 map할 경로.
+                                      None이면 지표 컬럼은 메모리에 생성. Defaults to None.
+            record_every (int, optional): backtesting_info를 N bar마다 기록 (마지막 bar는 항상 기록). Defaults to 1.
+            record_events_only (bool, optional): backtesting_info를 진입/청산이 일어난 bar만 기록. Defaults to False.
+            record_sink (callable, optional): run_stream/arun_stream에서 기록 배열이 차면 record_sink(name, DataFrame)으로 넘기고 비움.
+                                              name은 'backtesting_info' 또는 'strategy_clear_info'. 끝나면 남은 기록도 넘기므로
+                                              backtesting_info, strategy_clear_info는 비어 있음. None이면 배열을 늘려가며 기록. Defaults to None.
+            profiler (Profiler, optional): 단계별, 전략별 시간 측정과 on_bar/on_open/on_close hook (profiler.py). Defaults to None.
         """
+        self.INITIAL_BALANCE = total_balance # 초기 자산(USDT)
         self.total_balance = total_balance # 전체 자산(USDT)
         self.remain_balance = self.total_balance # 진입 가능한 자산(USDT)
         self.enter_balance = 0
-        self.total_notional_position_size = 0
         self.MAX_STRATEGY_CNT = max_strategy_cnt    # 동시에 진입 가능한 포지션 개수
         self.MAX_STRATEGY_SIMULTANEOUSLY_CNT = max_strategy_simultaneously_cnt  # 동시에 진입 가능한 동일 전략 최대 개수  
         self.MIN_TRADING_AMOUNT = min_trading_amount
+        self.USE_SIGNALS = use_signals
+        self.TIMEFRAME = timeframe
+        self.MMAP_DIR = mmap_dir
         
         #### 전략 관리 ####
         self.strategy_list = strategy_list # 전략 객체와 파라미터 (인스턴스 생성 전)를 담아두는 리스트
         self.strategy_queue = []    # 선언된 전략 인스턴스를 담아두는 List --> 진입 가능한 전략을 체크할 때 활용
-        self.enter_strategy_list = []   # 진입한 전략 인스턴스를 담아두는 List --> Close 여부 확인
+        self.queue_index_by_asset = defaultdict(list)   # asset별 strategy_queue 위치 (queue의 위치는 진입 후에도 변하지 않음)
+        self.data_assets = []       # datalist의 asset 순서 (run에서 설정)
+        self.position_book = PositionBook()    # 진입한 전략의 포지션 상태 (enter_strategy_list는 진입 순서대로의 인스턴스) --> Close 여부 확인
+        self.asset_close = None   # (bar 수, asset 수) Close 배열. 열은 position_book.assets 순서 (run에서 설정)
         self.strategy_in_mangement = {'total': 0}   # 현재 진입 중인 전략 개수 저장 객체 -->전략이 들어갈 자리가 있는지 
+        self.open_signal_cache = {}     # 전략별 벡터화 진입 신호 (is_open, side, enter_price)
+        self.queue_open_signals = []    # strategy_queue 위치별 진입 신호 (없으면 None)
+        self.close_signal_cache = {}    # 전략별 벡터화 청산 신호 {Side.BUY: mask, Side.SELL: mask}
         
         
         #### 정보 저장 ####
-        self.strategy_clear_info = []
-        self.backtesting_info = []
+        # bar별 자산 정보, 청산 정보를 컬럼별 배열로 기록 (run에서 bar 수만큼 할당). DataFrame은 backtesting_info, strategy_clear_info
+        self.RECORD_EVERY = record_every
+        self.RECORD_EVENTS_ONLY = record_events_only
+        self.RECORD_SINK = record_sink
+        self.balance_recorder = BalanceRecorder(every=record_every, events_only=record_events_only)
+        self.fill_recorder = FillRecorder()
+        
+        ### 계측 (None이면 측정하지 않음) ###
+        self.profiler = profiler
+        # 단계별 시간 측정 (profiler.timing=False면 None이므로 bar마다 perf_counter를 호출하지 않음)
+        self.phase_timer = profiler if profiler is not None and profiler.timing else None
         
         ### 데이터 전처리기 ###
-        self.preprocessor = Preprocessor()
+        self.preprocessor = Preprocessor(cache=indicator_cache)
         
         # 진입 가능한 전략 queue에 담아두기.
         self.fill_strategy_queue()
         # 전략 별 진입 개수 관리 객체 초기화
         self.initialize_strategy_in_mangement()
         
+        #### streaming (run_stream) ####
+        self.online_indicators = {}     # asset별 OnlineIndicators
+        self.live_frames = {}           # asset별 최신 bar (LiveFrame)
+        self.stream_didx = 0            # warm-up 이후 처리한 bar 개수
+        self.stream_date = None         # 마지막으로 처리한 bar의 Date
+    
+    @property
+    def enter_strategy_list(self):
+        """진입한 전략 인스턴스 (진입 순서). 포지션 상태는 position_book에 저장"""
+        return self.position_book.strategies
+    
+    @property
+    def total_notional_position_size(self):
+        """진입 중인 포지션의 notional 합 (마지막으로 평가한 bar 기준)"""
+        return self.position_book.total_notional_position_size()
+    
+    @property
+    def backtesting_info(self) -> pd.DataFrame:
+        """bar별 자산 정보 (Date, total_balance, enter_balacne, remain_balance, entered_strategy_cnt)"""
+        return self.balance_recorder.to_frame()
+    
+    @property
+    def strategy_clear_info(self) -> pd.DataFrame:
+        """청산 정보 (Date와 StrategyManager.close가 반환한 정보)"""
+        return self.fill_recorder.to_frame()
+        
     def ready_data(self, datalist):
-        """BackTesting을 위해서 필요한 컬럼을 생성하는 부분."""
+        """BackTesting을 위해서 필요한 컬럼을 생성하는 부분.
+        
+        입력 DataFrame은 수정하지 않는다. asset마다 전략들이 필요로 하는 컬럼과 그 dependency(PANGLE_MA1920_100의 MA1920 등)를
+        계산 순서대로 한 번씩만 계산해서 ColumnarFrame에 담고 (Preprocessor.resolve),
+        지표 window로 계산한 warm-up 구간을 제외한 공통 날짜 구간으로 모든 asset을 맞춰서 반환.
+        
+            datalist = [{ 'BTCUSDT': pd.DataFrame }, { 'ETHUSDT': pd.DataFrame }]
+            -> [{ 'BTCUSDT': ColumnarFrame }, { 'ETHUSDT': ColumnarFrame }]
+        """
+        need_columns = self.need_columns()
+        
+        frames, warmups = {}, {}
+        for data_info in datalist:
+            for asset, df in data_info.items():
+                # 원본 배열을 공유하는 frame (DataFrame 컬럼은 대부분 복사 없이 view)
+                frame = df.copy() if isinstance(df, ColumnarFrame) else ColumnarFrame(df)
+                
+                # 지표 캐시, memory-map 파일 key에 사용하는 데이터 fingerprint (컬럼 추가 전 원본 기준)
+                key = None
+                if self.preprocessor.cache is not None or (self.MMAP_DIR is not None and isinstance(df, ColumnarFrame)):
+                    key = (asset, self.TIMEFRAME, fingerprint(frame))
+                
+                resampled = {}
+                for column in self.preprocessor.resolve(need_columns[asset]):
+                    if column not in frame.columns:
+                        self.make_frame_column(column, frame, key=key, resampled=resampled)
+                
+                frames[asset] = frame
+                warmups[asset] = max([self.column_warmup(frame, column) for column in need_columns[asset]], default=0)
+        
+        frames = self.align_frames(frames, warmups)
+        return [{asset: frame} for asset, frame in frames.items()]
+    
+    def need_columns(self):
+        """asset별 전략들이 필요로 하는 컬럼 (중복 제거, 순서 유지)"""
+        need_columns = defaultdict(dict)
         for strategy_instance in self.strategy_queue:
-            need_columns = strategy_instance.need_columns()
-            strategy_asset = strategy_instance.ASSET
-
-            """datalist formay example
-                datalist = [
-                            { 'BTCUSDT': pd.DataFrame },
-                            { 'ETHUSDT': pd.DataFrame }
-                           ]             
-            """
-            for data_info in datalist:
-                data_asset = list(data_info.keys())[0]
-                # data의 asset과 전략에서 다루고 있는 asset이 동일할 때 필요한 컬럼 생성.
-                if data_asset == strategy_asset:
-                    df_asset = data_info[data_asset]
-                    
-                    # Preprocessor
-                    for column in need_columns:
-                        if column not in df_asset.columns:
-                            df_asset[column] = self.preprocessor.make_column(column, df_asset) 
+            for column in strategy_instance.need_columns():
+                need_columns[strategy_instance.ASSET][column] = None
+        return need_columns
+    
+    def align_frames(self, frames, warmups):
+        """각 asset의 warm-up 이후 구간 중 모든 asset에 공통인 날짜 구간으로 자르기 (가능하면 복사 없이 slice)"""
+        if any(len(frame) <= warmups[asset] for asset, frame in frames.items()):
+            return {asset: frame.slice(len(frame)) for asset, frame in frames.items()}
+        
+        dates = {asset: np.asarray(frame['Date']) for asset, frame in frames.items()}
+        common_start = max(dates[asset][warmups[asset]] for asset in frames)
+        common_end = min(dates[asset][-1] for asset in frames)
+        
+        aligned = {}
+        for asset, frame in frames.items():
+            start = int(np.searchsorted(dates[asset], common_start, side='left'))
+            stop = int(np.searchsorted(dates[asset], common_end, side='right'))
+            aligned[asset] = frame.slice(start, max(start, stop))
+        
+        # 중간에 빠진 bar가 있어서 날짜가 어긋나면 공통 날짜만 남김 (복사)
+        aligned_dates = [np.asarray(frame['Date']) for frame in aligned.values()]
+        if any(len(d) != len(aligned_dates[0]) or (d != aligned_dates[0]).any() for d in aligned_dates[1:]):
+            common_dates = aligned_dates[0]
+            for d in aligned_dates[1:]:
+                common_dates = np.intersect1d(common_dates, d)
+            aligned = {asset: frame.take(np.isin(np.asarray(frame['Date']), common_dates)) for asset, frame in aligned.items()}
+        
+        # 원본 데이터 중간에 NaN이 있으면 모든 asset에서 해당 bar 제거
+        valid = np.logical_and.reduce([frame.valid_mask() for frame in aligned.values()])
+        if not valid.all():
+            aligned = {asset: frame.take(valid) for asset, frame in aligned.items()}
+        return aligned
+    
+    
+    def make_frame_column(self, column, frame, key=None, resampled=None):
+        """ColumnarFrame에 지표 컬럼 추가. mmap_dir이 있으면 파일로 저장 후 memory-map (다른 process도 같은 파일을 재사용)
+        
+        '4h:MA20'처럼 timeframe이 붙은 컬럼은 frame을 해당 timeframe으로 resample해서 계산한 뒤
+        이미 끝난 큰 timeframe bar의 값만 보이도록 frame의 bar에 맞춤 (look-ahead 없음).
+        resampled는 asset별 resample 결과를 재사용하기 위한 {timeframe: ColumnarFrame}.
+        """
+        path = None
+        if self.MMAP_DIR is not None and key is not None:
+            asset, _, data_fingerprint = key
+            column_dir = os.path.join(self.MMAP_DIR, f'{asset}_{data_fingerprint}')
+            os.makedirs(column_dir, exist_ok=True)
+            path = os.path.join(column_dir, f"{column.replace(':', '-')}.bin")
+            if os.path.isfile(path):
+                frame.add_mapped_column(column, path, 'float64', 0, len(frame))
+                return
+        
+        timeframe, base_column = self.preprocessor.split_timeframe(column)
+        if timeframe is None:
+            values = self.preprocessor.make_column(column, frame.to_pandas(), key=key).to_numpy()
+        else:
+            resampled = {} if resampled is None else resampled
+            if timeframe not in resampled:
+                resampled[timeframe] = ColumnarFrame.from_arrays(resample_ohlcv(frame.columns, timeframe))
+            frame_high = resampled[timeframe]
+            if base_column not in frame_high.columns:
+                key_high = None if key is None else (key[0], timeframe, fingerprint(frame_high))
+                for dependency in self.preprocessor.resolve([base_column]):
+                    if dependency not in frame_high.columns:
+                        self.make_frame_column(dependency, frame_high, key=key_high)
+            values = align_to_base(frame_high['Date'], frame_high[base_column], frame['Date'])
+        
+        if path is None:
+            frame.columns[column] = np.ascontiguousarray(values)
+        else:
+            write_mapped_column(path, values)
+            frame.add_mapped_column(column, path, 'float64', 0, len(frame))
+    
+    def column_warmup(self, frame, column) -> int:
+        """컬럼의 warm-up 길이. timeframe 컬럼은 resample 결과에 따라 달라지므로 앞쪽 NaN 개수를 직접 셈"""
+        if self.preprocessor.split_timeframe(column)[0] is None:
+            return self.preprocessor.warmup(column)
+        valid = ~np.isnan(frame[column])
+        return int(np.argmax(valid)) if valid.any() else len(frame)
+    
+    def signal_key(self, strategy_instance) -> Tuple:
+        """같은 전략 클래스, asset, 이름이면 같은 신호를 공유"""
+        return (type(strategy_instance), strategy_instance.ASSET, strategy_instance.STRATEGY_NAME)
+    
+    def ready_signals(self, frames):
+        """open_signals/close_signals를 구현한 전략의 신호를 전체 데이터에 대해 한 번만 계산."""
+        self.open_signal_cache, self.close_signal_cache = {}, {}
+        for strategy_instance in (self.strategy_queue if self.USE_SIGNALS else []):
+            key = self.signal_key(strategy_instance)
+            if key in self.open_signal_cache or strategy_instance.ASSET not in frames:
+                continue
             
-        # NaN 제거        
-        for data_info in datalist:
-            data_asset = list(data_info.keys())[0]
-            data_info[data_asset] = data_info[data_asset].dropna()
+            frame = frames[strategy_instance.ASSET]
+            open_signals = strategy_instance.open_signals(frame)
+            if open_signals is not None:
+                is_open, side, enter_price = open_signals
+                self.open_signal_cache[key] = (np.asarray(is_open, dtype=bool), np.asarray(side, dtype=object), np.asarray(enter_price))
             
-        return datalist
-    
+            close_signals = strategy_instance.close_signals(frame)
+            if close_signals is not None:
+                self.close_signal_cache[key] = {side: np.asarray(mask, dtype=bool) for side, mask in close_signals.items()}
+        
+        # queue의 같은 위치에는 같은 전략(같은 신호)이 다시 들어오므로 위치별로 저장
+        self.queue_open_signals = [self.open_signal_cache.get(self.signal_key(strategy_instance)) for strategy_instance in self.strategy_queue]
+        
+        # 진입한 포지션은 (전략, side)별 청산 신호를 position_book에서 한 번에 확인
+        self.position_book.set_close_signals({(key, side): mask for key, signals in self.close_signal_cache.items() for side, mask in signals.items()})
     
     def fill_strategy_queue(self):
         """전략을 담아 두는 list - 진입 가능한 전략 체크할 때 활용"""
         for strategy in self.strategy_list:
             # 전략 인스턴스 생성
-            strategy_instance = strategy['object'](strategy_name=strategy['parameter']['strategy_name']
-                                                   , asset=strategy['parameter']['asset']
-                                                   , trading_fee=strategy['parameter']['trading_fee'])
+            strategy_instance = self.make_strategy_instance(strategy)
             
+            self.queue_index_by_asset[strategy_instance.ASSET].append(len(self.strategy_queue))
             self.strategy_queue.append(strategy_instance)
     
+    def make_strategy_instance(self, strategy):
+        """strategy_list 항목으로 전략 인스턴스 생성. profiler가 있으면 조건 함수 시간 측정"""
+        strategy_instance = strategy['object'](strategy_name=strategy['parameter']['strategy_name']
+                                               , asset=strategy['parameter']['asset']
+                                               , trading_fee=strategy['parameter']['trading_fee'])
+        if self.profiler is not None:
+            self.profiler.wrap_strategy(strategy_instance)
+        return strategy_instance
+    
     def initialize_strategy_in_mangement(self):
         """전략마다 진입 개수를 관리하는 strategy_in_cnt를 업데이트"""
         for strategy_instance in self.strategy_queue:
@@ -129,16 +323,18 @@ class Backtesting:
         pop_instance = self.strategy_queue.pop(i)
         strategy = self.strategy_list[i]
 
-        push_instance = strategy['object'](strategy_name=strategy['parameter']['strategy_name']
-                                            , asset=strategy['parameter']['asset']
-                                            , trading_fee=strategy['parameter']['trading_fee'])
+        push_instance = self.make_strategy_instance(strategy)
         
         self.strategy_queue.insert(i, push_instance)
-        self.enter_strategy_list.append(pop_instance)
+        self.position_book.open(pop_instance, close_signal=self.close_signal_id(pop_instance))
+    
+    def close_signal_id(self, strategy_instance) -> int:
+        """position_book에 등록한 전략의 청산 신호 번호 (ready_signals 참고). 청산 신호가 없으면 -1"""
+        return self.position_book.close_signal_id((self.signal_key(strategy_instance), strategy_instance.SIDE))
         
     def update_strategy_out_list(self, idx_list):
-        """청산된 전략 enter_strategy_list에서 제거"""
-        self.enter_strategy_list = [self.enter_strategy_list[i] for i in range(len(self.enter_strategy_list)) if i not in idx_list]
+        """청산된 전략 enter_strategy_list(position_book)에서 제거"""
+        self.position_book.remove(idx_list)
         
         
     def check_slot_for_open(self, strategy_instance) -> bool:
@@ -147,23 +343,23 @@ class Backtesting:
         condition_strategy = self.strategy_in_mangement[strategy_instance.STRATEGY_NAME] < self.MAX_STRATEGY_SIMULTANEOUSLY_CNT
         return True if (condition_total and condition_strategy) else False 
     
+    def check_balance_for_open(self) -> bool:
+        """전체 진입 개수와 잔여 자금 조건. 만족하지 않으면 어떤 전략도 진입할 수 없음"""
+        return self.strategy_in_mangement['total'] < self.MAX_STRATEGY_CNT and self.remain_balance > self.MIN_TRADING_AMOUNT
+    
     def decision_enter_balance(self) -> float:
         """포지션 진입시 진입 금액 계산 - 잔여 자산 / 진입 가능한 포지션 수"""
         return self.remain_balance / (self.MAX_STRATEGY_CNT - self.strategy_in_mangement['total'])
         
-    def asset_checker(self, data, strategy_instance) -> bool:
-        """진입 전략의 asset과 data의 asset의 일치 여부 확인"""
-        return True if (list(data.keys())[0] == strategy_instance.ASSET) else False
-
-    
-    def update_backtesting_info(self, data):
-        self.backtesting_info.append({
-            'Date': data['Date'],
-            'total_balance': self.total_balance,
-            'enter_balacne': self.enter_balance,
-            'remain_balance': self.remain_balance,
-            'entered_strategy_cnt': len(self.enter_strategy_list)
-        })
+    def update_backtesting_info(self, didx, event=False, date=None, force=False):
+        self.balance_recorder.record(didx
+                                     , total_balance=self.total_balance
+                                     , enter_balance=self.enter_balance
+                                     , remain_balance=self.remain_balance
+                                     , entered_strategy_cnt=len(self.enter_strategy_list)
+                                     , event=event
+                                     , date=date
+                                     , force=force)
     
     
     def data_checker(self, datalist) -> bool:
@@ -177,84 +373,321 @@ class Backtesting:
         """
         return True
     
-    def run(self, datalist: List[Dict[str, pd.DataFrame]]):
+    def run(self, datalist: List[Dict[str, pd.DataFrame]], event_driven: bool = False, progress: bool = True):
         """ datalist = [ 
                         { 'ETHUSDT' : pd.DataFrame },
                         { 'BTCUSDT' : pd.DataFrame },
                        ]
             각 데이터들은 시간 시간이 일치해야 함. 
+            pd.DataFrame 대신 ColumnarFrame.from_store(...)로 연 memory-map frame도 가능 (mmap_dir 참고).
+            
+            event_driven=True이면 모든 전략이 open_signals/close_signals를 구현했을 때
+            신호가 발생하는 bar 사이를 건너뛰고 그 사이 자산은 벡터화해서 계산.
+            progress=False이면 진행바를 출력하지 않음 (parameter sweep 등).
         """
         assert self.data_checker(datalist), 'Check Data Condition Rules!!'
+        profiler, timer = self.profiler, self.phase_timer
+        if profiler is not None:
+            profiler.start()
+        if timer is not None:
+            start = perf_counter()
         
         # [HERE] 여기 부분에서 Data 준비.
         datalist = self.ready_data(datalist)
+        if timer is not None:
+            timer.add_phase('ready_data', start)
+        self.run_prepared(datalist, event_driven=event_driven, progress=progress)
+    
+    def run_prepared(self, datalist: List[Dict[str, ColumnarFrame]], event_driven: bool = False, progress: bool = True):
+        """ready_data가 반환한 datalist(지표 컬럼 계산, warm-up 제외, 날짜 정렬 완료)로 실행.
+            지표를 전체 기간에 대해 한 번 계산해 두고 구간별로 잘라서 실행할 때 사용 (walkforward.py).
+            datalist의 ColumnarFrame은 수정하지 않으므로 frame.slice(start, stop) view를 그대로 넣을 수 있음.
+        """
+        profiler, timer = self.profiler, self.phase_timer
+        if profiler is not None:
+            profiler.start()
+        if timer is not None:
+            start = perf_counter()
+        # 매 bar마다 iloc으로 pd.Series를 만들지 않도록 컬럼별 numpy 배열로 한 번만 변환
+        frames = {asset: df if isinstance(df, ColumnarFrame) else ColumnarFrame(df)
+                  for data in datalist for asset, df in data.items()}
+        base_frame = frames[list(datalist[0].keys())[0]]
+        self.balance_recorder = BalanceRecorder(len(base_frame), dates=base_frame['Date'], every=self.RECORD_EVERY, events_only=self.RECORD_EVENTS_ONLY)
+        self.fill_recorder = FillRecorder(dates=base_frame['Date'])
+        # 벡터화 신호를 구현한 전략은 신호를 미리 계산, 신호가 발생한 bar에서만 조건 확인
+        self.ready_signals(frames)
+        if timer is not None:
+            timer.add_phase('ready_signals', start)
+        # position_book의 asset 순서대로 Close 배열 (포지션 평가에 사용)
+        self.data_assets = list(frames)
+        for asset in self.data_assets:
+            self.position_book.add_asset(asset)
+        self.asset_close = np.stack([np.asarray(frames[asset]['Close'], dtype=np.float64) for asset in self.position_book.assets], axis=1)
         
-        for didx in tqdm(range(len(list(datalist[0].values())[0]))):
-            # (1) 진입된 전략 청산 조건 파악.
-            for data in datalist:
-                clear_strategy_idx = []
-                for sidx, strategy_instance in enumerate(self.enter_strategy_list):
-                    # Asset 일치 여부 확인
-                    if self.asset_checker(data, strategy_instance):
-                        # [TODO] Strategy Manager 하나 만들어서 해보자. 청산 조건 확인
-                        # [TODO] 모든 asset을 close했을 때 어디서 전략을 pop할지 고민하자, update or 
-                        check_data = data[strategy_instance.ASSET].iloc[didx, :]
-                        
-                        is_close, close_size, close_price = strategy_instance.close_condition(check_data)
-                        if is_close:
-                            # 포지션 종료(청산 or 익절(or 손절))
-                            close_info = strategy_instance.close(close_size=close_size
-                                                                , close_price=close_price)
-                            # 청산 정보, balance 정보 업데이트
-                            self.remain_balance += close_info['realized_now_amount']
-                            if close_info['clear']:
-                                self.update_strategy_in_management(status=Status.OUT, strategy_instance=strategy_instance)
-                                clear_strategy_idx.append(sidx)
-                                
-                            # 청산 정보 저장
-                            self.strategy_clear_info.append(close_info)
-            
-            # (1-1) 청산된 전략들 제거
-            self.update_strategy_out_list(clear_strategy_idx)
+        # update()를 override한 전략은 bar마다 update가 호출되어야 하므로 bar 단위로 실행
+        if event_driven and self.signal_complete() and not self.has_update_hooks():
+            self.run_event_driven(datalist, frames, base_frame, progress)
+        else:
+            for didx in tqdm(range(len(base_frame)), disable=not progress):
+                self.run_bar(didx, frames, self.asset_close[didx])
+        # 진입 중인 전략 인스턴스에 마지막 bar 기준 평가 금액 반영
+        self.position_book.sync_instances()
+        if profiler is not None:
+            profiler.finish(self)
+    
+    def run_bar(self, didx, frames, asset_close, date=None):
+        """bar 하나에 대해 (1) 청산 (2) 진입 (3) 정보 업데이트 수행
+            frames[asset].bar(didx)는 didx bar의 데이터, asset_close는 position_book.assets 순서의 didx bar Close.
+            date는 recorder에 Date 배열이 없을 때 (run_stream) 기록할 Date.
+        """
+        profiler, timer = self.profiler, self.phase_timer
+        if timer is not None:
+            start = perf_counter()
+        
+        # (1) 진입된 전략 청산 조건 파악. 청산 신호가 있는 전략은 신호가 발생한 경우만 확인 (position_book.close_candidates)
+        #     datalist의 asset 순서, 진입 순서대로 확인
+        clear_strategy_idx = []
+        event = False
+        for sidx in self.position_book.close_candidates(didx):
+            strategy_instance = self.enter_strategy_list[sidx]
+            # [TODO] Strategy Manager 하나 만들어서 해보자. 청산 조건 확인
+            check_data = frames[strategy_instance.ASSET].bar(didx)
+            is_close, close_size, close_price = strategy_instance.close_condition(check_data)
+            if is_close:
+                # 포지션 종료(청산 or 익절(or 손절))
+                close_info = strategy_instance.close(close_size=close_size
+                                                    , close_price=close_price)
+                # 청산 정보, balance 정보 업데이트
+                self.remain_balance += close_info['realized_now_amount']
+                self.position_book.sync(sidx)
+                if close_info['clear']:
+                    self.update_strategy_in_management(status=Status.OUT, strategy_instance=strategy_instance)
+                    clear_strategy_idx.append(sidx)
+                    
+                # 청산 정보 저장
+                self.fill_recorder.record(didx, close_info, date=date)
+                event = True
+                if profiler is not None:
+                    profiler.on_close(self, strategy_instance, close_info, didx)
+        
+        # (1-1) 청산된 전략들 제거
+        self.update_strategy_out_list(clear_strategy_idx)
+        if timer is not None:
+            start = timer.add_phase('close', start)
+        
+        # (2) 전략 리스트 진입 조건 파악
+        for asset in self.data_assets:
+            # asset이 일치하는 전략만 확인
+            for i in self.queue_index_by_asset[asset]:
+                # 1.전체 전략 동시 개수 & 3.잔여 자금 확인 - 전략과 무관하므로 만족하지 않으면 이후 전략도 진입 불가
+                if not self.check_balance_for_open():
+                    break
+                strategy_instance = self.strategy_queue[i]
+                # 2.전략당 동시에 들어갈 수 있는 최대 개수 확인
+                if self.strategy_in_mangement[strategy_instance.STRATEGY_NAME] >= self.MAX_STRATEGY_SIMULTANEOUSLY_CNT:
+                    continue
+                
+                # 진입 여부 계산
+                open_signals = self.queue_open_signals[i]
+                if open_signals is not None:
+                    is_open, side, enter_price = (signal[didx] for signal in open_signals)
+                else:
+                    check_data = frames[asset].bar(didx)
+                    is_open, side, enter_price = strategy_instance.open_condition(check_data)
+                if is_open:
+                    # 포지션 진입 금액(USDT) 계산
+                    enter_balance = self.decision_enter_balance()
+                    # 포지션 진입
+                    strategy_instance.open(side=side
+                                           , initial_balance=enter_balance
+                                           , open_price=enter_price)
+                    # 진입 정보, balance 정보 업데이트
+                    self.update_strategy_in_management(status=Status.IN, strategy_instance=strategy_instance)
+                    self.remain_balance -= enter_balance
+                    
+                    # strategy_queue에서 빼서 enter_strategy_list에 넣어주기
+                    self.update_strategy_in_list(i)
+                    event = True
+                    if profiler is not None:
+                        profiler.on_open(self, strategy_instance, didx)
+                    
+                                       
+        if timer is not None:
+            start = timer.add_phase('open', start)
+        
+        # (3) 진입 중인 전략들 정보 업데이트 (모든 포지션을 한 번에 평가)
+        self.enter_balance = self.position_book.mark_to_market(asset_close)
+        
+        self.total_balance = self.enter_balance + self.remain_balance
+        if timer is not None:
+            start = timer.add_phase('mark_to_market', start)
+        self.update_backtesting_info(didx, event, date=date)
+        if timer is not None:
+            timer.add_phase('record', start)
+        if profiler is not None:
+            profiler.on_bar(self, didx)
+
+    
+    def signal_complete(self) -> bool:
+        """모든 전략이 진입, 청산 벡터화 신호를 가지고 있는지 확인"""
+        return all(self.signal_key(strategy_instance) in self.open_signal_cache
+                   and self.signal_key(strategy_instance) in self.close_signal_cache
+                   for strategy_instance in self.strategy_queue)
+    
+    def has_update_hooks(self) -> bool:
+        """update()를 override한 전략이 있는지 (StrategyManager.has_update_hook)"""
+        return any(strategy_instance.has_update_hook() for strategy_instance in self.strategy_queue)
+    
+    def next_event_bar(self, didx, open_index, close_index, end) -> int:
+        """didx 이후에 진입 또는 청산이 일어날 수 있는 가장 빠른 bar 위치. 없으면 end 반환.
+        
+        이벤트가 없는 동안에는 진입 개수, 잔여 자산이 변하지 않으므로 현재 상태로 진입 가능 여부를 판단할 수 있다.
+        """
+        next_didx = end
+        for strategy_instance in self.enter_strategy_list:
+            index = close_index[self.signal_key(strategy_instance)][strategy_instance.SIDE]
+            pos = np.searchsorted(index, didx, side='right')
+            if pos < len(index):
+                next_didx = min(next_didx, index[pos])
+        
+        if self.strategy_in_mangement['total'] < self.MAX_STRATEGY_CNT and self.remain_balance > self.MIN_TRADING_AMOUNT:
+            for strategy_instance in self.strategy_queue:
+                if self.strategy_in_mangement[strategy_instance.STRATEGY_NAME] < self.MAX_STRATEGY_SIMULTANEOUSLY_CNT:
+                    index = open_index[self.signal_key(strategy_instance)]
+                    pos = np.searchsorted(index, didx, side='right')
+                    if pos < len(index):
+                        next_didx = min(next_didx, index[pos])
+        return int(next_didx)
+    
+    def fill_mark_to_market(self, start, end, frames, base_frame):
+        """이벤트가 없는 [start, end) 구간의 진입 자산을 벡터화해서 계산하고 정보 저장"""
+        if start >= end:
+            return
+        
+        # 포지션 상태는 구간 마지막 bar 기준으로 갱신
+        enter_balance = self.position_book.mark_to_market_range(self.asset_close[start:end].T)
+        
+        total_balance = enter_balance + self.remain_balance
+        self.balance_recorder.record_range(start, end, total_balance, enter_balance
+                                           , remain_balance=self.remain_balance
+                                           , entered_strategy_cnt=len(self.enter_strategy_list))
+        
+        self.enter_balance, self.total_balance = enter_balance[-1], total_balance[-1]
+    
+    def run_event_driven(self, datalist, frames, base_frame, progress=True):
+        """신호가 발생하는 bar만 run_bar로 처리하고 그 사이 bar는 fill_mark_to_market으로 채움"""
+        open_index = {key: np.flatnonzero(signals[0]) for key, signals in self.open_signal_cache.items()}
+        close_index = {key: {side: np.flatnonzero(mask) for side, mask in signals.items()}
+                       for key, signals in self.close_signal_cache.items()}
+        
+        timer = self.phase_timer
+        end = len(base_frame)
+        didx = 0
+        with tqdm(total=end, disable=not progress) as pbar:
+            while didx < end:
+                self.run_bar(didx, frames, self.asset_close[didx])
+                if timer is not None:
+                    start = perf_counter()
+                next_didx = self.next_event_bar(didx, open_index, close_index, end)
+                if timer is not None:
+                    start = timer.add_phase('next_event', start)
+                self.fill_mark_to_market(didx + 1, next_didx, frames, base_frame)
+                if timer is not None:
+                    timer.add_phase('fill_mark_to_market', start)
+                pbar.update(next_didx - didx)
+                didx = next_didx
+    
+    def ready_stream(self, history=None):
+        """run_stream 준비. asset별 지표는 OnlineIndicators로 bar마다 갱신하고, 벡터화 신호 없이 bar마다 조건 확인.
+            history={asset: pd.DataFrame}가 있으면 지표 상태를 history로 초기화 (feed는 history 다음 bar부터)
+        """
+        history = {} if history is None else history
+        if self.profiler is not None:
+            self.profiler.start()
+        self.online_indicators = {asset: OnlineIndicators(self.preprocessor, list(columns), history=history.get(asset))
+                                  for asset, columns in self.need_columns().items()}
+        self.open_signal_cache, self.close_signal_cache = {}, {}
+        self.queue_open_signals = [None] * len(self.strategy_queue)
+        self.position_book.set_close_signals({})
+        # bar 수를 알 수 없으므로 recorder는 배열을 늘려가며 (record_sink가 있으면 sink로 넘기며) 기록하고 Date도 함께 저장
+        sink = self.RECORD_SINK
+        self.balance_recorder = BalanceRecorder(None, every=self.RECORD_EVERY, events_only=self.RECORD_EVENTS_ONLY
+                                                , sink=None if sink is None else partial(sink, 'backtesting_info'))
+        self.fill_recorder = FillRecorder(sink=None if sink is None else partial(sink, 'strategy_clear_info'))
+        self.live_frames, self.stream_didx, self.stream_date = {}, 0, None
+    
+    def step_stream(self, bars: Dict[str, Dict]) -> bool:
+        """feed의 bar 하나 {asset: {'Date':..., 'Close':..., ...}} 처리.
+            지표를 갱신하고, 모든 asset의 warm-up이 끝났으면 run_bar 수행. run_bar를 수행했으면 True
+        """
+        timer = self.phase_timer
+        if timer is not None:
+            start = perf_counter()
+        rows = {}
+        for asset, bar in bars.items():
+            online_indicators = self.online_indicators.get(asset)
+            rows[asset] = bar if online_indicators is None else online_indicators.update(bar)
+        if timer is not None:
+            timer.add_phase('online_indicators', start)
+        if not all(online_indicators.ready for online_indicators in self.online_indicators.values()):
+            return False
+        
+        if not self.live_frames:
+            # 첫 bar의 asset 순서를 datalist 순서처럼 사용
+            self.data_assets = list(rows)
+            for asset in self.data_assets:
+                self.position_book.add_asset(asset)
+                self.live_frames[asset] = LiveFrame()
+        for asset, row in rows.items():
+            self.live_frames[asset].row = row
+        
+        asset_close = np.array([rows[asset]['Close'] for asset in self.position_book.assets], dtype=np.float64)
+        self.stream_date = rows[self.data_assets[0]]['Date']
+        self.run_bar(self.stream_didx, self.live_frames, asset_close, date=self.stream_date)
+        self.stream_didx += 1
+        return True
+    
+    def finish_stream(self):
+        """feed가 끝났을 때 마지막 bar 기록 (run과 같이 마지막 bar는 항상 기록), 남은 기록을 record_sink로 넘기고 전략 인스턴스에 평가 금액 반영"""
+        if self.stream_didx and self.balance_recorder.last_bar != self.stream_didx - 1:
+            self.update_backtesting_info(self.stream_didx - 1, date=self.stream_date, force=True)
+        self.balance_recorder.flush()
+        self.fill_recorder.flush()
+        self.position_book.sync_instances()
+        if self.profiler is not None:
+            self.profiler.finish(self)
+    
+    def run_stream(self, feed, progress: bool = True, history=None):
+        """bar iterator로 백테스팅 (streaming / live feed 모드).
+        
+            feed는 Date 순서대로 모든 asset의 같은 시점 bar를 주는 iterator (data/feed.py 참고)
+                {'BTCUSDT': {'Date':..., 'Open':..., 'High':..., 'Low':..., 'Close':..., 'Volume':...}, 'ETHUSDT': {...}}
+            지표는 OnlineIndicators로 bar마다 O(1) 갱신하고 최신 bar만 가지고 있으므로 데이터 길이와 무관한 메모리로 실행.
+            단 backtesting_info, strategy_clear_info 기록은 기록한 bar, 청산 수만큼 늘어남 (기본값은 모든 bar).
+            record_every/record_events_only로 기록량을 줄이거나 record_sink로 넘기면 기록 메모리도 고정.
+            같은 데이터라면 run()과 같은 결과 (warm-up bar는 진입/청산, 기록에서 제외).
             
-            # (2) 전략 리스트 진입 조건 파악
-            for data in datalist:
-                for i, strategy_instance in enumerate(self.strategy_queue):
-                    # 자산 매칭 확인
-                    if self.asset_checker(data, strategy_instance):
-                        # 1.전체 전략 동시 개수 & 2.전략당 동시에 들어갈 수 있는 최대 개수 & 3.잔여 자금 확인 
-                        if self.strategy_in_mangement['total'] < self.MAX_STRATEGY_CNT \
-                            and  self.strategy_in_mangement[strategy_instance.STRATEGY_NAME] < self.MAX_STRATEGY_SIMULTANEOUSLY_CNT \
-                            and  self.remain_balance > self.MIN_TRADING_AMOUNT:
-                            
-                            # 진입 여부 계산
-                            check_data = data[strategy_instance.ASSET].iloc[didx, :]
-                            is_open, side, enter_price = strategy_instance.open_condition(check_data)
-                            if is_open:
-                                # 포지션 진입 금액(USDT) 계산
-                                enter_balance = self.decision_enter_balance()
-                                # 포지션 진입
-                                strategy_instance.open(side=side
-                                                       , initial_balance=enter_balance
-                                                       , open_price=enter_price)
-                                # 진입 정보, balance 정보 업데이트
-                                self.update_strategy_in_management(status=Status.IN, strategy_instance=strategy_instance)
-                                self.remain_balance -= enter_balance
-                                
-                                # strategy_queue에서 빼서 enter_strategy_list에 넣어주기
-                                self.update_strategy_in_list(i)
-                                
-                                           
-            # (3) 진입 중인 전략들 정보 업데이트
-            self.enter_balance, self.notional_position_size = 0, 0
-            for strategy_instance in self.enter_strategy_list:
-                for data in datalist:
-                    if self.asset_checker(data, strategy_instance):
-                        close = data[strategy_instance.ASSET].iloc[didx, :]['Close']
-                        strategy_instance.update(close)
-                        self.enter_balance += strategy_instance.balance
-                        self.total_notional_position_size += strategy_instance.notional_position_size
+            history={asset: pd.DataFrame}를 주면 지표를 이 데이터로 초기화해서 feed의 첫 bar부터 진입/청산 (paper trading 등).
             
-            self.total_balance = self.enter_balance + self.remain_balance
-            self.update_backtesting_info(list(datalist[0].values())[0].iloc[didx, :])
-        
\ No newline at end of file
+            지원하지 않는 것: timeframe 컬럼('4h:MA20'), online 버전이 없는 지표, NaN이 있는 bar.
+            async feed는 arun_stream 사용.
+        """
+        self.ready_stream(history)
+        for bars in tqdm(feed, disable=not progress):
+            self.step_stream(bars)
+        self.finish_stream()
+    
+    async def arun_stream(self, feed, progress: bool = True, history=None):
+        """async bar iterator로 run_stream (data.feed.replay, 실시간 feed 등). sync iterator도 가능"""
+        self.ready_stream(history)
+        with tqdm(disable=not progress) as pbar:
+            if hasattr(feed, '__aiter__'):
+                async for bars in feed:
+                    self.step_stream(bars)
+                    pbar.update(1)
+            else:
+                for bars in feed:
+                    self.step_stream(bars)
+                    pbar.update(1)
+                    await asyncio.sleep(0)
+        self.finish_stream()
@@ -0,0 +1,114 @@
+"""Crawler 벤치마크: 순차 paging(get_coin_candle_all) vs window 병렬(get_coin_candle_range),
+메모리에 모으는 get_coin_candle_range vs store에 page 단위로 쓰는 stream_coin_candle_range의 peak memory
+
+로컬 mock klines 서버(요청마다 latency, 일부 요청은 500 실패)를 띄워서 측정.
+
+    cd Multi-Strategy-Backtester
+    python benchmarks/bench_crawler.py
+"""
+import os
+import sys
+import time
+import asyncio
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.getcwd(), 'data'))
+
+from aiohttp import web
+from loguru import logger
+from crawler import Crawler, TokenBucket, interval_to_ms
+from store import PriceStore
+
+logger.remove()
+
+INTERVAL = '15m'
+START = 1577836800000            # 2020-01-01
+N_BARS = 150_000                 # 15m 약 4년
+LATENCY = 0.05                   # 요청당 서버 지연 (초)
+FAIL_EVERY = 20                  # retry 측정 시 n번째 요청마다 500 응답
+
+
+class MockKlinesServer:
+    def __init__(self, port=18181):
+        self.port = port
+        self.fail_every = 0
+        self.request_count = 0
+        self.interval_ms = interval_to_ms(INTERVAL)
+        self.last_open = START + (N_BARS - 1) * self.interval_ms
+
+    async def klines(self, request):
+        self.request_count += 1
+        if self.fail_every and self.request_count % self.fail_every == 0:
+            return web.Response(status=500)
+        await asyncio.sleep(LATENCY)
+        
+        start_time = int(request.query['startTime'])
+        end_time = int(request.query.get('endTime', self.last_open))
+        limit = int(request.query.get('limit', 500))
+        first = max(START, START + -(-(start_time - START) // self.interval_ms) * self.interval_ms)
+        last = min(end_time, self.last_open, first + (limit - 1) * self.interval_ms)
+        candles = [[t, '1.0', '1.1', '0.9', '1.05', '10.0', t + self.interval_ms - 1, '0', 1, '0', '0', '0']
+                   for t in range(first, last + 1, self.interval_ms)]
+        return web.json_response(candles)
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get('/fapi/v1/klines', self.klines)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, '127.0.0.1', self.port).start()
+        return f'http://127.0.0.1:{self.port}/fapi/v1/klines'
+
+
+async def bench():
+    server = MockKlinesServer()
+    url = await server.start()
+    crawler = Crawler()
+    end_time = server.last_open
+    
+    start = time.perf_counter()
+    df_sequential = await crawler.get_coin_candle_all(url, 'BTCUSDT', INTERVAL, startTime=START, endTime=end_time, sleep=0)
+    sequential_time = time.perf_counter() - start
+    
+    # mock 서버이므로 rate limit은 넉넉하게 설정
+    start = time.perf_counter()
+    df_range = await crawler.get_coin_candle_range(url, 'BTCUSDT', INTERVAL, startTime=START, endTime=end_time
+                                                   , max_concurrency=16, backoff=0.05
+                                                   , rate_limiter=TokenBucket(capacity=10000, refill_per_sec=10000))
+    range_time = time.perf_counter() - start
+    
+    # 일부 요청이 실패해도 retry로 전체 구간을 받아오는지 확인
+    server.fail_every = FAIL_EVERY
+    start = time.perf_counter()
+    df_retry = await crawler.get_coin_candle_range(url, 'BTCUSDT', INTERVAL, startTime=START, endTime=end_time
+                                                   , max_concurrency=16, backoff=0.05
+                                                   , rate_limiter=TokenBucket(capacity=10000, refill_per_sec=10000))
+    retry_time = time.perf_counter() - start
+    
+    print(f'{INTERVAL} {N_BARS} bars, latency {LATENCY * 1000:.0f}ms')
+    print(f'sequential        : {sequential_time:.2f}s, {len(df_sequential)} rows')
+    print(f'windowed          : {range_time:.2f}s, {len(df_range)} rows, ordered={df_range["Open time"].is_monotonic_increasing}')
+    print(f'windowed (1/{FAIL_EVERY} 500): {retry_time:.2f}s, {len(df_retry)} rows, equal={df_retry.equals(df_range)}')
+    
+    # peak memory: 전체를 DataFrame으로 모으는 경우 vs store에 stream
+    server.fail_every = 0
+    tracemalloc.start()
+    df_range = await crawler.get_coin_candle_range(url, 'BTCUSDT', INTERVAL, startTime=START, endTime=end_time
+                                                   , max_concurrency=16, rate_limiter=TokenBucket(capacity=10000, refill_per_sec=10000))
+    range_peak = tracemalloc.get_traced_memory()[1]
+    del df_range
+    tracemalloc.reset_peak()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        store = await crawler.stream_coin_candle_range(url, 'BTCUSDT', INTERVAL, PriceStore(os.path.join(tmp_dir, 'btc_store')), startTime=START, endTime=end_time
+                                                       , max_concurrency=16, rate_limiter=TokenBucket(capacity=10000, refill_per_sec=10000))
+        stream_peak, stream_rows = tracemalloc.get_traced_memory()[1], len(store)
+    tracemalloc.stop()
+    print(f'peak memory, in-memory : {range_peak / 2**20:.1f} MiB')
+    print(f'peak memory, streaming : {stream_peak / 2**20:.1f} MiB, {stream_rows} rows stored')
+    await crawler.close()
+    await server.runner.cleanup()
+
+
+if __name__ == '__main__':
+    asyncio.run(bench())
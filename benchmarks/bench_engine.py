@@ -0,0 +1,111 @@
+"""Backtesting.run 벤치마크
+
+    cd Multi-Strategy-Backtester
+    python benchmarks/bench_engine.py
+"""
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.getcwd())
+
+from tqdm import tqdm
+from functools import partialmethod
+from data.loader import load_price_data
+from backtester import Backtesting
+from columnar import ColumnarFrame
+from position_book import PositionBook
+from utils import Side
+from strategy.moving_average import PartialCloseMovingAverageStrategy
+
+# 진행바 출력 비용은 측정에서 제외
+tqdm.__init__ = partialmethod(tqdm.__init__, disable=True)
+
+
+def bench_row_access(df, n_repeat=3):
+    """bar 하나를 읽는 비용 비교: df.iloc[didx, :] vs ColumnarFrame.bar(didx)"""
+    frame = ColumnarFrame(df)
+    
+    start = time.perf_counter()
+    for didx in range(len(df)):
+        df.iloc[didx, :]['Close']
+    iloc_time = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    for _ in range(n_repeat):
+        for didx in range(len(frame)):
+            frame.bar(didx)['Close']
+    cursor_time = (time.perf_counter() - start) / n_repeat
+    return iloc_time, cursor_time
+
+
+def bench_run(df, n_strategy=3, event_driven=False):
+    strategy_list = [{'object': PartialCloseMovingAverageStrategy
+                      , 'parameter': {'asset': 'BTCUSDT', 'strategy_name': f'simple_sma{i}', 'trading_fee': 0.0005}}
+                     for i in range(n_strategy)]
+    backtester = Backtesting(strategy_list=strategy_list, max_strategy_cnt=9)
+    
+    start = time.perf_counter()
+    backtester.run([{'BTCUSDT': df.copy()}], event_driven=event_driven, progress=False)
+    return time.perf_counter() - start
+
+
+def bench_scaling(df, max_strategy_cnt):
+    """max_strategy_cnt(동시 포지션 수)에 따른 bar당 실행 시간 (us)"""
+    strategy_list = [{'object': PartialCloseMovingAverageStrategy
+                      , 'parameter': {'asset': 'BTCUSDT', 'strategy_name': f'simple_sma{i}', 'trading_fee': 0.0005}}
+                     for i in range(max(1, max_strategy_cnt // 3))]
+    backtester = Backtesting(strategy_list=strategy_list, max_strategy_cnt=max_strategy_cnt, total_balance=1e9)
+    
+    start = time.perf_counter()
+    backtester.run([{'BTCUSDT': df}], progress=False)
+    return (time.perf_counter() - start) / len(df) * 1e6
+
+
+def bench_mark_to_market(n_position, n_bar=10000):
+    """진입 중인 포지션 평가 비용 (us/bar): 인스턴스별 update() vs PositionBook.mark_to_market"""
+    close = 100 + np.random.default_rng(0).standard_normal(n_bar).cumsum()
+    instances = []
+    for i in range(n_position):
+        strategy_instance = PartialCloseMovingAverageStrategy(asset='BTCUSDT', strategy_name=f'simple_sma{i}')
+        strategy_instance.open(Side.BUY if i % 2 else Side.SELL, 100, close[0])
+        instances.append(strategy_instance)
+    
+    start = time.perf_counter()
+    for didx in range(n_bar):
+        enter_balance = 0
+        for strategy_instance in instances:
+            strategy_instance.update(close[didx])
+            enter_balance += strategy_instance.balance
+    instance_time = (time.perf_counter() - start) / n_bar * 1e6
+    
+    book = PositionBook()
+    for strategy_instance in instances:
+        book.open(strategy_instance)
+    asset_close = close[:, None]
+    start = time.perf_counter()
+    for didx in range(n_bar):
+        book.mark_to_market(asset_close[didx])
+    book_time = (time.perf_counter() - start) / n_bar * 1e6
+    return instance_time, book_time
+
+
+if __name__ == '__main__':
+    df_btc = load_price_data(market='crypto'
+                             , symbol='btc'
+                             , timeframe='1h'
+                             , start_date='2019-01-01'
+                             , end_date='2025-01-01'
+                             , save_name='btc.csv')
+    
+    iloc_time, cursor_time = bench_row_access(df_btc)
+    print(f'bars: {len(df_btc)}')
+    print(f'row access | iloc: {iloc_time:.3f}s, cursor: {cursor_time:.3f}s, x{iloc_time / cursor_time:.1f}')
+    print(f'Backtesting.run | bar: {bench_run(df_btc):.3f}s, event_driven: {bench_run(df_btc, event_driven=True):.3f}s')
+    
+    for n_position in [10, 100, 500]:
+        instance_time, book_time = bench_mark_to_market(n_position)
+        print(f'mark to market {n_position:>3} positions | instance update: {instance_time:.1f}us/bar, position book: {book_time:.1f}us/bar')
+    for max_strategy_cnt in [9, 90, 300]:
+        print(f'Backtesting.run max_strategy_cnt={max_strategy_cnt:>3} | {bench_scaling(df_btc, max_strategy_cnt):.1f}us/bar')
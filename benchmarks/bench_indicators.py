@@ -0,0 +1,53 @@
+"""지표 계산 벤치마크: ta(pandas) vs indicators.py (NumPy kernel)
+
+    cd Multi-Strategy-Backtester
+    python benchmarks/bench_indicators.py
+"""
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.getcwd())
+
+import ta
+import indicators
+from loguru import logger
+from data.loader import load_price_data
+
+logger.remove()
+
+
+def timeit(function, n_repeat=5):
+    start = time.perf_counter()
+    for _ in range(n_repeat):
+        result = function()
+    return (time.perf_counter() - start) / n_repeat, result
+
+
+def max_relative_error(result, expected):
+    result, expected = np.asarray(result, dtype=np.float64), np.asarray(expected, dtype=np.float64)
+    assert np.array_equal(np.isnan(result), np.isnan(expected)), 'warm-up NaN mismatch'
+    valid = ~np.isnan(expected)
+    return np.max(np.abs(result[valid] - expected[valid]) / np.maximum(np.abs(expected[valid]), 1e-12))
+
+
+if __name__ == '__main__':
+    df = load_price_data(market='crypto', symbol='btc', timeframe='1h', start_date='2019-01-01', end_date='2025-01-01', save_name='btc.csv')
+    close_series = df['Close']
+    close = close_series.to_numpy(dtype=np.float64)
+    windows = list(range(5, 201))
+    
+    cases = {
+        'MA20'        : (lambda: ta.trend.sma_indicator(close_series, window=20), lambda: indicators.sma(close, 20)),
+        'EMA20'       : (lambda: ta.trend.ema_indicator(close_series, window=20), lambda: indicators.ema(close, 20)),
+        'RSI'         : (lambda: ta.momentum.rsi(close_series, window=14), lambda: indicators.rsi(close, 14)),
+        'BBUpper'     : (lambda: ta.volatility.BollingerBands(close_series, window=20, window_dev=2).bollinger_hband(), lambda: indicators.bollinger_bands(close, 20, 2)[0]),
+        'MA5~MA200'   : (lambda: np.vstack([ta.trend.sma_indicator(close_series, window=n).to_numpy() for n in windows]), lambda: indicators.sma_batch(close, windows)),
+    }
+    
+    print(f'1h/btc {len(close)} bars')
+    for name, (ta_function, kernel_function) in cases.items():
+        ta_time, expected = timeit(ta_function)
+        kernel_time, result = timeit(kernel_function)
+        print(f'{name:>10} | ta: {ta_time * 1000:8.2f}ms, kernel: {kernel_time * 1000:7.2f}ms, x{ta_time / kernel_time:5.1f}, max rel err {max_relative_error(result, expected):.1e}')
@@ -0,0 +1,40 @@
+"""load_price_data 벤치마크: csv 파싱 vs columnar binary store
+
+    cd Multi-Strategy-Backtester
+    python benchmarks/bench_loader.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.getcwd())
+
+from loguru import logger
+from data.loader import load_price_data
+
+logger.remove()
+
+
+def bench_load(timeframe, save_name, start_date, end_date, use_store, n_repeat=5):
+    start = time.perf_counter()
+    for _ in range(n_repeat):
+        df = load_price_data(market='crypto'
+                             , symbol=save_name.split('.')[0]
+                             , timeframe=timeframe
+                             , start_date=start_date
+                             , end_date=end_date
+                             , save_name=save_name
+                             , use_store=use_store)
+    return (time.perf_counter() - start) / n_repeat, len(df)
+
+
+if __name__ == '__main__':
+    windows = {'full': ('2019-01-01', '2025-01-01'), '1 month': ('2021-03-01', '2021-04-01')}
+    
+    # store가 없으면 첫 로드에서 변환되므로 변환 비용은 측정에서 제외
+    bench_load('1h', 'btc.csv', '2019-01-01', '2019-01-02', use_store=True, n_repeat=1)
+    
+    for name, (start_date, end_date) in windows.items():
+        csv_time, rows = bench_load('1h', 'btc.csv', start_date, end_date, use_store=False)
+        store_time, _ = bench_load('1h', 'btc.csv', start_date, end_date, use_store=True)
+        print(f'1h/btc {name:>8} ({rows} rows) | csv: {csv_time * 1000:.1f}ms, store: {store_time * 1000:.1f}ms, x{csv_time / store_time:.1f}')
@@ -0,0 +1,275 @@
+"""백테스팅 hot path 벤치마크 모음. 결과를 json으로 저장해서 commit 사이의 성능 변화를 비교.
+
+    cd Multi-Strategy-Backtester
+    python benchmarks/bench_suite.py                                   # benchmarks/results/<commit>.json 저장
+    python benchmarks/bench_suite.py --quick                           # 작은 synthetic 데이터, 반복 1회
+    python benchmarks/bench_suite.py --groups engine indicators --bars 1000000 5000000
+    python benchmarks/bench_suite.py --compare benchmarks/results/<old commit>.json
+
+group
+    load       : load_price_data (csv / store), 1h, 4h 데이터와 synthetic store
+    indicators : Preprocessor 지표 계산, Backtesting.ready_data
+    engine     : Backtesting.run (bar / event_driven), run_stream의 bar/s. 전략 개수별
+    sweep      : run_sweep 조합/s
+
+데이터는 data/crypto/1h, 4h의 btc, eth와 random walk로 만든 synthetic 1m 데이터(--bars 개수)를 사용.
+결과의 각 항목은 {group, name, params, seconds(반복 중 최소), throughput, unit}이며
+engine, sweep 항목은 청산 기록 수(fills)와 마지막 청산까지의 구간 비율(fill_coverage)도 기록한다.
+거래가 중간에 멈추면 이후는 빈 bar만 측정하게 되므로 fill_coverage가 MIN_FILL_COVERAGE보다 작으면 경고를 출력한다.
+--compare로 이전 결과와 (group, name, params)가 같은 항목의 시간을 비교한다 (--threshold보다 느려지면 exit code 1).
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import subprocess
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.getcwd())
+
+from loguru import logger
+from data.loader import load_price_data
+from data.store import PriceStore, STORE_COLUMNS
+from data.feed import iter_frame_bars
+from preprocessor import Preprocessor
+from backtester import Backtesting
+from sweep import run_sweep
+from strategy.moving_average import SimpleMovingAverageStrategy, PartialCloseMovingAverageStrategy
+
+logger.remove()
+
+GROUPS = ['load', 'indicators', 'engine', 'sweep']
+BUNDLED = [('1h', 'btc'), ('1h', 'eth'), ('4h', 'btc'), ('4h', 'eth')]
+INDICATOR_COLUMNS = ['MA5', 'MA20', 'MA200', 'EMA20', 'RSI', 'BBUpper', 'BBLower', 'PANGLE_MA20_100']
+# 청산 수수료 (StrategyManager.close에서 비율로 적용). 수수료가 크면 자산이 금방 소진되어 거래가 멈춤
+TRADING_FEE = 0.0005
+# fill_coverage가 이보다 작으면 경고
+MIN_FILL_COVERAGE = 0.9
+
+
+def timeit(function, n_repeat):
+    """n_repeat번 실행 중 가장 빠른 시간과 마지막 결과"""
+    best, result = float('inf'), None
+    for _ in range(n_repeat):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def random_walk(n_bar, seed=0, start_date='2000-01-01', interval_ms=60_000) -> pd.DataFrame:
+    """random walk OHLCV (load_price_data와 같은 형태)"""
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.002, n_bar)))
+    open_ = np.concatenate([[100.0], close[:-1]])
+    spread = np.abs(rng.normal(0, 0.001, (2, n_bar)))
+    return pd.DataFrame({'Date': pd.Timestamp(start_date) + pd.to_timedelta(np.arange(1, n_bar + 1) * interval_ms, unit='ms')
+                         , 'Open': open_
+                         , 'High': np.maximum(open_, close) * (1 + spread[0])
+                         , 'Low': np.minimum(open_, close) * (1 - spread[1])
+                         , 'Close': close
+                         , 'Volume': rng.lognormal(3, 1, n_bar)})
+
+
+def strategy_list(n_strategy, asset='BTCUSDT'):
+    strategy_objects = [PartialCloseMovingAverageStrategy, SimpleMovingAverageStrategy]
+    return [{'object': strategy_objects[i % 2], 'parameter': {'asset': asset, 'strategy_name': f'sma{i}', 'trading_fee': TRADING_FEE}}
+            for i in range(n_strategy)]
+
+
+def fill_coverage(backtester) -> dict:
+    """청산 기록 수, 실행 구간(backtesting_info Date) 중 마지막 청산까지의 비율"""
+    dates, fills = backtester.backtesting_info['Date'], backtester.strategy_clear_info
+    if len(fills) == 0 or len(dates) < 2:
+        return {'fills': len(fills), 'fill_coverage': 0.0}
+    first, last = dates.iloc[0], dates.iloc[-1]
+    return {'fills': len(fills), 'fill_coverage': float((fills['Date'].iloc[-1] - first) / (last - first))}
+
+
+class BenchmarkSuite:
+    def __init__(self, bars, strategy_counts, n_repeat, max_workers=None):
+        self.bars = bars
+        self.strategy_counts = strategy_counts
+        self.n_repeat = n_repeat
+        self.max_workers = max_workers
+        self.results = []
+        self.tmp_dir = tempfile.mkdtemp(prefix='bench_suite_')
+
+    def record(self, group, name, params, seconds, count, unit, **extra):
+        """extra: 비교 key에 포함하지 않는 부가 정보 (fills, fill_coverage)"""
+        result = {'group': group, 'name': name, 'params': params, 'seconds': seconds
+                  , 'throughput': count / seconds if seconds > 0 else None, 'unit': unit, **extra}
+        self.results.append(result)
+        params_text = ' '.join(f'{key}={value}' for key, value in params.items())
+        extra_text = ' '.join(f'{key}={value:.2f}' if isinstance(value, float) else f'{key}={value}' for key, value in extra.items())
+        print(f'{group:>10} | {name:<24} {params_text:<56} {seconds * 1000:10.1f}ms {result["throughput"] or 0:14,.0f} {unit} {extra_text}')
+        if extra.get('fill_coverage', 1.0) < MIN_FILL_COVERAGE:
+            print(f'{"":>10} | WARNING: last fill at {extra["fill_coverage"]:.0%} of the data, the rest of the run is idle bars')
+
+    def datasets(self):
+        """(이름, DataFrame) - 1h/btc와 synthetic"""
+        yield '1h/btc', self.load_bundled('1h', 'btc')
+        for n_bar in self.bars:
+            yield f'synthetic/{n_bar}', random_walk(n_bar)
+
+    def load_bundled(self, timeframe, symbol, use_store=True):
+        return load_price_data(market='crypto', symbol=symbol, timeframe=timeframe, start_date='2017-01-01', end_date='2100-01-01'
+                               , save_name=f'{symbol}.csv', use_store=use_store)
+
+    def bench_load(self):
+        for timeframe, symbol in BUNDLED:
+            # store가 없으면 첫 로드에서 변환되므로 변환 비용은 측정에서 제외
+            self.load_bundled(timeframe, symbol)
+            for use_store in [False, True]:
+                seconds, df = timeit(lambda: self.load_bundled(timeframe, symbol, use_store=use_store), self.n_repeat)
+                self.record('load', 'load_price_data', {'data': f'{timeframe}/{symbol}', 'source': 'store' if use_store else 'csv'}, seconds, len(df), 'bars/s')
+
+        for n_bar in self.bars:
+            df = random_walk(n_bar)
+            columns = {column: df[column].to_numpy() for column in STORE_COLUMNS}
+            columns['Date'] = df['Date'].to_numpy().astype('datetime64[ms]').view(np.int64)
+            store = PriceStore(os.path.join(self.tmp_dir, f'synthetic_{n_bar}_store'))
+            seconds, _ = timeit(lambda: store.write(columns), self.n_repeat)
+            self.record('load', 'PriceStore.write', {'data': f'synthetic/{n_bar}'}, seconds, n_bar, 'bars/s')
+            seconds, loaded = timeit(lambda: store.load(df['Date'].iloc[0], df['Date'].iloc[-1]), self.n_repeat)
+            self.record('load', 'PriceStore.load', {'data': f'synthetic/{n_bar}'}, seconds, len(loaded), 'bars/s')
+
+    def bench_indicators(self):
+        for name, df in self.datasets():
+            preprocessor = Preprocessor()
+            for column in INDICATOR_COLUMNS:
+                seconds, _ = timeit(lambda: preprocessor.make_column(column, df), self.n_repeat)
+                self.record('indicators', 'Preprocessor.make_column', {'data': name, 'column': column}, seconds, len(df), 'bars/s')
+
+            backtester = Backtesting(strategy_list=strategy_list(3))
+            seconds, _ = timeit(lambda: backtester.ready_data([{'BTCUSDT': df}]), self.n_repeat)
+            self.record('indicators', 'Backtesting.ready_data', {'data': name}, seconds, len(df), 'bars/s')
+
+    def bench_engine(self):
+        for name, df in self.datasets():
+            for n_strategy in self.strategy_counts:
+                for mode in ['bar', 'event_driven', 'stream']:
+                    def run():
+                        backtester = Backtesting(strategy_list=strategy_list(n_strategy), max_strategy_cnt=3 * n_strategy, total_balance=1e9)
+                        if mode == 'stream':
+                            backtester.run_stream(iter_frame_bars([{'BTCUSDT': df}]), progress=False)
+                        else:
+                            backtester.run([{'BTCUSDT': df}], event_driven=(mode == 'event_driven'), progress=False)
+                        return backtester
+                    seconds, backtester = timeit(run, self.n_repeat)
+                    self.record('engine', 'Backtesting.run', {'data': name, 'strategies': n_strategy, 'mode': mode}, seconds, len(df), 'bars/s'
+                                , **fill_coverage(backtester))
+
+        # multi asset (1h btc + eth)
+        datalist = [{'BTCUSDT': self.load_bundled('1h', 'btc')}, {'ETHUSDT': self.load_bundled('1h', 'eth')}]
+        for n_strategy in self.strategy_counts:
+            strategies = strategy_list(n_strategy, 'BTCUSDT') + strategy_list(n_strategy, 'ETHUSDT')
+            def run():
+                backtester = Backtesting(strategy_list=strategies, max_strategy_cnt=6 * n_strategy, total_balance=1e9)
+                backtester.run(datalist, progress=False)
+                return backtester
+            seconds, backtester = timeit(run, self.n_repeat)
+            bars = min(len(data_info[asset]) for data_info in datalist for asset in data_info)
+            self.record('engine', 'Backtesting.run', {'data': '1h/btc+eth', 'strategies': 2 * n_strategy, 'mode': 'bar'}, seconds, bars, 'bars/s'
+                        , **fill_coverage(backtester))
+
+    def bench_sweep(self):
+        datalist = [{'BTCUSDT': self.load_bundled('1h', 'btc')}]
+        param_grid = {'strategy_list': [strategy_list(n_strategy) for n_strategy in self.strategy_counts]
+                      , 'max_strategy_cnt': [3, 9]
+                      , 'max_strategy_simultaneously_cnt': [1, 3]}
+        n_combination = int(np.prod([len(values) for values in param_grid.values()]))
+        for event_driven in [False, True]:
+            seconds, df_result = timeit(lambda: run_sweep(param_grid, datalist, max_workers=self.max_workers, event_driven=event_driven), self.n_repeat)
+            self.record('sweep', 'run_sweep', {'data': '1h/btc', 'combinations': n_combination, 'event_driven': event_driven
+                                               , 'max_workers': self.max_workers or os.cpu_count()}, seconds, n_combination, 'combinations/s'
+                        , fills=int(df_result['fill_count'].min()))
+
+    def run(self, groups):
+        try:
+            for group in groups:
+                getattr(self, f'bench_{group}')()
+        finally:
+            shutil.rmtree(self.tmp_dir, ignore_errors=True)
+        return self.results
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    return {'commit': git_commit()
+            , 'time': pd.Timestamp.now().isoformat(timespec='seconds')
+            , 'python': platform.python_version()
+            , 'numpy': np.__version__
+            , 'pandas': pd.__version__
+            , 'platform': platform.platform()
+            , 'cpu_count': os.cpu_count()}
+
+
+def result_key(result):
+    return (result['group'], result['name'], json.dumps(result['params'], sort_keys=True))
+
+
+def compare(results, baseline_results, threshold):
+    """baseline 대비 시간 비율 출력. threshold배보다 느려진 항목 리스트 반환"""
+    baseline = {result_key(result): result for result in baseline_results}
+    regressions = []
+    print(f'\n{"":>10} | {"name":<24} {"params":<56} {"baseline":>10} {"now":>10} {"ratio":>7}')
+    for result in results:
+        old = baseline.get(result_key(result))
+        if old is None:
+            continue
+        ratio = result['seconds'] / old['seconds'] if old['seconds'] > 0 else float('inf')
+        params_text = ' '.join(f'{key}={value}' for key, value in result['params'].items())
+        flag = ' <- slower' if ratio > threshold else ''
+        print(f'{result["group"]:>10} | {result["name"]:<24} {params_text:<56} {old["seconds"] * 1000:8.1f}ms {result["seconds"] * 1000:8.1f}ms {ratio:6.2f}x{flag}')
+        if ratio > threshold:
+            regressions.append(result)
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Backtesting benchmark suite')
+    parser.add_argument('--groups', nargs='+', choices=GROUPS, default=GROUPS)
+    parser.add_argument('--bars', nargs='+', type=int, default=[1_000_000], help='synthetic 데이터 bar 개수')
+    parser.add_argument('--strategies', nargs='+', type=int, default=[1, 3, 10, 30], help='engine, sweep의 전략 개수')
+    parser.add_argument('--repeat', type=int, default=3, help='반복 횟수 (최소 시간 기록)')
+    parser.add_argument('--max-workers', type=int, default=None, help='run_sweep worker 개수')
+    parser.add_argument('--quick', action='store_true', help='--bars 100000 --strategies 1 10 --repeat 1')
+    parser.add_argument('--output', default=None, help='결과 json 경로. Defaults to benchmarks/results/<commit>.json')
+    parser.add_argument('--compare', default=None, help='비교할 이전 결과 json')
+    parser.add_argument('--threshold', type=float, default=1.2, help='--compare에서 이 배수보다 느려지면 regression')
+    args = parser.parse_args()
+    if args.quick:
+        args.bars, args.strategies, args.repeat = [100_000], [1, 10], 1
+
+    suite = BenchmarkSuite(bars=args.bars, strategy_counts=args.strategies, n_repeat=args.repeat, max_workers=args.max_workers)
+    report = {'environment': environment()
+              , 'config': {'groups': args.groups, 'bars': args.bars, 'strategies': args.strategies, 'repeat': args.repeat, 'trading_fee': TRADING_FEE}
+              , 'results': suite.run(args.groups)}
+
+    output = args.output or os.path.join('benchmarks', 'results', f'{report["environment"]["commit"] or "local"}.json')
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'\nsaved : {output}')
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline_report = json.load(f)
+        # trading_fee가 없는 이전 결과는 0.045 (거래가 초반에 멈춰서 engine, sweep 시간을 비교할 수 없음)
+        baseline_fee = baseline_report.get('config', {}).get('trading_fee', 0.045)
+        if baseline_fee != TRADING_FEE:
+            print(f'\nWARNING: baseline trading_fee={baseline_fee} != {TRADING_FEE}, engine and sweep timings are not comparable')
+        regressions = compare(report['results'], baseline_report['results'], args.threshold)
+        sys.exit(1 if regressions else 0)
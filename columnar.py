@@ -0,0 +1,168 @@
+import os
+import numpy as np
+import pandas as pd
+from typing import Dict, Tuple
+
+
+def write_mapped_column(path: str, values) -> np.memmap:
+    """values를 raw binary 파일로 저장하고 read-only memory-map으로 다시 열어서 반환.
+    여러 process가 같은 파일을 쓰더라도 완성된 파일만 보이도록 임시 파일에 쓴 뒤 교체.
+    """
+    values = np.ascontiguousarray(values, dtype=np.float64)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    values.tofile(tmp_path)
+    os.replace(tmp_path, path)
+    return map_column(path, 'float64', 0, len(values))
+
+
+def map_column(path: str, dtype: str, start: int, stop: int) -> np.ndarray:
+    """파일의 [start, stop) 구간을 read-only memory-map으로 열기"""
+    dtype = np.dtype(dtype)
+    if stop <= start:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r', offset=start * dtype.itemsize, shape=(stop - start,))
+
+
+class ColumnarFrame:
+    """pd.DataFrame을 컬럼별 연속(contiguous) numpy 배열로 한 번만 변환해 두는 클래스.
+
+    Backtesting.run에서 매 bar마다 df.iloc[didx, :]로 pd.Series를 만드는 비용을 없애기 위해 사용.
+    컬럼은 메모리 배열일 수도 있고 디스크 파일의 memory-map일 수도 있다 (from_store).
+    memory-map 컬럼은 pickle될 때 파일 위치만 전달되므로 worker process에서도 복사 없이 같은 파일을 map한다.
+    """
+    def __init__(self, df: pd.DataFrame):
+        self.columns: Dict[str, np.ndarray] = {}
+        # memory-map 컬럼의 원본 위치: column -> (path, dtype, start, stop, view_dtype)
+        self.sources: Dict[str, Tuple] = {}
+        for column in df.columns:
+            series = df[column]
+            if series.dtype.kind in 'biuf':
+                self.columns[column] = np.ascontiguousarray(series.to_numpy())
+            else:
+                # Date 등 datetime 컬럼은 pd.Timestamp 스칼라를 그대로 돌려주도록 ExtensionArray 유지
+                self.columns[column] = series.array
+        self.length = len(df)
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, column):
+        return self.columns[column]
+
+    def bar(self, idx: int) -> 'BarView':
+        """idx 번째 bar의 row view 반환"""
+        return BarView(self, idx)
+
+    @classmethod
+    def from_arrays(cls, columns: Dict[str, np.ndarray]) -> 'ColumnarFrame':
+        """컬럼 배열 dict로 생성. Date가 epoch ms 정수면 datetime64[ms]로 보이게 함."""
+        frame = cls.__new__(cls)
+        frame.columns = {column: np.ascontiguousarray(values) for column, values in columns.items()}
+        if 'Date' in frame.columns and frame.columns['Date'].dtype.kind in 'iu':
+            frame.columns['Date'] = frame.columns['Date'].astype(np.int64).view('datetime64[ms]')
+        frame.sources = {}
+        frame.length = len(next(iter(columns.values()))) if columns else 0
+        return frame
+
+    @classmethod
+    def from_sources(cls, sources: Dict[str, Tuple], length: int) -> 'ColumnarFrame':
+        """(path, dtype, start, stop, view_dtype) 위치 정보로 컬럼을 memory-map해서 생성 (zero-copy)"""
+        frame = cls.__new__(cls)
+        frame.columns, frame.sources, frame.length = {}, {}, length
+        for column, source in sources.items():
+            frame.add_mapped_column(column, *source)
+        return frame
+
+    @classmethod
+    def from_store(cls, store, start_date, end_date) -> 'ColumnarFrame':
+        """PriceStore의 날짜 범위를 memory-map으로 연 frame. Date는 datetime64[ms]로 보임."""
+        start, stop = store.search_range(start_date, end_date)
+        sources = {column: (store.column_path(column), dtype, start, stop, 'datetime64[ms]' if column == 'Date' else None)
+                   for column, dtype in store.meta['columns'].items()}
+        return cls.from_sources(sources, stop - start)
+
+    def add_mapped_column(self, column, path, dtype, start, stop, view_dtype=None):
+        values = map_column(path, dtype, start, stop)
+        self.columns[column] = values if view_dtype is None else values.view(view_dtype)
+        self.sources[column] = (path, dtype, start, stop, view_dtype)
+
+    def copy(self) -> 'ColumnarFrame':
+        """컬럼 dict만 복사한 frame (배열은 공유)"""
+        frame = ColumnarFrame.__new__(ColumnarFrame)
+        frame.columns, frame.sources, frame.length = dict(self.columns), dict(self.sources), self.length
+        return frame
+
+    def slice(self, start: int, stop: int = None) -> 'ColumnarFrame':
+        """[start, stop) 구간 view. memory-map 컬럼은 위치 정보도 함께 이동."""
+        stop = self.length if stop is None else min(stop, self.length)
+        frame = ColumnarFrame.__new__(ColumnarFrame)
+        frame.columns = {column: values[start:stop] for column, values in self.columns.items()}
+        frame.sources = {column: (path, dtype, source_start + start, source_start + stop, view_dtype)
+                         for column, (path, dtype, source_start, _, view_dtype) in self.sources.items()}
+        frame.length = max(stop - start, 0)
+        return frame
+
+    def valid_mask(self) -> np.ndarray:
+        """모든 float 컬럼에 NaN이 없는 bar 위치"""
+        valid = np.ones(self.length, dtype=bool)
+        for values in self.columns.values():
+            if values.dtype.kind == 'f':
+                valid &= ~np.isnan(values)
+        return valid
+
+    def take(self, mask) -> 'ColumnarFrame':
+        """mask가 True인 bar만 남긴 frame (복사)"""
+        frame = ColumnarFrame.__new__(ColumnarFrame)
+        frame.columns = {column: values[mask] for column, values in self.columns.items()}
+        frame.sources, frame.length = {}, int(np.count_nonzero(mask))
+        return frame
+
+    def to_pandas(self) -> pd.DataFrame:
+        """Preprocessor 입력용 DataFrame. 숫자 컬럼만 복사 없이 감쌈."""
+        return pd.DataFrame({column: values for column, values in self.columns.items() if values.dtype.kind in 'biuf'}, copy=False)
+
+    def __getstate__(self):
+        # memory-map 컬럼은 데이터 대신 위치 정보만 pickle
+        columns = {column: values for column, values in self.columns.items() if column not in self.sources}
+        return {'columns': columns, 'sources': self.sources, 'length': self.length}
+
+    def __setstate__(self, state):
+        self.columns, self.sources, self.length = {}, {}, state['length']
+        for column, source in state['sources'].items():
+            self.add_mapped_column(column, *source)
+        self.columns.update(state['columns'])
+
+
+class BarView:
+    """ColumnarFrame의 한 행을 가리키는 가벼운 view. check_data['MA5'] 형태의 접근을 지원."""
+    __slots__ = ('frame', 'idx')
+
+    def __init__(self, frame: ColumnarFrame, idx: int):
+        self.frame = frame
+        self.idx = idx
+
+    def __getitem__(self, column):
+        return self.frame.columns[column][self.idx]
+
+    def __contains__(self, column):
+        return column in self.frame.columns
+
+    def get(self, column, default=None):
+        values = self.frame.columns.get(column)
+        return default if values is None else values[self.idx]
+
+    def keys(self):
+        return self.frame.columns.keys()
+
+
+class LiveFrame:
+    """feed에서 받은 최신 bar 하나만 가지고 있는 frame (Backtesting.run_stream).
+    run_bar의 frames[asset].bar(didx)와 같은 방식으로 사용하며 bar()는 항상 최신 bar의 row를 반환.
+    """
+    __slots__ = ('row',)
+
+    def __init__(self, row=None):
+        self.row = row
+
+    def bar(self, idx: int):
+        return self.row
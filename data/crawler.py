@@ -10,8 +10,8 @@ import numpy as np
 import pandas as pd
 
 
-from typing import List, Union
-from fake_useragent import UserAgent
+from collections import deque
+from typing import AsyncIterator, Dict, List, Union
 from enum import Enum
 
 
@@ -19,36 +19,183 @@ class Endpoints(Enum):
     BINANCE_FUTURES_CANDLESTICK_API = 'https://fapi.binance.com/fapi/v1/klines'
 
 
+# interval 단위 -> ms
+INTERVAL_UNIT_MS = {'m': 60 * 1000, 'h': 60 * 60 * 1000, 'd': 24 * 60 * 60 * 1000, 'w': 7 * 24 * 60 * 60 * 1000}
+
+
+def interval_to_ms(interval:str) -> int:
+    """'15m', '1h', '1d' -> ms"""
+    return int(interval[:-1]) * INTERVAL_UNIT_MS[interval[-1]]
+
+
+def klines_weight(limit:int) -> int:
+    """Binance futures klines request weight (limit에 따라 다름)"""
+    if limit < 100:
+        return 1
+    if limit < 500:
+        return 2
+    if limit <= 1000:
+        return 5
+    return 10
+
+
+def candles_to_columns(candles:List, now_ms:int=None) -> Dict[str, np.ndarray]:
+    """klines 응답을 store 컬럼 형태(Date = Close time + 1, OHLCV float64)로 변환. 아직 끝나지 않은 bar는 제외."""
+    now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+    if len(candles) == 0:
+        return {'Date': np.empty(0, dtype=np.int64), **{column: np.empty(0) for column in ['Open', 'High', 'Low', 'Close', 'Volume']}}
+    
+    dates = np.fromiter((candle[6] for candle in candles), dtype=np.int64, count=len(candles)) + 1
+    values = np.array([candle[1:6] for candle in candles], dtype=np.float64)
+    mask = dates <= now_ms
+    columns = {column: np.ascontiguousarray(values[mask, i]) for i, column in enumerate(['Open', 'High', 'Low', 'Close', 'Volume'])}
+    columns['Date'] = dates[mask]
+    return columns
+
+
+class TokenBucket:
+    def __init__(self, capacity:float=2400, refill_per_sec:float=2400 / 60) -> None:
+        """request weight 기반 rate limiter. 기본값은 Binance futures의 분당 2400 weight.
+
+        Args:
+            capacity (float): 한 번에 사용할 수 있는 최대 weight
+            refill_per_sec (float): 초당 다시 채워지는 weight
+        """
+        self.capacity = capacity
+        self.refill_per_sec = refill_per_sec
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.refill_per_sec)
+        self.updated_at = now
+
+    async def acquire(self, weight:float=1):
+        """weight만큼 token이 모일 때까지 대기 후 사용. lock으로 요청 순서대로 처리."""
+        async with self.lock:
+            self.refill()
+            while self.tokens < weight:
+                await asyncio.sleep((weight - self.tokens) / self.refill_per_sec)
+                self.refill()
+            self.tokens -= weight
+
+
+
+# fake_useragent를 사용할 수 없을 때의 User-Agent
+DEFAULT_USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+
 
 class RestClient:
-    def __init__(self, loop) -> None:
-        self.ip_address : List[str] = ['0.0.0.0']
-        user_agent = UserAgent()
-
-        self.sessions = itertools.cycle([aiohttp.ClientSession(loop=loop,
-                                                               headers={'User-Agent':user_agent.random},
-                                                               json_serialize=orjson.dumps,
-                                                               connector=aiohttp.TCPConnector(local_addr=(ip, 0))) for ip in self.ip_address]
-                                        )
-        
+    def __init__(self, ip_address:List[str]=None, limit_per_host:int=16, keepalive_timeout:float=30, timeout:float=10, connect_timeout:float=5, user_agent:str=None) -> None:
+        """source ip별 connection pool을 가진 비동기 HTTP client.
+        session은 첫 요청 때 만들고(lazy), close()나 async with가 끝날 때 정리한다.
+
+            async with RestClient(timeout=5) as client:
+                response = await client.get(url, params)
+
+        Args:
+            ip_address (List[str]): 요청을 보낼 source ip 목록. ip마다 session(connection pool)을 하나씩 만들고 돌아가며 사용. Defaults to ['0.0.0.0'].
+            limit_per_host (int): session별 host당 최대 connection 수. Defaults to 16.
+            keepalive_timeout (float): 사용하지 않는 connection을 유지하는 시간(초). Defaults to 30.
+            timeout (float): 요청 하나의 전체 timeout(초). Defaults to 10.
+            connect_timeout (float): connection을 얻는 데까지의 timeout(초). Defaults to 5.
+            user_agent (str): 고정 User-Agent. 없으면 처음 session을 만들 때 fake_useragent로 생성.
+        """
+        self.ip_address : List[str] = ['0.0.0.0'] if ip_address is None else ip_address
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.timeout = aiohttp.ClientTimeout(total=timeout, connect=connect_timeout)
+        self._user_agent = user_agent
+        self.sessions : List[aiohttp.ClientSession] = []
+        self.session_cycle = None
+
+    @property
+    def user_agent(self) -> str:
+        # UserAgent()는 느리고 network를 사용할 수 있으므로 필요할 때 한 번만 import, 생성
+        if self._user_agent is None:
+            try:
+                from fake_useragent import UserAgent, FakeUserAgentError
+            except ImportError as e:
+                logger.warning(f"fake_useragent unavailable ({e!r}), use default User-Agent")
+                self._user_agent = DEFAULT_USER_AGENT
+                return self._user_agent
+            try:
+                self._user_agent = UserAgent().random
+            except FakeUserAgentError as e:
+                logger.warning(f"fake_useragent failed ({e!r}), use default User-Agent")
+                self._user_agent = DEFAULT_USER_AGENT
+        return self._user_agent
+
+    async def start(self):
+        """session 생성. 실행 중인 event loop 안에서 호출되어야 하므로 첫 요청 때 호출된다."""
+        if self.sessions:
+            return
+        self.sessions = [aiohttp.ClientSession(headers={'User-Agent':self.user_agent},
+                                               json_serialize=orjson.dumps,
+                                               timeout=self.timeout,
+                                               connector=aiohttp.TCPConnector(local_addr=(ip, 0),
+                                                                              limit_per_host=self.limit_per_host,
+                                                                              keepalive_timeout=self.keepalive_timeout)) for ip in self.ip_address]
+        self.session_cycle = itertools.cycle(self.sessions)
+
+    async def close(self):
+        """모든 session과 connection을 닫음. 다시 요청하면 새로 만든다."""
+        sessions, self.sessions, self.session_cycle = self.sessions, [], None
+        for session in sessions:
+            await session.close()
+
+    @property
+    def closed(self) -> bool:
+        return not self.sessions
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
     async def get(self,
                   url,
                   params=None,
-                  timeout=1,
+                  timeout:float=None,
                   headers=None) -> dict:
-        async with next(self.sessions).get(url=url, params=params, timeout=timeout, headers=headers) as response:
+        """GET 요청 후 json 반환. timeout이 없으면 client의 timeout 사용."""
+        await self.start()
+        timeout = self.timeout if timeout is None else aiohttp.ClientTimeout(total=timeout)
+        async with next(self.session_cycle).get(url=url, params=params, timeout=timeout, headers=headers) as response:
+            # 429(rate limit), 5xx 등은 예외로 올려서 호출하는 쪽에서 재시도 여부 결정
+            response.raise_for_status()
             return await response.json()
 
 
 
 class Crawler:
     
-    def __init__(self):
-        loop = asyncio.get_event_loop()
-        self.client = RestClient(loop)
+    def __init__(self, client:RestClient=None):
+        """client를 주지 않으면 기본 설정의 RestClient 사용. 끝나면 close()하거나 async with로 사용.
 
-    async def get_coin_candle_data(self, url, symbol:str, interval:str, startTime:int, limit:int=1500)->List:
+            async with Crawler() as crawler:
+                df = await crawler.get_coin_candle_range(url, 'BTCUSDT', '1h', '2024-01-01')
         """
+        self.client = RestClient() if client is None else client
+
+    async def close(self):
+        await self.client.close()
+
+    async def __aenter__(self):
+        await self.client.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def get_coin_candle_data(self, url, symbol:str, interval:str, startTime:int, limit:int=1500, endTime:int=None, max_retries:int=5, backoff:float=0.5)->List:
+        """page 하나 요청. 실패(429, 5xx, timeout 등)하면 backoff * 2^n 초 기다렸다가 재시도하고, max_retries번 모두 실패하면 예외를 올림.
+        빈 list는 요청 구간에 데이터가 없다는 뜻 (get_coin_candle_all은 여기서 멈춤).
+
         [
           [
             1499040000000,      // Open time
@@ -67,33 +214,46 @@ class Crawler:
         ]
 
         """
-        response = []
-        try:
-            params = {'symbol' : symbol,
-                    'interval' : interval,
-                    'startTime' : startTime,
-                    'limit' : limit}
-            
-            response = await self.client.get(url = url, params = params)
-            
-            if response:
-                startTime, endTime = response[0][0], response[-1][0]
-                logger.info(f"SYMBOL :{symbol} | startTime : {datetime.datetime.utcfromtimestamp(startTime/1000).strftime('%Y-%m-%d %H:%M:%S')}, endTime : {datetime.datetime.utcfromtimestamp(endTime/1000).strftime('%Y-%m-%d %H:%M:%S')}")
-            
-        except Exception as e:
-            logger.error(e)
+        params = {'symbol' : symbol,
+                  'interval' : interval,
+                  'startTime' : startTime,
+                  'limit' : limit}
+        if endTime is not None:
+            params['endTime'] = endTime
+        
+        for attempt in range(max_retries + 1):
+            try:
+                response = await self.client.get(url = url, params = params)
+                break
+            except Exception as e:
+                # 실패한 page를 빈 page로 넘기면 get_coin_candle_all이 데이터 끝으로 보고 멈추므로 재시도 후 예외를 올림
+                if attempt == max_retries:
+                    raise
+                wait = backoff * (2 ** attempt)
+                logger.warning(f"SYMBOL :{symbol} | page {startTime} failed ({e!r}), retry in {wait:.2f}s")
+                await asyncio.sleep(wait)
+        
+        if response:
+            startTime, endTime = response[0][0], response[-1][0]
+            logger.info(f"SYMBOL :{symbol} | startTime : {datetime.datetime.utcfromtimestamp(startTime/1000).strftime('%Y-%m-%d %H:%M:%S')}, endTime : {datetime.datetime.utcfromtimestamp(endTime/1000).strftime('%Y-%m-%d %H:%M:%S')}")
         return response
 
 
 
-    async def get_coin_candle_all(self, url, symbol:str, interval:str, startTime:int, limit:int=1500, save:bool=False, save_path:str='./') -> pd.DataFrame:
+    async def get_coin_candle_all(self, url, symbol:str, interval:str, startTime:Union[str, int], limit:int=1500, save:bool=False, save_path:str='./', endTime:Union[str, int]=None, sleep:float=1, max_retries:int=5, backoff:float=0.5) -> pd.DataFrame:
+        """startTime(YYYY-MM-DD 또는 ms)부터 endTime(open time 기준, 없으면 끝까지)까지의 candle 수집.
+        빈 page가 오면 끝까지 수집한 것으로 보고, 요청이 max_retries번 재시도 후에도 실패하면 예외를 올림 (일부만 저장하지 않음).
+        """
         logger.info(f"CRAWLING START | SYMBOL :{symbol}, INTERVAL : {interval}")
-        startTime = int(datetime.datetime.strptime(startTime, "%Y-%m-%d").timestamp() * 1000)
+        if isinstance(startTime, str):
+            startTime = int(datetime.datetime.strptime(startTime, "%Y-%m-%d").timestamp() * 1000)
+        if isinstance(endTime, str):
+            endTime = int(datetime.datetime.strptime(endTime, "%Y-%m-%d").timestamp() * 1000)
         
         candle_list, iter = [], 0
         
         while True:
-            response = await self.get_coin_candle_data(url, symbol, interval, startTime, limit)
+            response = await self.get_coin_candle_data(url, symbol, interval, startTime, limit, endTime, max_retries, backoff)
             
             # 반환 데이터 없으면 종료
             if len(response) == 0:
@@ -102,12 +262,15 @@ class Crawler:
             startTime = response[-1][6] + 1
             candle_list.extend(response)
             iter += 1
-            await asyncio.sleep(1)
+            # endTime까지 수집했으면 종료
+            if endTime is not None and startTime > endTime:
+                break
+            await asyncio.sleep(sleep)
 
         logger.info(f"CRAWLING END |SYMBOL :{symbol}, ITER : {iter}, DATA LENGTH : {len(candle_list)}")
         # dataframe 정리
         df_response = pd.DataFrame(candle_list, columns=['Open time', 'Open', 'High', 'Low', 'Close', 'Volume', 'Close time', 'Quote asset volume', 'Number of trades', 'Taker buy base asset volume', 'Taker buy quote asset volume', 'Ignore'])
-        df_response.drop(columns=['Quote asset volume', 'Number of trades', 'Taker buy base asset volume', 'Taker buy quote asset volume', 'Ignore'], axis=1, inplace=True)
+        df_response.drop(columns=['Quote asset volume', 'Number of trades', 'Taker buy base asset volume', 'Taker buy quote asset volume', 'Ignore'], inplace=True)
         
         if save:
             df_response.to_csv(path_or_buf=save_path, index=False)
@@ -115,28 +278,157 @@ class Crawler:
         return df_response
 
 
+    async def get_coin_candle_window(self, url, symbol:str, interval:str, startTime:int, endTime:int, limit:int, rate_limiter:TokenBucket, max_retries:int=5, backoff:float=0.5) -> List:
+        """window 하나(최대 limit개 candle) 요청. 실패하면 backoff * 2^n 초 기다렸다가 재시도."""
+        params = {'symbol' : symbol,
+                  'interval' : interval,
+                  'startTime' : startTime,
+                  'endTime' : endTime,
+                  'limit' : limit}
+        for attempt in range(max_retries + 1):
+            await rate_limiter.acquire(klines_weight(limit))
+            try:
+                return await self.client.get(url=url, params=params)
+            except Exception as e:
+                if attempt == max_retries:
+                    raise
+                wait = backoff * (2 ** attempt)
+                logger.warning(f"SYMBOL :{symbol} | window {startTime} failed ({e!r}), retry in {wait:.2f}s")
+                await asyncio.sleep(wait)
+
+
+
+    def split_windows(self, interval:str, startTime:Union[str, int], endTime:Union[str, int]=None, limit:int=1500) -> List:
+        """[startTime, endTime] (open time 기준)을 limit개 candle 단위 window [(start, end), ...]로 나눔. endTime이 없으면 현재 시각까지."""
+        if isinstance(startTime, str):
+            startTime = int(datetime.datetime.strptime(startTime, "%Y-%m-%d").timestamp() * 1000)
+        if isinstance(endTime, str):
+            endTime = int(datetime.datetime.strptime(endTime, "%Y-%m-%d").timestamp() * 1000)
+        if endTime is None:
+            endTime = int(time.time() * 1000)
+        window_ms = interval_to_ms(interval) * limit
+        return [(start, min(start + window_ms - 1, endTime)) for start in range(startTime, endTime + 1, window_ms)]
+
+
+
+    async def iter_coin_candle_range(self, url, symbol:str, interval:str, startTime:Union[str, int], endTime:Union[str, int]=None, limit:int=1500, max_concurrency:int=8, rate_limiter:TokenBucket=None, max_retries:int=5, backoff:float=0.5) -> AsyncIterator[List]:
+        """[startTime, endTime] 구간의 window 응답(page)을 시간 순서대로 yield.
+
+        최대 max_concurrency개 window만 동시에 요청하고 앞의 page가 소비되어야 다음 window를 요청하므로
+        메모리에는 max_concurrency개 page만 유지된다 (구간 길이와 무관).
+        """
+        rate_limiter = TokenBucket() if rate_limiter is None else rate_limiter
+        windows = deque(self.split_windows(interval, startTime, endTime, limit))
+        logger.info(f"CRAWLING START | SYMBOL :{symbol}, INTERVAL : {interval}, WINDOWS : {len(windows)}")
+        
+        pending = deque()
+        try:
+            while windows or pending:
+                while windows and len(pending) < max_concurrency:
+                    window_start, window_end = windows.popleft()
+                    pending.append(asyncio.ensure_future(self.get_coin_candle_window(url, symbol, interval, window_start, window_end, limit, rate_limiter, max_retries, backoff)))
+                yield await pending.popleft()
+        finally:
+            # 중간에 실패하거나 소비를 멈추면 남은 요청은 취소
+            for task in pending:
+                task.cancel()
+
+
+
+    async def get_coin_candle_range(self, url, symbol:str, interval:str, startTime:Union[str, int], endTime:Union[str, int]=None, limit:int=1500, max_concurrency:int=8, rate_limiter:TokenBucket=None, max_retries:int=5, backoff:float=0.5, save:bool=False, save_path:str='./') -> pd.DataFrame:
+        """[startTime, endTime] (open time 기준) 구간을 limit개 candle 단위 window로 나눠서 동시에 요청하고 순서대로 합침.
+
+        get_coin_candle_all과 같은 형태의 DataFrame 반환. endTime이 없으면 현재 시각까지.
+        긴 구간은 전체를 메모리에 모으지 않는 stream_coin_candle_range 사용.
+        """
+        candle_list, pages = [], 0
+        async for response in self.iter_coin_candle_range(url, symbol, interval, startTime, endTime, limit, max_concurrency, rate_limiter, max_retries, backoff):
+            candle_list.extend(response)
+            pages += 1
+        
+        logger.info(f"CRAWLING END |SYMBOL :{symbol}, WINDOWS : {pages}, DATA LENGTH : {len(candle_list)}")
+        df_response = pd.DataFrame(candle_list, columns=['Open time', 'Open', 'High', 'Low', 'Close', 'Volume', 'Close time', 'Quote asset volume', 'Number of trades', 'Taker buy base asset volume', 'Taker buy quote asset volume', 'Ignore'])
+        df_response.drop(columns=['Quote asset volume', 'Number of trades', 'Taker buy base asset volume', 'Taker buy quote asset volume', 'Ignore'], inplace=True)
+        
+        if save:
+            df_response.to_csv(path_or_buf=save_path, index=False)
+
+        return df_response
+
+
+
+    async def stream_coin_candle_range(self, url, symbol:str, interval:str, store, startTime:Union[str, int], endTime:Union[str, int]=None, limit:int=1500, max_concurrency:int=8, rate_limiter:TokenBucket=None, max_retries:int=5, backoff:float=0.5, flush_pages:int=8):
+        """[startTime, endTime] 구간을 crawling하면서 flush_pages개 page마다 store(data/store.py의 PriceStore)에 append.
+
+        - 메모리에는 요청 중인 page와 아직 쓰지 않은 page만 유지
+        - store에 이미 데이터가 있으면 마지막으로 저장된 bar 이후(open time = 마지막 Date)부터 다시 시작하므로
+          중간에 중단되어도 같은 호출로 이어서 수집
+        - 아직 끝나지 않은 bar는 저장하지 않음
+        """
+        if isinstance(startTime, str):
+            startTime = int(datetime.datetime.strptime(startTime, "%Y-%m-%d").timestamp() * 1000)
+        last_date = store.last_date() if store.exists() and len(store) else None
+        if last_date is not None and last_date >= startTime:
+            logger.info(f"RESUME | SYMBOL :{symbol}, from : {datetime.datetime.utcfromtimestamp(last_date/1000).strftime('%Y-%m-%d %H:%M:%S')}")
+            startTime = last_date
+        
+        buffer, rows = [], 0
+        def flush():
+            nonlocal buffer, last_date, rows
+            columns = candles_to_columns(buffer)
+            buffer = []
+            if last_date is not None:
+                # 이미 저장된 bar는 제외
+                keep = columns['Date'] > last_date
+                columns = {column: values[keep] for column, values in columns.items()}
+            if len(columns['Date']):
+                store.append(columns)
+                last_date, rows = int(columns['Date'][-1]), rows + len(columns['Date'])
+        
+        pages = 0
+        async for response in self.iter_coin_candle_range(url, symbol, interval, startTime, endTime, limit, max_concurrency, rate_limiter, max_retries, backoff):
+            buffer.extend(response)
+            pages += 1
+            if pages % flush_pages == 0:
+                flush()
+        flush()
+        
+        logger.info(f"CRAWLING END |SYMBOL :{symbol}, WINDOWS : {pages}, STORED : {rows}")
+        return store
+
+
 async def main(startTime):
-    cralwer = Crawler()
+    # data 폴더에서 실행하는 경우(python crawler.py)와 repo root에서 실행하는 경우 모두 지원
+    try:
+        from data.store import PriceStore
+    except ImportError:
+        from store import PriceStore
+    
     interval = '15m'
     
     # 수집할 코인의 symbol 리스트 수집
     symbolList = ['BTCUSDT', 'ETHUSDT', 'XRPUSDT', 'SOLUSDT', 'DOGEUSDT', 'AVAXUSDT', 'BCHUSDT']
     
-    # gather로 비동기 작업 병렬 실행
-    task = [
-        cralwer.get_coin_candle_all(
-            url=Endpoints.BINANCE_FUTURES_CANDLESTICK_API.value
-            , symbol=symbol
-            , interval=interval
-            , startTime=startTime
-            , limit=1500
-            , save=True
-            , save_path=f'./crypto/{interval}/{symbol.lower().replace("usdt", "")}.csv'
-        ) 
-        for symbol in symbolList
-    ]
+    # symbol 사이에서 rate limit을 공유
+    rate_limiter = TokenBucket()
     
-    await asyncio.gather(*task)
+    # gather로 비동기 작업 병렬 실행 (symbol 내부도 window 단위로 병렬)
+    # page 단위로 store(./crypto/15m/btc_store)에 저장하므로 중단되면 다시 실행해서 이어서 수집
+    async with Crawler() as cralwer:
+        task = [
+            cralwer.stream_coin_candle_range(
+                url=Endpoints.BINANCE_FUTURES_CANDLESTICK_API.value
+                , symbol=symbol
+                , interval=interval
+                , store=PriceStore(f'./crypto/{interval}/{symbol.lower().replace("usdt", "")}_store')
+                , startTime=startTime
+                , limit=1500
+                , rate_limiter=rate_limiter
+            ) 
+            for symbol in symbolList
+        ]
+        
+        await asyncio.gather(*task)
 
 
 
@@ -0,0 +1,73 @@
+"""
+Bar feed for Backtesting.run_stream.
+bar 하나는 모든 asset의 같은 Date bar를 담은 dict이며 Date 순서대로 전달된다.
+
+    {'BTCUSDT': {'Date': ..., 'Open': ..., 'High': ..., 'Low': ..., 'Close': ..., 'Volume': ...},
+     'ETHUSDT': {...}}
+
+    iter_column_bars: asset별 컬럼 배열을 chunk 단위로 잘라서 모든 asset에 있는 Date의 bar만 전달
+    iter_frame_bars : datalist(pd.DataFrame / ColumnarFrame)
+    iter_store_bars : PriceStore의 날짜 구간을 memory-map으로 읽음 (전체 기간을 메모리에 올리지 않음)
+    replay          : sync feed를 interval초 간격의 async feed로 (local replay feed로 paper trading)
+"""
+import asyncio
+import numpy as np
+from typing import Dict, Iterator, List
+
+from data.store import PriceStore, STORE_COLUMNS
+
+
+def chunk_rows(columns: Dict[str, np.ndarray], index: np.ndarray) -> List[Dict]:
+    """컬럼 배열에서 index 위치의 row dict 리스트. Date는 datetime64[ms], 숫자는 python 스칼라"""
+    names = list(columns)
+    values = [columns[name][index] if name == 'Date' else columns[name][index].tolist() for name in names]
+    return [dict(zip(names, row)) for row in zip(*values)]
+
+
+def iter_column_bars(columns: Dict[str, Dict[str, np.ndarray]], chunk_size: int = 4096) -> Iterator[Dict[str, Dict]]:
+    """{asset: {column: 배열}}을 chunk_size bar씩 읽어서 공통 Date의 bar 전달. 배열은 Date 순으로 정렬되어 있어야 함"""
+    positions = {asset: 0 for asset in columns}
+    lengths = {asset: len(asset_columns['Date']) for asset, asset_columns in columns.items()}
+    while columns and all(positions[asset] < lengths[asset] for asset in columns):
+        chunks = {}
+        for asset, asset_columns in columns.items():
+            start = positions[asset]
+            chunk = {column: np.asarray(values[start:start + chunk_size]) for column, values in asset_columns.items()}
+            chunk['Date'] = chunk['Date'].astype('datetime64[ms]')
+            chunks[asset] = chunk
+
+        # 모든 asset의 chunk에 들어있는 구간까지만 처리 (나머지는 다음 chunk)
+        chunk_end = min(chunk['Date'][-1] for chunk in chunks.values())
+        common_dates = None
+        for asset, chunk in chunks.items():
+            count = int(np.searchsorted(chunk['Date'], chunk_end, side='right'))
+            positions[asset] += count
+            common_dates = chunk['Date'][:count] if common_dates is None else np.intersect1d(common_dates, chunk['Date'][:count])
+
+        rows = {asset: chunk_rows(chunk, np.searchsorted(chunk['Date'], common_dates)) for asset, chunk in chunks.items()}
+        for idx in range(len(common_dates)):
+            yield {asset: asset_rows[idx] for asset, asset_rows in rows.items()}
+
+
+def iter_frame_bars(datalist: List[Dict], chunk_size: int = 4096) -> Iterator[Dict[str, Dict]]:
+    """Backtesting.run에 전달하는 형태의 datalist를 bar 단위로 전달"""
+    columns = {asset: {column: np.asarray(df[column]) for column in df.columns}
+               for data_info in datalist for asset, df in data_info.items()}
+    return iter_column_bars(columns, chunk_size)
+
+
+def iter_store_bars(stores: Dict[str, PriceStore], start_date, end_date, chunk_size: int = 4096) -> Iterator[Dict[str, Dict]]:
+    """asset별 PriceStore의 [start_date, end_date] 구간을 chunk_size bar씩 memory-map으로 읽어서 전달"""
+    columns = {}
+    for asset, store in stores.items():
+        start, stop = store.search_range(start_date, end_date)
+        columns[asset] = {column: store.column(column, start, stop) for column in STORE_COLUMNS}
+        columns[asset]['Date'] = columns[asset]['Date'].view('datetime64[ms]')
+    return iter_column_bars(columns, chunk_size)
+
+
+async def replay(feed, interval: float = 0.0):
+    """sync feed를 async feed로 전달. interval초마다 bar 하나 (실시간 feed 흉내)"""
+    for bars in feed:
+        yield bars
+        await asyncio.sleep(interval)
@@ -3,17 +3,190 @@ Handles loading historical price data
 If data is exist load the data else crawling data and load.
 """
 import os
+import time
+import asyncio
+import numpy as np
 import pandas as pd
 from loguru import logger
+from concurrent.futures import ThreadPoolExecutor
 
+from data.store import PriceStore, store_path_of, to_epoch_ms
+from data.resample import timeframe_to_ms, resample_store
+from data.crawler import Crawler, Endpoints
 
-def load_price_data(market:str, symbol:str, timeframe:str, start_date:str, end_date:str, save_name:str) -> pd.DataFrame:
+
+def read_csv_data(file_path:str, start_date:str, end_date:str) -> pd.DataFrame:
+    """csv 전체를 읽은 뒤 날짜 범위로 필터링 (store가 없을 때의 기존 로드 방식)"""
+    # 데이터 로드
+    df = pd.read_csv(file_path)
+    # 데이터 전처리
+    df.drop('Open time', axis=1, inplace=True)
+    df['Close time'] = pd.to_datetime(df['Close time']+1,unit='ms')
+    df.rename({'Close time' : 'Date'}, axis=1, inplace=True)
+    df = df[(df['Date'] >= start_date) & (df['Date'] <= end_date)].reset_index(drop=True)
+    return df[['Date', 'Open', 'High', 'Low', 'Close', 'Volume']]
+
+
+def find_finer_source(market:str, timeframe:str, save_name:str):
+    """timeframe을 만들 수 있는 (나누어 떨어지는) 더 작은 timeframe 중 가장 작은 timeframe의 데이터 경로"""
+    market_dir = os.path.join(os.getcwd(), 'data', market)
+    target_ms = timeframe_to_ms(timeframe)
+    candidates = []
+    for source_timeframe in (os.listdir(market_dir) if os.path.isdir(market_dir) else []):
+        try:
+            source_ms = timeframe_to_ms(source_timeframe)
+        except (AssertionError, ValueError):
+            continue
+        file_path = os.path.join(market_dir, source_timeframe, save_name)
+        source_store = PriceStore(store_path_of(file_path))
+        # resample로 만든 store는 원본 데이터가 아니므로 제외
+        is_original = os.path.isfile(file_path) or (source_store.exists() and 'source' not in source_store.meta)
+        if source_ms < target_ms and target_ms % source_ms == 0 and is_original:
+            candidates.append((source_ms, file_path))
+    return min(candidates)[1] if candidates else None
+
+
+def open_store(market:str, timeframe:str, save_name:str, resample:bool=True):
+    """timeframe 데이터의 PriceStore를 반환.
+        (1) store가 있으면 그대로 사용 (resample로 만든 store는 원본이 바뀌었으면 다시 계산)
+        (2) csv만 있거나 store로 변환한 뒤 csv가 바뀌었으면 (다시 crawling, 수정) store로 변환
+        (3) 둘 다 없으면 가장 작은 timeframe 데이터에서 resample해서 저장
+        데이터가 없으면 None
+    """
+    file_path = os.path.join(os.getcwd(), 'data', market, timeframe, save_name)
+    store = PriceStore(store_path_of(file_path))
+
+    if store.exists() and 'source' not in store.meta:
+        if not os.path.isfile(file_path) or store.matches_csv(file_path):
+            return store
+        logger.info(f"csv changed after conversion : {file_path}")
+
+    if os.path.isfile(file_path):
+        logger.info(f"Convert csv to store : {file_path} -> {store.path}")
+        return PriceStore.from_csv(file_path, store.path)
+
+    if resample:
+        source_path = find_finer_source(market, timeframe, save_name)
+        if source_path is not None:
+            source = open_store(market, os.path.basename(os.path.dirname(source_path)), save_name, resample=False)
+            logger.info(f"Resampled data from : {source.path} -> {timeframe}")
+            return resample_store(source, timeframe, store.path)
+    return None
+
+
+def binance_symbol(symbol:str) -> str:
+    """'btc' -> 'BTCUSDT'"""
+    symbol = symbol.upper()
+    return symbol if symbol.endswith('USDT') else f'{symbol}USDT'
+
+
+def run_async(coroutine_function):
+    """동기 함수에서 coroutine 실행. jupyter처럼 이미 event loop가 돌고 있으면 별도 thread에서 실행."""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        loop_running = False
+    else:
+        loop_running = True
+    
+    if not loop_running:
+        return asyncio.run(coroutine_function())
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coroutine_function()).result()
+
+
+def crawl_candles(url:str, symbol:str, timeframe:str, start_ms:int, end_ms:int) -> dict:
+    """Date(bar 종료 시각)가 [start_ms, end_ms]인 bar만 crawling해서 store 컬럼 형태로 반환. 아직 끝나지 않은 bar는 제외."""
+    timeframe_ms = timeframe_to_ms(timeframe)
+
+    async def crawl():
+        async with Crawler() as crawler:
+            # Date = open time + timeframe 이므로 open time 기준 구간으로 요청
+            return await crawler.get_coin_candle_range(url=url
+                                                       , symbol=binance_symbol(symbol)
+                                                       , interval=timeframe
+                                                       , startTime=start_ms - timeframe_ms
+                                                       , endTime=end_ms - timeframe_ms)
+
+    df = run_async(crawl)
+    dates = df['Close time'].to_numpy(dtype=np.int64) + 1 if len(df) else np.empty(0, dtype=np.int64)
+    now_ms = int(time.time() * 1000)
+    mask = (dates >= start_ms) & (dates <= min(end_ms, now_ms))
+    columns = {column: df[column].to_numpy(dtype=np.float64)[mask] if len(df) else np.empty(0) for column in ['Open', 'High', 'Low', 'Close', 'Volume']}
+    columns['Date'] = dates[mask]
+    return columns
+
+
+def stream_candles(store:PriceStore, url:str, symbol:str, timeframe:str, start_ms:int, end_ms:int) -> PriceStore:
+    """Date가 [start_ms, end_ms]인 bar를 crawling하면서 page 단위로 store 뒤에 append. 
+        store의 마지막 bar 이후 구간에만 사용. 중단되면 마지막으로 저장된 bar부터 이어서 수집.
+    """
+    timeframe_ms = timeframe_to_ms(timeframe)
+
+    async def crawl():
+        async with Crawler() as crawler:
+            return await crawler.stream_coin_candle_range(url=url
+                                                          , symbol=binance_symbol(symbol)
+                                                          , interval=timeframe
+                                                          , store=store
+                                                          , startTime=start_ms - timeframe_ms
+                                                          , endTime=end_ms - timeframe_ms)
+
+    return run_async(crawl)
+
+
+def find_missing_ranges(store:PriceStore, timeframe:str, start_ms:int, end_ms:int, fill_gaps:bool=False) -> list:
+    """store에 없는 Date 구간 [(start_ms, end_ms), ...]"""
+    coverage = store.coverage() if store.exists() else None
+    if coverage is None:
+        return [(start_ms, end_ms)] if start_ms <= end_ms else []
+
+    missing = []
+    coverage_start, coverage_end = coverage
+    if start_ms < coverage_start:
+        missing.append((start_ms, min(end_ms, coverage_start - 1)))
+    if fill_gaps:
+        # 중간에 빠진 bar (거래소 점검 등으로 원래 없는 구간일 수 있으므로 요청할 때만)
+        dates = np.asarray(store.column('Date'))
+        gap_idx = np.flatnonzero(np.diff(dates) > timeframe_to_ms(timeframe))
+        missing.extend((int(dates[i]) + 1, int(dates[i + 1]) - 1) for i in gap_idx
+                       if dates[i] < end_ms and dates[i + 1] > start_ms)
+    if end_ms > coverage_end:
+        missing.append((max(start_ms, coverage_end + 1), end_ms))
+    return missing
+
+
+def update_store(store:PriceStore, symbol:str, timeframe:str, start_date:str, end_date:str, url:str=Endpoints.BINANCE_FUTURES_CANDLESTICK_API.value, fill_gaps:bool=False) -> PriceStore:
+    """store에 없는 [start_date, end_date] 구간만 crawling해서 저장.
+        - 마지막 데이터 이후 구간은 page 단위로 기존 파일 뒤에 append (다시 쓰지 않음, stream_candles)
+        - 앞쪽이나 중간 구간은 merge (다시 씀)
+    """
+    now_ms = int(time.time() * 1000)
+    start_ms, end_ms = to_epoch_ms(start_date, ceil=True), min(to_epoch_ms(end_date), now_ms)
+
+    for missing_start, missing_end in find_missing_ranges(store, timeframe, start_ms, end_ms, fill_gaps):
+        logger.info(f"Crawl missing range | {symbol} {timeframe} : {pd.to_datetime(missing_start, unit='ms')} ~ {pd.to_datetime(missing_end, unit='ms')}")
+        if not store.exists() or len(store) == 0 or missing_start > store.last_date():
+            stream_candles(store, url, symbol, timeframe, missing_start, missing_end)
+            continue
+        columns = crawl_candles(url, symbol, timeframe, missing_start, missing_end)
+        if len(columns['Date']) == 0:
+            continue
+        if store.exists() and len(store) and columns['Date'][0] > store.last_date():
+            store.append(columns)
+        else:
+            store.merge(columns)
+
+    if store.exists():
+        coverage_start, coverage_end = store.coverage() or (start_ms, end_ms)
+        store.save_meta(len(store), coverage=[min(coverage_start, start_ms), max(coverage_end, end_ms)])
+    return store
+
+
+def load_price_data(market:str, symbol:str, timeframe:str, start_date:str, end_date:str, save_name:str, use_store:bool=True, crawl:bool=False, url:str=Endpoints.BINANCE_FUTURES_CANDLESTICK_API.value, fill_gaps:bool=False) -> pd.DataFrame:
     """Functions that load data. Load data if it already exists in the folder. Crawling and loading non-existent data
 
-    TODO
-        1. 데이터 없을 시 crwaling해서 로드하는 부분 추가.
-        2. 데이터 일부분만 없을 시 crwaling하고 기존 파일하고 병합하는 부분 추가.
-        2. 데이터의 범위에 end time도 포함 필요.
+    crawl=True이면 store에 없는 구간만 crawling해서 store에 저장한 뒤 로드. (update_store)
 
     Args:
         market (str): market type - "stock" or "crypto"
@@ -22,6 +195,11 @@ def load_price_data(market:str, symbol:str, timeframe:str, start_date:str, end_d
         start_date (str): start_date - YYYY-MM-DD
         end_date (str): end_date - YYYY-MM-DD
         save_name (str): btc.csv, eth.csv
+        use_store (bool): csv 대신 columnar binary store(data/store.py)에서 날짜 범위만 로드. 
+                          store가 없으면 csv에서 한 번 변환하고, csv도 없으면 더 작은 timeframe 데이터에서 resample. Defaults to True.
+        crawl (bool): 없는 구간을 crawling. resample한 데이터는 원본(작은 timeframe) store를 채운 뒤 다시 resample. Defaults to False.
+        url (str): klines API 주소. Defaults to Binance futures klines.
+        fill_gaps (bool): crawl할 때 중간에 빠진 bar도 다시 요청. Defaults to False.
 
     Returns:
         pd.DataFrmae: stock data. open, high, low, cloase, volumne
@@ -33,23 +211,30 @@ def load_price_data(market:str, symbol:str, timeframe:str, start_date:str, end_d
     file_path = os.path.join(os.getcwd(), 'data', market, timeframe, save_name)
     logger.info(file_path)
 
+    store = open_store(market, timeframe, save_name) if use_store else None
+
+    if crawl:
+        if store is not None and 'source' in store.meta:
+            # resample한 store는 원본 store를 채운 뒤 다시 resample
+            source = PriceStore(store.meta['source']['path'])
+            source_timeframe = os.path.basename(os.path.dirname(source.path))
+            update_store(source, symbol, source_timeframe, start_date, end_date, url=url, fill_gaps=fill_gaps)
+            store = resample_store(source, timeframe, store.path)
+        else:
+            store = update_store(store or PriceStore(store_path_of(file_path)), symbol, timeframe, start_date, end_date, url=url, fill_gaps=fill_gaps)
+
+    if store is not None and store.exists():
+        logger.info(f"Data already exist!!, Load Data from : {store.path}")
+        return store.load(start_date, end_date)
+
     if os.path.isfile(file_path):
         logger.info(f"Data already exist!!, Load Data from : {file_path}")
         
         if market == 'crypto':
-            # 데이터 로드
-            df = pd.read_csv(file_path)
-            # 데이터 전처리
-            df.drop('Open time', axis=1, inplace=True)
-            df['Close time'] = pd.to_datetime(df['Close time']+1,unit='ms')
-            df.rename({'Close time' : 'Date'}, axis=1, inplace=True)
-            df = df[(df['Date'] >= start_date) & (df['Date'] <= end_date)].reset_index(drop=True)
-            return df[['Date', 'Open', 'High', 'Low', 'Close', 'Volume']]
+            return read_csv_data(file_path, start_date, end_date)
     
     else:  
-        pass
-        # 크롤링 데이터
-        # 로드 데이터
+        logger.warning(f"Data does not exist : {file_path}, use crawl=True to crawl the data")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,114 @@
+"""
+Multi-timeframe resampling.
+가장 작은 timeframe의 bar로 더 큰 timeframe(4h, 1d, 1w ...)의 OHLCV를 벡터화해서 계산.
+Date는 bar 종료 시각(Close time + 1)이며 bar는 UTC 기준 timeframe 경계로 묶는다. (1w는 Binance와 같이 월요일 시작)
+"""
+import numpy as np
+from typing import Dict
+
+# timeframe 단위 -> ms
+TIMEFRAME_UNIT_MS = {'m': 60 * 1000, 'h': 60 * 60 * 1000, 'd': 24 * 60 * 60 * 1000, 'w': 7 * 24 * 60 * 60 * 1000}
+# 1970-01-01(목) 이후 첫 월요일까지의 시간. 1w bar 경계 기준
+WEEK_OFFSET_MS = 4 * TIMEFRAME_UNIT_MS['d']
+
+
+def timeframe_to_ms(timeframe: str) -> int:
+    """'15m', '4h', '1d', '1w' -> ms"""
+    assert timeframe[-1] in TIMEFRAME_UNIT_MS, ValueError(f"Unsupported timeframe : {timeframe}")
+    return int(timeframe[:-1]) * TIMEFRAME_UNIT_MS[timeframe[-1]]
+
+
+def to_epoch_ms(dates) -> np.ndarray:
+    """Date 배열(epoch ms int64, datetime64[ns], datetime64[ms] ...) -> epoch ms int64"""
+    dates = np.asarray(dates)
+    if dates.dtype.kind == 'M':
+        return dates.astype('datetime64[ms]').astype(np.int64)
+    return dates.astype(np.int64)
+
+
+def bucket_close_time(dates_ms: np.ndarray, timeframe: str) -> np.ndarray:
+    """각 bar가 속하는 timeframe bar의 종료 시각 (epoch ms)"""
+    timeframe_ms = timeframe_to_ms(timeframe)
+    offset = WEEK_OFFSET_MS if timeframe[-1] == 'w' else 0
+    # bar 종료 시각 - 1ms는 bar 안의 마지막 시점이므로 bar가 속한 구간을 정확히 가리킴
+    return ((dates_ms - 1 - offset) // timeframe_ms + 1) * timeframe_ms + offset
+
+
+def resample_ohlcv(columns: Dict[str, np.ndarray], timeframe: str, drop_partial: bool = True, base_ms: int = None) -> Dict[str, np.ndarray]:
+    """Date 기준으로 정렬된 OHLCV 컬럼을 timeframe으로 묶기.
+
+    Args:
+        columns (dict): {'Date', 'Open', 'High', 'Low', 'Close', 'Volume'} 배열
+        timeframe (str): 목표 timeframe
+        drop_partial (bool, optional): 구간의 일부 bar만 있는 처음, 마지막 bar를 버림.
+            마지막 bar는 마지막 Date가 구간 종료 시각 전이면(아직 끝나지 않은 구간), 처음 bar는 첫 bar의 시작 시각이 구간 시작 시각 뒤면 일부만 있는 구간.
+            False면 그대로 두고 일부만 있는 bar인지를 'Partial' 컬럼(bool)으로 표시. Defaults to True.
+        base_ms (int, optional): 원본 bar 하나의 길이(ms). None이면 Date 간격의 최솟값 (bar가 하나뿐이면 처음 bar는 확인하지 않음).
+
+    Returns:
+        dict: 같은 컬럼 구성, Date는 epoch ms.
+    """
+    dates_ms = to_epoch_ms(columns['Date'])
+    close_time = bucket_close_time(dates_ms, timeframe)
+    if base_ms is None and len(dates_ms) > 1:
+        base_ms = int(np.diff(dates_ms).min())
+    # 마지막 bar의 종료 시각이 구간 종료 시각과 같아야 끝난 구간, 첫 bar의 시작 시각이 구간 시작 시각과 같아야 처음부터 있는 구간
+    last_partial = len(dates_ms) > 0 and dates_ms[-1] != close_time[-1]
+    first_partial = len(dates_ms) > 0 and base_ms is not None and dates_ms[0] - base_ms != close_time[0] - timeframe_to_ms(timeframe)
+    lo, hi = 0, len(dates_ms)
+    if drop_partial:
+        if last_partial:
+            hi = int(np.searchsorted(close_time, close_time[-1], side='left'))
+        if first_partial:
+            lo = min(int(np.searchsorted(close_time, close_time[0], side='right')), hi)
+    if lo == hi:
+        empty = {column: np.empty(0, dtype=np.int64 if column == 'Date' else np.float64) for column in ['Date', 'Open', 'High', 'Low', 'Close', 'Volume']}
+        return empty if drop_partial else dict(empty, Partial=np.empty(0, dtype=bool))
+    close_time = close_time[lo:hi]
+    
+    # 각 구간이 시작하는 bar 위치 (lo 기준)
+    starts = np.flatnonzero(np.r_[True, close_time[1:] != close_time[:-1]])
+    ends = np.r_[starts[1:], hi - lo] - 1
+    
+    resampled = {'Date': close_time[starts]
+                 , 'Open': np.asarray(columns['Open'])[lo:hi][starts]
+                 , 'High': np.maximum.reduceat(np.asarray(columns['High'])[lo:hi], starts)
+                 , 'Low': np.minimum.reduceat(np.asarray(columns['Low'])[lo:hi], starts)
+                 , 'Close': np.asarray(columns['Close'])[lo:hi][ends]
+                 , 'Volume': np.add.reduceat(np.asarray(columns['Volume'], dtype=np.float64)[lo:hi], starts)}
+    if not drop_partial:
+        resampled['Partial'] = np.zeros(len(starts), dtype=bool)
+        resampled['Partial'][0] |= first_partial
+        resampled['Partial'][-1] |= last_partial
+    return resampled
+
+
+def align_to_base(high_dates, high_values: np.ndarray, base_dates) -> np.ndarray:
+    """큰 timeframe의 값을 작은 timeframe bar에 맞춤 (look-ahead 없음).
+
+    base bar(종료 시각 t)에서는 종료 시각이 t 이하인, 즉 이미 끝난 큰 timeframe bar의 값만 보인다.
+    """
+    high_dates_ms, base_dates_ms = to_epoch_ms(high_dates), to_epoch_ms(base_dates)
+    idx = np.searchsorted(high_dates_ms, base_dates_ms, side='right') - 1
+    aligned = np.full(len(base_dates_ms), np.nan)
+    visible = idx >= 0
+    aligned[visible] = np.asarray(high_values, dtype=np.float64)[idx[visible]]
+    return aligned
+
+
+def resample_store(source, timeframe: str, path: str):
+    """source PriceStore를 timeframe으로 resample해서 path에 저장 (cache).
+    source 길이와 csv 변환 기록이 그대로면 저장된 결과를 재사용하고, source가 늘었거나 csv에서 다시 변환되었으면 다시 계산.
+    아직 끝나지 않은 마지막 구간은 저장하지 않으며 source가 그 구간 끝까지 채워진 뒤 다시 계산할 때 저장된다.
+    source가 구간 중간에서 시작하면 처음 구간도 저장하지 않는다.
+    """
+    from data.store import PriceStore, STORE_COLUMNS
+
+    store = PriceStore(path)
+    source_info = {'path': source.path, 'length': len(source), 'csv': source.meta.get('csv')}
+    if store.exists() and store.meta.get('source') == source_info:
+        return store
+    
+    resampled = resample_ohlcv({column: source.column(column) for column in STORE_COLUMNS}, timeframe)
+    store.write(resampled, source=source_info)
+    return store
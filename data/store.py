@@ -0,0 +1,171 @@
+"""
+Columnar binary price store.
+컬럼별 raw binary 파일(<column>.bin)과 meta.json으로 구성되며 Date 기준으로 정렬되어 있다.
+날짜 범위 로드는 Date 컬럼 binary search 후 필요한 구간만 memory-map으로 읽는다.
+
+    data/crypto/1h/btc_store/
+        meta.json   {"length": 42325, "columns": {"Date": "int64", "Open": "float64", ...}, "csv": {"mtime_ns": ..., "size": ...}}
+        Date.bin    int64, epoch ms (bar 종료 시각 = Close time + 1)
+        Open.bin    float64
+        ...
+"""
+import os
+import json
+import numpy as np
+import pandas as pd
+from typing import Dict, Optional, Tuple
+
+# 컬럼 이름 -> dtype. Date는 epoch ms
+STORE_COLUMNS = {'Date': 'int64', 'Open': 'float64', 'High': 'float64', 'Low': 'float64', 'Close': 'float64', 'Volume': 'float64'}
+
+
+def store_path_of(csv_path: str) -> str:
+    """data/crypto/1h/btc.csv -> data/crypto/1h/btc_store"""
+    return os.path.splitext(csv_path)[0] + '_store'
+
+
+def csv_signature(csv_path: str) -> Dict[str, int]:
+    """csv 변경 확인용 수정 시각, 크기. from_csv로 변환한 store의 meta.json에 기록"""
+    stat = os.stat(csv_path)
+    return {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}
+
+
+def to_epoch_ms(date, ceil=False) -> int:
+    """'YYYY-MM-DD' 등 날짜를 epoch ms로 변환. ceil=True면 ms 미만을 올림."""
+    ns = pd.Timestamp(date).value
+    return -(-ns // 10**6) if ceil else ns // 10**6
+
+
+class PriceStore:
+    def __init__(self, path: str):
+        self.path = path
+        self.meta_path = os.path.join(path, 'meta.json')
+        self.meta = None
+        if os.path.isfile(self.meta_path):
+            with open(self.meta_path) as f:
+                self.meta = json.load(f)
+
+    def exists(self) -> bool:
+        return self.meta is not None
+
+    def __len__(self):
+        return self.meta['length'] if self.exists() else 0
+
+    def column_path(self, column) -> str:
+        return os.path.join(self.path, f'{column}.bin')
+
+    def save_meta(self, length, **extra):
+        # 기존 meta의 다른 정보(resample source 등)는 유지
+        meta = dict(self.meta or {}, **extra)
+        meta.update({'length': int(length), 'columns': STORE_COLUMNS})
+        tmp_path = f'{self.meta_path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f)
+        # meta.json이 바뀌는 순간 새 길이가 반영되도록 교체
+        os.replace(tmp_path, self.meta_path)
+        self.meta = meta
+
+    def write(self, columns: Dict[str, np.ndarray], **extra):
+        """전체 데이터를 새로 저장. extra는 meta.json에 함께 기록"""
+        os.makedirs(self.path, exist_ok=True)
+        for column, dtype in STORE_COLUMNS.items():
+            np.ascontiguousarray(columns[column], dtype=dtype).tofile(self.column_path(column))
+        self.save_meta(len(columns['Date']), **extra)
+
+    def extended_coverage(self, dates: np.ndarray) -> list:
+        """기존 coverage에 dates 구간을 더한 coverage (새로 저장한 데이터도 확인이 끝난 구간)"""
+        coverage = self.coverage() if self.exists() else None
+        start, end = int(dates[0]), int(dates[-1])
+        return [start, end] if coverage is None else [min(coverage[0], start), max(coverage[1], end)]
+
+    def append(self, columns: Dict[str, np.ndarray]):
+        """기존 파일 뒤에 이어서 저장 (기존 데이터는 다시 쓰지 않음). Date는 기존 마지막 Date보다 커야 함.
+            coverage도 append한 마지막 Date까지 늘림 (다음 find_missing_ranges에서 다시 crawling하지 않도록)
+        """
+        if not self.exists():
+            return self.write(columns)
+
+        length, add = len(self), len(columns['Date'])
+        if add == 0:
+            return
+        if length > 0:
+            assert int(columns['Date'][0]) > self.last_date(), 'appended data must be later than the stored data'
+        coverage = self.extended_coverage(columns['Date'])
+
+        for column, dtype in STORE_COLUMNS.items():
+            itemsize = np.dtype(dtype).itemsize
+            with open(self.column_path(column), 'r+b') as f:
+                # meta에 반영되지 않은 (중단된 append의) 꼬리 데이터는 버림
+                f.truncate(length * itemsize)
+                f.seek(length * itemsize)
+                f.write(np.ascontiguousarray(columns[column], dtype=dtype).tobytes())
+        self.save_meta(length + add, coverage=coverage)
+
+    def merge(self, columns: Dict[str, np.ndarray]):
+        """기존 데이터와 합쳐서 Date 순으로 다시 저장 (같은 Date는 새 데이터 사용). 앞쪽이나 중간 구간을 채울 때 사용."""
+        if not self.exists() or len(self) == 0:
+            return self.write(columns)
+        if len(columns['Date']) == 0:
+            return
+        
+        coverage = self.extended_coverage(columns['Date'])
+        merged = {column: np.concatenate([np.asarray(columns[column], dtype=dtype), np.array(self.column(column))])
+                  for column, dtype in STORE_COLUMNS.items()}
+        # 새 데이터가 앞에 있으므로 stable 정렬 후 같은 Date 중 첫 번째(새 데이터)만 남김
+        order = np.argsort(merged['Date'], kind='stable')
+        dates = merged['Date'][order]
+        keep = order[np.r_[True, dates[1:] != dates[:-1]]]
+        self.write({column: values[keep] for column, values in merged.items()}, coverage=coverage)
+
+    def coverage(self) -> Optional[Tuple[int, int]]:
+        """확인이 끝난 Date 구간 (epoch ms). 거래소에 데이터가 없는 구간도 crawling으로 확인했다면 포함.
+            확인한 구간도 데이터도 없으면 (빈 csv에서 변환한 store 등) None
+        """
+        if self.meta.get('coverage') is not None:
+            return tuple(self.meta['coverage'])
+        if len(self) == 0:
+            return None
+        return int(self.column('Date', 0, 1)[0]), self.last_date()
+
+    def matches_csv(self, csv_path: str) -> bool:
+        """csv_path를 변환한 뒤 csv가 바뀌지 않았는지 (변환 기록이 없는 store는 False)"""
+        return self.exists() and self.meta.get('csv') == csv_signature(csv_path)
+
+    def column(self, column, start=0, stop=None) -> np.ndarray:
+        """[start, stop) 구간만 memory-map으로 읽은 배열 (read-only)"""
+        length = len(self)
+        stop = length if stop is None else min(stop, length)
+        dtype = np.dtype(STORE_COLUMNS[column])
+        if stop <= start:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(self.column_path(column), dtype=dtype, mode='r', offset=start * dtype.itemsize, shape=(stop - start,))
+
+    def last_date(self) -> int:
+        return int(self.column('Date', len(self) - 1)[0]) if len(self) else None
+
+    def search_range(self, start_date, end_date) -> Tuple[int, int]:
+        """start_date <= Date <= end_date 를 만족하는 [start, stop) 위치를 binary search로 찾음"""
+        dates = self.column('Date')
+        start = int(np.searchsorted(dates, to_epoch_ms(start_date, ceil=True), side='left'))
+        stop = int(np.searchsorted(dates, to_epoch_ms(end_date), side='right'))
+        return start, max(start, stop)
+
+    def load(self, start_date, end_date) -> pd.DataFrame:
+        """날짜 범위의 데이터만 읽어서 DataFrame으로 반환 (load_price_data와 동일한 형태)"""
+        start, stop = self.search_range(start_date, end_date)
+        df = pd.DataFrame({column: np.array(self.column(column, start, stop)) for column in STORE_COLUMNS})
+        df['Date'] = pd.to_datetime(df['Date'], unit='ms')
+        return df
+
+    @classmethod
+    def from_csv(cls, csv_path: str, path: str = None) -> 'PriceStore':
+        """crawler.py가 저장한 csv를 store로 한 번 변환. csv의 수정 시각, 크기를 함께 기록 (matches_csv)"""
+        signature = csv_signature(csv_path)
+        df = pd.read_csv(csv_path)
+        df = df.sort_values('Close time', kind='stable').drop_duplicates('Close time', keep='last')
+        columns = {column: df[column].to_numpy() for column in ['Open', 'High', 'Low', 'Close', 'Volume']}
+        columns['Date'] = df['Close time'].to_numpy(dtype=np.int64) + 1
+
+        store = cls(store_path_of(csv_path) if path is None else path)
+        store.write(columns, coverage=[int(columns['Date'][0]), int(columns['Date'][-1])] if len(df) else None, csv=signature)
+        return store
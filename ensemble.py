@@ -0,0 +1,354 @@
+"""Ensemble evaluator
+
+여러 전략 조합(ensemble)을 Backtesting을 조합마다 실행하지 않고 한 번에 평가.
+
+    (1) 지표는 전체 전략(universe)에 대해 한 번 계산 (Backtesting.ready_data)
+    (2) 전략(StrategyStream)마다 진입 신호를 한 번 계산하고, 진입 bar별 청산 경로(Trajectory)는 처음 필요할 때 한 번만 계산
+        청산 경로는 진입 금액 1 기준의 청산 bar, 청산 수량, 실현 금액이며 실제 진입 금액만큼 배율을 곱해서 사용
+    (3) 조합마다 Backtesting.run_bar와 같은 규칙(청산 -> 진입, max_strategy_cnt, max_strategy_simultaneously_cnt,
+        min_trading_amount, 진입 금액 규칙)으로 이벤트가 있는 bar만 처리. 전략 인스턴스의 조건 함수는 호출하지 않음
+    (4) bar별 자산은 포지션 구간의 평가 계수를 difference 배열로 더해서 벡터로 계산하고 metrics.evaluate_records로 평가
+
+조합 수가 늘어도 전략 조건 함수 호출은 전략(진입 bar) 수만큼만 늘어난다.
+
+    evaluator = EnsembleEvaluator(strategy_list, datalist)
+    param_grid = {'strategy_list': make_subsets(strategy_list, [2, 3]), 'max_strategy_cnt': [3, 5], 'allocation': ['remain_split', 'initial_split']}
+    df_result = evaluator.evaluate(param_grid)
+
+청산 수량, 실현 금액이 진입 금액에 비례하는 전략(StrategyManager의 open/close 계산)을 가정한다.
+open_condition/close_condition은 진입 후 새 인스턴스 기준으로 호출하므로 조건 함수가 bar 정보와 자신의 포지션 상태로만 결정되어야 한다.
+모든 조합은 universe 기준으로 준비된 데이터(warm-up 이후 공통 구간)를 사용하므로,
+전략 일부만으로 Backtesting.run을 실행한 결과와는 시작 bar가 다를 수 있다 (같은 데이터의 Backtesting.run_prepared와 같음).
+"""
+import itertools
+import numpy as np
+import pandas as pd
+from typing import Callable, Dict, List, Tuple
+
+from backtester import Backtesting
+from metrics import evaluate_records
+from recorder import FillRecorder, grow_array
+from sweep import make_param_combinations
+from utils import Side
+
+# 진입 금액 규칙 (remain_balance, entered_strategy_cnt, max_strategy_cnt, initial_balance) -> 진입 금액
+ALLOCATIONS: Dict[str, Callable] = {
+    # Backtesting.decision_enter_balance: 잔여 자산 / 진입 가능한 포지션 수
+    'remain_split': lambda remain_balance, entered_cnt, max_cnt, initial_balance: remain_balance / (max_cnt - entered_cnt),
+    # 초기 자산 / 최대 포지션 수 (잔여 자산이 부족하면 잔여 자산)
+    'initial_split': lambda remain_balance, entered_cnt, max_cnt, initial_balance: min(initial_balance / max_cnt, remain_balance),
+}
+
+# 청산 정보 중 진입 금액에 비례하는 값 (Trajectory는 진입 금액 1 기준)
+SCALED_FILL_COLUMNS = ['close_size', 'realized_now_amount', 'realized_total_amount', 'initial_balance']
+
+
+def strategy_key(strategy) -> Tuple:
+    """strategy_list 항목의 key. 같은 key의 전략은 신호, 청산 경로를 공유"""
+    parameter = strategy['parameter']
+    return (strategy['object'], parameter['asset'], parameter['strategy_name'], parameter['trading_fee'])
+
+
+def make_subsets(strategy_list: List[Dict], sizes) -> List[List[Dict]]:
+    """strategy_list에서 sizes 개수만큼 고른 모든 부분 집합 (strategy_list 순서 유지)"""
+    return [list(subset) for size in sizes for subset in itertools.combinations(strategy_list, size)]
+
+
+def gather(offset: np.ndarray, count: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """offset부터 count개씩인 구간들을 이어 붙인 위치와 각 위치의 구간 번호"""
+    owner = np.repeat(np.arange(len(count)), count)
+    index = np.arange(int(count.sum())) - np.repeat(np.cumsum(count) - count, count) + offset[owner]
+    return index, owner
+
+
+class Trajectory:
+    """didx bar에 진입 금액 1로 진입한 포지션의 청산 경로. 청산 기록과 평가 구간은 TrajectoryTable의 [offset, offset + count)"""
+    __slots__ = ('didx', 'bars', 'realized_now', 'clear', 'clear_bar', 'fill_offset', 'segment_offset', 'segment_count')
+
+    def __init__(self, didx, bars, realized_now, clear, clear_bar, fill_offset, segment_offset, segment_count):
+        self.didx = didx
+        self.bars = bars                    # 청산 bar (list, simulate에서 사용)
+        self.realized_now = realized_now    # 청산 bar별 realized_now_amount
+        self.clear = clear                  # 청산 bar별 clear
+        self.clear_bar = clear_bar          # 청산 완료 bar (청산되지 않으면 데이터 길이)
+        self.fill_offset = fill_offset
+        self.segment_offset = segment_offset
+        self.segment_count = segment_count
+
+
+class TrajectoryTable:
+    """모든 전략의 청산 경로를 컬럼 배열 하나에 기록. 조합별 기록은 위치(index)로 한 번에 모음"""
+    def __init__(self, dates, capacity: int = 1024):
+        self.length = len(dates)
+        # 청산 기록 (bar는 청산 bar, 금액은 진입 금액 1 기준)
+        self.fills = FillRecorder(dates=dates, capacity=capacity)
+        # 평가 구간 [start, end)의 평가 금액 = a + b * close (진입 금액 1 기준)
+        self.segment_count = 0
+        self.segment_start = np.zeros(capacity, dtype=np.int64)
+        self.segment_end = np.zeros(capacity, dtype=np.int64)
+        self.segment_a = np.zeros(capacity)
+        self.segment_b = np.zeros(capacity)
+
+    def add(self, didx: int, fills: List[Tuple[int, Dict]], segments: List[Tuple[int, int, float, float]]) -> Trajectory:
+        fill_offset = len(self.fills)
+        for bar, close_info in fills:
+            self.fills.record(bar, close_info)
+
+        segment_offset, count = self.segment_count, len(segments)
+        if segment_offset + count > len(self.segment_start):
+            capacity = max(len(self.segment_start) * 2, segment_offset + count)
+            for column in ['segment_start', 'segment_end', 'segment_a', 'segment_b']:
+                setattr(self, column, grow_array(getattr(self, column), capacity))
+        for idx, (start, end, a, b) in enumerate(segments, segment_offset):
+            self.segment_start[idx], self.segment_end[idx], self.segment_a[idx], self.segment_b[idx] = start, end, a, b
+        self.segment_count += count
+
+        bars = [bar for bar, _ in fills]
+        clear = [bool(close_info['clear']) for _, close_info in fills]
+        return Trajectory(didx
+                          , bars
+                          , [float(close_info['realized_now_amount']) for _, close_info in fills]
+                          , clear
+                          , bars[-1] if clear and clear[-1] else self.length
+                          , fill_offset
+                          , segment_offset
+                          , count)
+
+
+class StrategyStream:
+    """strategy_list 항목 하나의 진입 신호와 진입 bar별 청산 경로. 모든 조합이 공유"""
+    def __init__(self, strategy: Dict, frame, asset_idx: int, table: TrajectoryTable):
+        self.strategy = strategy
+        self.frame = frame
+        self.table = table
+        self.length = len(frame)
+        self.asset_idx = asset_idx
+        instance = self.make_instance()
+        self.name = instance.STRATEGY_NAME
+        if instance.has_update_hook():
+            # 청산 경로의 평가 금액을 진입 금액 비례 구간(a + b * close)으로 계산하므로 bar별 update()를 반영할 수 없음
+            raise ValueError(f'EnsembleEvaluator does not support strategies overriding update() : {type(instance).__name__}, use Backtesting')
+
+        open_signals = instance.open_signals(frame)
+        self.vectorized_open = open_signals is not None
+        if open_signals is None:
+            # open_condition을 bar마다 한 번씩만 호출 (진입 전 인스턴스는 상태가 없으므로 모든 조합이 공유)
+            rows = [instance.open_condition(frame.bar(didx)) for didx in range(self.length)]
+            open_signals = ([row[0] for row in rows], [row[1] for row in rows], [row[2] for row in rows])
+        is_open, side, enter_price = open_signals
+        self.is_open = np.asarray(is_open, dtype=bool)
+        self.side = np.asarray(side, dtype=object)
+        self.enter_price = np.asarray(enter_price, dtype=np.float64)
+
+        # next_open[didx]: didx 이후(포함) 첫 진입 신호 bar, 없으면 length
+        open_index = np.flatnonzero(self.is_open)
+        self.next_open = np.append(open_index, self.length)[np.searchsorted(open_index, np.arange(self.length + 1))]
+
+        close_signals = instance.close_signals(frame)
+        self.close_index = None if close_signals is None else {side: np.flatnonzero(mask) for side, mask in close_signals.items()}
+        self.trajectories: Dict[int, Trajectory] = {}
+
+    def make_instance(self):
+        parameter = self.strategy['parameter']
+        return self.strategy['object'](strategy_name=parameter['strategy_name'], asset=parameter['asset'], trading_fee=parameter['trading_fee'])
+
+    def trajectory(self, didx: int) -> Trajectory:
+        """didx bar 진입 신호로 진입했을 때의 청산 경로 (처음 호출할 때 계산)"""
+        trajectory = self.trajectories.get(didx)
+        if trajectory is None:
+            trajectory = self.trajectories[didx] = self.make_trajectory(didx)
+        return trajectory
+
+    def make_trajectory(self, didx: int) -> Trajectory:
+        instance = self.make_instance()
+        if not self.vectorized_open:
+            instance.open_condition(self.frame.bar(didx))
+        instance.open(side=self.side[didx], initial_balance=1.0, open_price=self.enter_price[didx])
+
+        # 진입한 bar 다음부터 청산 조건 확인. 청산 신호가 있으면 신호가 발생한 bar만
+        if self.close_index is None:
+            candidates = range(didx + 1, self.length)
+        else:
+            index = self.close_index[instance.SIDE]
+            candidates = index[np.searchsorted(index, didx, side='right'):]
+
+        # 평가 금액 ((enter_price * size) + leverage * (close - enter_price) * size) * (1 - fee) = a + b * close
+        direction = 1.0 if instance.SIDE == Side.BUY else -1.0
+        signed_leverage, fee_factor = instance.LEVERAGE * direction, 1 - instance.TRADING_FEE
+        fills, segments, start = [], [], didx
+        for bar in candidates:
+            is_close, close_size, close_price = instance.close_condition(self.frame.bar(int(bar)))
+            if not is_close:
+                continue
+            size = instance.position_size
+            segments.append((start, int(bar), size * fee_factor * instance.ENTER_PRICE * (1 - signed_leverage), size * fee_factor * signed_leverage))
+            close_info = instance.close(close_size=close_size, close_price=close_price)
+            fills.append((int(bar), close_info))
+            start = int(bar)
+            if close_info['clear']:
+                break
+        else:
+            size = instance.position_size
+            segments.append((start, self.length, size * fee_factor * instance.ENTER_PRICE * (1 - signed_leverage), size * fee_factor * signed_leverage))
+        return self.table.add(didx, fills, segments)
+
+
+class EnsembleEvaluator:
+    def __init__(self, strategy_list: List[Dict], datalist: List[Dict[str, pd.DataFrame]], **kwargs):
+        """
+        Args:
+            strategy_list (list): 조합에 사용할 수 있는 전체 전략 (Backtesting strategy_list 형식)
+            datalist (list): Backtesting.run에 전달하는 형태의 데이터 [{'BTCUSDT': pd.DataFrame}, ...]
+            **kwargs: 지표 계산에 사용할 Backtesting 인자 (indicator_cache, timeframe, mmap_dir)
+        """
+        prepared = Backtesting(strategy_list, **kwargs).ready_data(datalist)
+        self.frames = {asset: frame for data_info in prepared for asset, frame in data_info.items()}
+        # position_book과 같이 datalist 순서를 asset 번호로 사용
+        self.assets = list(self.frames)
+        self.dates = np.asarray(self.frames[self.assets[0]]['Date'])
+        self.close = np.stack([np.asarray(self.frames[asset]['Close'], dtype=np.float64) for asset in self.assets])
+        self.length = len(self.dates)
+        self.table = TrajectoryTable(self.dates)
+        self.streams: Dict[Tuple, StrategyStream] = {}
+        for strategy in strategy_list:
+            self.stream(strategy)
+
+    def stream(self, strategy: Dict) -> StrategyStream:
+        key = strategy_key(strategy)
+        if key not in self.streams:
+            asset = strategy['parameter']['asset']
+            self.streams[key] = StrategyStream(strategy, self.frames[asset], self.assets.index(asset), self.table)
+        return self.streams[key]
+
+    def simulate(self
+                 , strategy_list: List[Dict]
+                 , max_strategy_cnt: int = 5
+                 , max_strategy_simultaneously_cnt: int = 3
+                 , min_trading_amount: float = 100
+                 , total_balance: float = 10000
+                 , allocation='remain_split') -> Tuple[Dict[str, np.ndarray], Dict[str, np.ndarray]]:
+        """조합 하나를 시뮬레이션해서 (backtesting_info, strategy_clear_info) 컬럼 배열 dict 반환.
+            인자는 Backtesting과 같고, allocation은 ALLOCATIONS의 이름 또는 (remain_balance, entered_cnt, max_cnt, initial_balance) -> 진입 금액 함수
+        """
+        allocate = ALLOCATIONS[allocation] if isinstance(allocation, str) else allocation
+        streams = [self.stream(strategy) for strategy in strategy_list]
+        # 진입 확인 순서: asset 순서, asset 안에서는 strategy_list 순서 (Backtesting.queue_index_by_asset)
+        open_order = sorted(range(len(streams)), key=lambda i: streams[i].asset_idx)
+        multi_asset = len({stream.asset_idx for stream in streams}) > 1
+        entered_cnt = {stream.name: 0 for stream in streams}
+
+        remain_balance, total_cnt = total_balance, 0
+        # 진입 중인 포지션 [다음 청산 bar, stream, trajectory, 진입 금액, 다음 청산 위치] (진입 순서)
+        positions = []
+        # 진입한 포지션 (stream, trajectory, 진입 금액)
+        entries = []
+        length = self.length
+        didx = 0
+        while didx < length:
+            # (1) 청산 - asset 순서, 진입 순서
+            closing = [position for position in positions if position[0] == didx]
+            if closing:
+                if multi_asset:
+                    closing.sort(key=lambda position: position[1].asset_idx)
+                for position in closing:
+                    _, stream, trajectory, initial_balance, fill_idx = position
+                    remain_balance += trajectory.realized_now[fill_idx] * initial_balance
+                    if trajectory.clear[fill_idx]:
+                        total_cnt -= 1
+                        entered_cnt[stream.name] -= 1
+                        position[0] = -1
+                    else:
+                        position[4] = fill_idx + 1
+                        position[0] = trajectory.bars[fill_idx + 1] if fill_idx + 1 < len(trajectory.bars) else length
+                # 청산 완료된 포지션 제거 (진입 순서 유지)
+                positions = [position for position in positions if position[0] >= 0]
+
+            # (2) 진입 - Backtesting.run_bar와 같은 순서, 같은 조건
+            for i in open_order:
+                if not (total_cnt < max_strategy_cnt and remain_balance > min_trading_amount):
+                    break
+                stream = streams[i]
+                if entered_cnt[stream.name] >= max_strategy_simultaneously_cnt or not stream.is_open[didx]:
+                    continue
+                enter_balance = allocate(remain_balance, total_cnt, max_strategy_cnt, total_balance)
+                trajectory = stream.trajectory(didx)
+                total_cnt += 1
+                entered_cnt[stream.name] += 1
+                remain_balance -= enter_balance
+                entries.append((stream, trajectory, enter_balance))
+                positions.append([trajectory.bars[0] if trajectory.bars else length, stream, trajectory, enter_balance, 0])
+
+            # (3) 다음 이벤트 bar - 청산 또는 (자리가 있으면) 진입 신호
+            next_didx = min([position[0] for position in positions], default=length)
+            if total_cnt < max_strategy_cnt and remain_balance > min_trading_amount:
+                for stream in streams:
+                    if entered_cnt[stream.name] < max_strategy_simultaneously_cnt:
+                        next_didx = min(next_didx, int(stream.next_open[didx + 1]))
+            didx = next_didx
+        return self.make_records(entries, total_balance)
+
+    def make_records(self, entries, total_balance) -> Tuple[Dict[str, np.ndarray], Dict[str, np.ndarray]]:
+        """진입한 포지션의 청산 경로로 bar별 자산 정보와 청산 정보 배열 생성"""
+        length, table = self.length, self.table
+        backtesting_info = {'Date': self.dates}
+        if not entries:
+            backtesting_info.update({'total_balance': np.full(length, float(total_balance)), 'enter_balacne': np.zeros(length)
+                                     , 'remain_balance': np.full(length, float(total_balance)), 'entered_strategy_cnt': np.zeros(length, dtype=np.int64)})
+            return backtesting_info, {'Date': self.dates[:0]}
+
+        initial = np.array([enter_balance for _, _, enter_balance in entries])
+        asset = np.array([stream.asset_idx for stream, _, _ in entries], dtype=np.int64)
+        open_bar = np.array([trajectory.didx for _, trajectory, _ in entries], dtype=np.int64)
+        clear_bar = np.array([trajectory.clear_bar for _, trajectory, _ in entries], dtype=np.int64)
+        fill_index, fill_position = gather(np.array([trajectory.fill_offset for _, trajectory, _ in entries], dtype=np.int64)
+                                           , np.array([len(trajectory.bars) for _, trajectory, _ in entries], dtype=np.int64))
+        segment_index, segment_position = gather(np.array([trajectory.segment_offset for _, trajectory, _ in entries], dtype=np.int64)
+                                                 , np.array([trajectory.segment_count for _, trajectory, _ in entries], dtype=np.int64))
+
+        # 잔여 자산: 진입 bar에 -진입 금액, 청산 bar에 +실현 금액
+        fill_bar = table.fills.bar[fill_index]
+        fill_amount = table.fills.columns['realized_now_amount'][fill_index] * initial[fill_position] if len(fill_index) else np.zeros(0)
+        remain_balance = total_balance + np.cumsum(np.bincount(open_bar, weights=-initial, minlength=length + 1)
+                                                   + np.bincount(fill_bar, weights=fill_amount, minlength=length + 1))[:length]
+        entered_cnt = np.cumsum(np.bincount(open_bar, minlength=length + 1) - np.bincount(clear_bar, minlength=length + 1))[:length]
+
+        # 평가 금액: 구간 [start, end)마다 a + b * close. asset별 b의 합에 close를 곱함
+        start, end = table.segment_start[segment_index], table.segment_end[segment_index]
+        a = table.segment_a[segment_index] * initial[segment_position]
+        b = table.segment_b[segment_index] * initial[segment_position]
+        segment_asset = asset[segment_position]
+        enter_balance = np.cumsum(np.bincount(start, weights=a, minlength=length + 1) - np.bincount(end, weights=a, minlength=length + 1))[:length]
+        for asset_idx in np.unique(segment_asset):
+            mask = segment_asset == asset_idx
+            coefficient = np.cumsum(np.bincount(start[mask], weights=b[mask], minlength=length + 1)
+                                    - np.bincount(end[mask], weights=b[mask], minlength=length + 1))[:length]
+            enter_balance += coefficient * self.close[asset_idx]
+        # 포지션이 없는 bar는 누적 오차 없이 0
+        enter_balance[entered_cnt == 0] = 0.0
+
+        backtesting_info.update({'total_balance': enter_balance + remain_balance, 'enter_balacne': enter_balance
+                                 , 'remain_balance': remain_balance, 'entered_strategy_cnt': entered_cnt})
+
+        # 청산 정보: bar, asset, 진입 순서로 정렬 (Backtesting.strategy_clear_info 순서)
+        order = np.lexsort((fill_position, asset[fill_position], fill_bar))
+        fill_index, fill_position = fill_index[order], fill_position[order]
+        strategy_clear_info = {'Date': self.dates[fill_bar[order]]}
+        for name, values in table.fills.columns.items():
+            values = values[fill_index]
+            strategy_clear_info[name] = values * initial[fill_position] if name in SCALED_FILL_COLUMNS else values
+        return backtesting_info, strategy_clear_info
+
+    def evaluate(self, param_grid: Dict[str, list]) -> pd.DataFrame:
+        """param_grid의 모든 조합을 시뮬레이션해서 조합별 파라미터와 metrics.evaluate_records 결과 테이블 반환.
+            param_grid의 key는 simulate 인자, 'strategy_list'는 필수이며 결과에는 param_grid['strategy_list']의 위치로 기록
+        """
+        assert 'strategy_list' in param_grid, 'param_grid must contain strategy_list'
+        rows = []
+        for params in make_param_combinations(param_grid):
+            backtesting_info, strategy_clear_info = self.simulate(**params)
+            row = {key: value for key, value in params.items() if key != 'strategy_list'}
+            row['strategy_list'] = next(i for i, candidate in enumerate(param_grid['strategy_list']) if candidate is params['strategy_list'])
+            row['strategy_cnt'] = len(params['strategy_list'])
+            row.update(evaluate_records(backtesting_info, strategy_clear_info, initial_balance=params.get('total_balance', 10000)))
+            rows.append(row)
+        return pd.DataFrame(rows)
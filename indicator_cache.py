@@ -0,0 +1,97 @@
+"""Indicator cache
+
+(asset, timeframe, data fingerprint, indicator spec)를 key로 계산된 지표를 저장.
+메모리 LRU 계층과 선택적인 디스크(.npy) 계층으로 구성.
+캐시된 배열은 read-only 복사본이므로 반환된 배열을 frame에 그대로 넣어도 frame 쪽 수정이 캐시를 바꾸지 않는다 (수정하면 ValueError).
+"""
+import os
+import hashlib
+import numpy as np
+import pandas as pd
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+# fingerprint 계산에 사용하는 원본 컬럼
+FINGERPRINT_COLUMNS = ['Date', 'Open', 'High', 'Low', 'Close', 'Volume']
+
+
+def fingerprint(df: pd.DataFrame) -> str:
+    """데이터 내용 기반 fingerprint. 같은 가격 데이터면 같은 값. (pd.DataFrame, ColumnarFrame 모두 가능)"""
+    hasher = hashlib.blake2b(digest_size=16)
+    hasher.update(str(len(df)).encode())
+    for column in FINGERPRINT_COLUMNS:
+        if column in df.columns:
+            hasher.update(column.encode())
+            hasher.update(np.ascontiguousarray(np.asarray(df[column])).view(np.uint8))
+    return hasher.hexdigest()
+
+
+class IndicatorCache:
+    def __init__(self, maxsize: int = 256, cache_dir: Optional[str] = None):
+        """지표 캐시.
+
+        Args:
+            maxsize (int, optional): 메모리에 유지할 최대 지표 개수. Defaults to 256.
+            cache_dir (str, optional): 디스크 캐시 경로. None이면 메모리만 사용. Defaults to None.
+        """
+        self.maxsize = maxsize
+        self.cache_dir = cache_dir
+        self.memory = OrderedDict()
+        self.hits, self.disk_hits, self.misses = 0, 0, 0
+        
+        if self.cache_dir is not None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+    
+    def make_key(self, asset: str, timeframe: Optional[str], data_fingerprint: str, spec: str) -> Tuple:
+        return (asset, timeframe, data_fingerprint, spec)
+    
+    def disk_path(self, key) -> str:
+        name = hashlib.blake2b(repr(key).encode(), digest_size=16).hexdigest()
+        return os.path.join(self.cache_dir, f'{name}.npy')
+    
+    def get(self, key) -> Optional[np.ndarray]:
+        """캐시된 지표 값 반환 (read-only). 없으면 None."""
+        if key in self.memory:
+            self.memory.move_to_end(key)
+            self.hits += 1
+            return self.memory[key]
+        
+        if self.cache_dir is not None and os.path.isfile(self.disk_path(key)):
+            values = np.load(self.disk_path(key))
+            self.put_memory(key, values)
+            self.disk_hits += 1
+            return values
+        
+        self.misses += 1
+        return None
+    
+    def put(self, key, values: np.ndarray):
+        """values의 복사본을 저장. 호출한 쪽이 values를 계속 사용하거나 수정해도 캐시는 바뀌지 않음"""
+        values = np.array(values)
+        self.put_memory(key, values)
+        if self.cache_dir is not None:
+            # 동시에 쓰는 worker가 있어도 완성된 파일만 보이도록 임시 파일에 저장 후 교체
+            path = self.disk_path(key)
+            tmp_path = f'{path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                np.save(f, values)
+            os.replace(tmp_path, path)
+    
+    def put_memory(self, key, values):
+        values.flags.writeable = False
+        self.memory[key] = values
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.maxsize:
+            self.memory.popitem(last=False)
+    
+    def clear(self):
+        self.memory.clear()
+        self.hits, self.disk_hits, self.misses = 0, 0, 0
+    
+    def stats(self) -> dict:
+        requests = self.hits + self.disk_hits + self.misses
+        return {'hits': self.hits
+                , 'disk_hits': self.disk_hits
+                , 'misses': self.misses
+                , 'hit_rate': (self.hits + self.disk_hits) / requests if requests else 0.0
+                , 'size': len(self.memory)}
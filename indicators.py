@@ -0,0 +1,161 @@
+"""Indicator kernels
+
+Preprocessor에서 사용하는 NumPy 지표 계산 함수. 입력은 1-D float 배열, 출력은 같은 길이의 배열이며
+warm-up 구간은 NaN (ta 라이브러리의 fillna=False 결과와 같은 형태).
+
+    - sma, sma_batch : cumulative sum 기반 이동평균. sma_batch는 여러 window를 한 번에 2-D 배열로 계산
+    - ema, rsi       : adjust=False 지수이동평균(재귀식)을 block 단위 cumulative sum으로 계산
+    - bollinger_bands: rolling mean, rolling std(ddof=0). rolling_std는 고정 크기 block 단위로 계산 (window와 무관한 메모리)
+
+NaN이 포함된 입력은 지원하지 않는다 (Preprocessor는 이 경우 ta로 계산).
+"""
+import numpy as np
+from typing import Sequence, Tuple
+from numpy.lib.stride_tricks import sliding_window_view
+
+# block 안에서 decay^-k가 이 값을 넘지 않도록 block 길이를 정함 (float64 overflow 방지)
+MAX_BLOCK_SCALE = 1e150
+# rolling_std에서 block 하나가 사용하는 최대 원소 수 (float64 2 MB)
+ROLLING_BLOCK_SIZE = 1 << 18
+# rolling_std를 two-pass로 계산하는 최대 window (이보다 크면 block 단위 누적합)
+EXACT_STD_WINDOW = 64
+
+
+def _window_sums(values: np.ndarray, windows: Sequence[int]) -> np.ndarray:
+    """window별 rolling sum (len(windows), n). 앞쪽 window-1개는 NaN"""
+    n = len(values)
+    # 정밀도를 위해 첫 값 기준으로 이동한 뒤 누적합
+    offset = values[0] if n else 0.0
+    cumsum = np.empty(n + 1)
+    cumsum[0] = 0.0
+    np.cumsum(values - offset, out=cumsum[1:])
+
+    sums = np.empty((len(windows), n))
+    for row, window in enumerate(windows):
+        window = min(window, n + 1)
+        sums[row, :window - 1] = np.nan
+        out = sums[row, window - 1:]
+        np.subtract(cumsum[window:], cumsum[:n - window + 1], out=out)
+        out += offset * window
+    return sums
+
+
+def sma(values: np.ndarray, window: int) -> np.ndarray:
+    """단순 이동평균"""
+    return sma_batch(values, [window])[0]
+
+
+def sma_batch(values: np.ndarray, windows: Sequence[int]) -> np.ndarray:
+    """여러 window의 단순 이동평균을 누적합 한 번으로 계산. (len(windows), n) 배열 반환
+
+        sma_batch(close, range(5, 201))[i] == sma(close, 5 + i)
+    """
+    values = np.asarray(values, dtype=np.float64)
+    sums = _window_sums(values, windows)
+    sums /= np.asarray(windows, dtype=np.float64)[:, None]
+    return sums
+
+
+def ewm(values: np.ndarray, alpha: float) -> np.ndarray:
+    """adjust=False 지수가중평균 y[0] = x[0], y[t] = (1 - alpha) * y[t-1] + alpha * x[t]
+
+    재귀식을 python loop 없이 계산하기 위해 block 단위로 나눔.
+    block 안에서는 y[k] = decay^k * (state + alpha * cumsum(x[j] * decay^-j)) 이므로 누적합(ufunc)으로 계산하고,
+    block 사이의 state만 순서대로 이어 붙인다 (block 개수만큼만 반복).
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    if n == 0:
+        return np.empty(0)
+    decay = 1.0 - alpha
+    if decay <= 0.0:
+        return values.copy()
+
+    block = max(1, min(n, int(np.log(MAX_BLOCK_SCALE) / -np.log(decay))))
+    n_block = -(-n // block)
+    padded = np.zeros(n_block * block)
+    padded[:n] = values
+    padded = padded.reshape(n_block, block)
+
+    powers = decay ** np.arange(block + 1)
+    # state가 0일 때의 block 내 결과
+    zero_state = padded
+    zero_state /= powers[:block]
+    np.cumsum(zero_state, axis=1, out=zero_state)
+    zero_state *= alpha * powers[:block]
+
+    # block 시작 직전 state: y[-1] = x[0]로 두면 y[0] = x[0]
+    states = np.empty(n_block)
+    state, block_decay = values[0], powers[block]
+    for idx in range(n_block):
+        states[idx] = state
+        state = block_decay * state + zero_state[idx, -1]
+
+    zero_state += states[:, None] * powers[1:]
+    return zero_state.reshape(-1)[:n]
+
+
+def ema(values: np.ndarray, window: int) -> np.ndarray:
+    """지수이동평균 (span=window, adjust=False). ta.trend.ema_indicator와 같음"""
+    result = ewm(values, 2.0 / (window + 1))
+    result[:window - 1] = np.nan
+    return result
+
+
+def rsi(values: np.ndarray, window: int = 14) -> np.ndarray:
+    """Wilder RSI (alpha=1/window). ta.momentum.rsi와 같음"""
+    values = np.asarray(values, dtype=np.float64)
+    diff = np.zeros(len(values))
+    diff[1:] = np.diff(values)
+    up = ewm(np.where(diff > 0, diff, 0.0), 1.0 / window)
+    down = ewm(np.where(diff < 0, -diff, 0.0), 1.0 / window)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        result = np.where(down == 0, 100.0, 100.0 - 100.0 / (1.0 + up / down))
+    result[:window - 1] = np.nan
+    return result
+
+
+def rolling_std(values: np.ndarray, window: int) -> np.ndarray:
+    """rolling 표준편차 (ddof=0). 출력 block 단위로 계산하므로 메모리는 window와 관계없이 O(n + ROLLING_BLOCK_SIZE)
+
+        window <= EXACT_STD_WINDOW: block마다 (rows, window) view에서 평균을 빼고 계산 (two-pass, 정밀도 손실 없음)
+        window > EXACT_STD_WINDOW : block 구간(rows + window - 1개)을 구간 평균 기준으로 이동한 뒤 x, x^2 누적합으로 window 합 계산
+                                    (var = (sum(x^2) - sum(x)^2 / window) / window). 누적합 길이가 block으로 제한되어 정밀도 손실이 작다
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    result = np.full(n, np.nan)
+    if window > n:
+        return result
+
+    if window <= EXACT_STD_WINDOW:
+        mean = sma(values, window)
+        rows = max(1, ROLLING_BLOCK_SIZE // window)
+        for start in range(window - 1, n, rows):
+            stop = min(start + rows, n)
+            deviation = sliding_window_view(values[start - window + 1:stop], window) - mean[start:stop, None]
+            result[start:stop] = np.sqrt(np.einsum('ij,ij->i', deviation, deviation) / window)
+        return result
+
+    rows = max(window, ROLLING_BLOCK_SIZE // 64)
+    sums = np.zeros(rows + window)
+    squares = np.zeros(rows + window)
+    for start in range(window - 1, n, rows):
+        stop = min(start + rows, n)
+        segment = values[start - window + 1:stop]
+        centred = segment - segment.mean()
+        length = len(segment)
+        np.cumsum(centred, out=sums[1:length + 1])
+        np.cumsum(centred * centred, out=squares[1:length + 1])
+        window_sum = sums[window:length + 1] - sums[:length + 1 - window]
+        window_square = squares[window:length + 1] - squares[:length + 1 - window]
+        variance = (window_square - window_sum * window_sum / window) / window
+        result[start:stop] = np.sqrt(np.maximum(variance, 0.0))
+    return result
+
+
+def bollinger_bands(values: np.ndarray, window: int = 20, window_dev: float = 2) -> Tuple[np.ndarray, np.ndarray]:
+    """(upper, lower) band. ta.volatility.BollingerBands와 같음"""
+    mean, std = sma(values, window), rolling_std(values, window)
+    return mean + window_dev * std, mean - window_dev * std
@@ -0,0 +1,185 @@
+"""Backtesting performance metrics
+
+backtesting_info(BalanceRecorder)와 strategy_clear_info(FillRecorder)의 컬럼 배열로 성과 지표를 numpy 벡터 연산으로 계산.
+청산 기록을 하나씩 도는 python loop는 없다.
+
+    equity curve : total_return, max_drawdown(초기 자산 포함), sharpe, sortino (periods_per_year로 연율화), exposure
+                   sharpe, sortino는 일정한 간격으로 기록된 equity만 계산 (record_events_only처럼 간격이 불규칙하면 nan)
+                   total_balance를 (실행 수, bar 수) 2차원 배열로 넣으면 여러 실행을 한 번에 계산 (score_curves, sweep 결과 비교)
+    fills        : turnover, 전략별 청산/거래 횟수, hit rate, 손익 (strategy_metrics)
+
+partial close(PartialCloseMovingAverageStrategy)는 한 거래가 여러 청산 기록으로 남는다.
+거래 단위 지표는 clear=True인 기록(거래 마지막 청산)의 realized_total_amount - initial_balance를 거래 손익으로 사용하므로
+중간 청산 기록을 거래로 세지 않고, 같은 전략의 여러 포지션 청산이 섞여 있어도 기록을 묶을 필요가 없다.
+끝까지 청산되지 않은 포지션의 손익(중간 청산 포함)은 summary의 open_pnl로 남는다.
+
+    summary = backtest_metrics(backtester)
+    df_strategy = strategy_metrics(backtester.strategy_clear_info)
+"""
+import numpy as np
+import pandas as pd
+from typing import Dict
+
+MS_PER_YEAR = 365 * 24 * 60 * 60 * 1000
+# 기록 간격이 중앙값과 다른 비율이 이 값 이하면 일정한 간격으로 봄 (거래소 점검 등으로 빠진 bar 허용)
+IRREGULAR_STEP_RATIO = 0.05
+
+
+def periods_per_year(dates) -> float:
+    """기록된 Date로 계산한 1년 기간 수 (경과 시간 / 기록 간격 수). record_every=N이면 N bar 간격 기준.
+        기록이 2개 미만이거나 간격이 일정하지 않으면(record_events_only 등) nan
+    """
+    dates = np.asarray(dates).astype('datetime64[ms]').view(np.int64)
+    if len(dates) < 2:
+        return np.nan
+    # 마지막 bar는 항상 기록되므로 마지막 간격은 짧을 수 있음
+    steps = np.diff(dates)
+    regular = steps[:-1] if len(steps) > 1 else steps
+    if np.mean(regular != np.median(regular)) > IRREGULAR_STEP_RATIO:
+        return np.nan
+    elapsed = dates[-1] - dates[0]
+    return MS_PER_YEAR * len(steps) / elapsed if elapsed > 0 else np.nan
+
+
+def safe_divide(numerator, denominator):
+    """denominator가 0이면 nan"""
+    numerator, denominator = np.broadcast_arrays(np.asarray(numerator, dtype=np.float64), np.asarray(denominator, dtype=np.float64))
+    result = np.full(numerator.shape, np.nan)
+    np.divide(numerator, denominator, out=result, where=denominator != 0)
+    return result if result.ndim else float(result)
+
+
+def period_returns(equity: np.ndarray) -> np.ndarray:
+    """기록 간 수익률. equity가 2차원이면 행(실행)별로 계산"""
+    equity = np.asarray(equity, dtype=np.float64)
+    return safe_divide(equity[..., 1:], equity[..., :-1]) - 1
+
+
+def max_drawdown(equity: np.ndarray, initial_balance=None):
+    """최대 낙폭 (고점 대비 비율). initial_balance를 주면 첫 기록 전 고점으로 포함 (첫 기록까지의 손실도 낙폭)"""
+    equity = np.asarray(equity, dtype=np.float64)
+    if equity.shape[-1] == 0:
+        return np.zeros(equity.shape[:-1]) if equity.ndim > 1 else 0.0
+    if initial_balance is not None:
+        initial = np.broadcast_to(np.asarray(initial_balance, dtype=np.float64), equity.shape[:-1])[..., np.newaxis]
+        equity = np.concatenate([initial, equity], axis=-1)
+    drawdown = 1 - safe_divide(equity, np.maximum.accumulate(equity, axis=-1))
+    return np.nanmax(drawdown, axis=-1)
+
+
+def sharpe_ratio(equity: np.ndarray, periods_per_year: float, risk_free: float = 0.0):
+    """연율화 Sharpe ratio. equity는 일정한 간격의 기록이어야 함 (periods_per_year 참고). risk_free는 연 수익률. 수익률 변동이 없으면 nan"""
+    returns = period_returns(equity) - risk_free / periods_per_year
+    if returns.shape[-1] < 2:
+        return np.full(returns.shape[:-1], np.nan) if returns.ndim > 1 else np.nan
+    return safe_divide(returns.mean(axis=-1), returns.std(axis=-1, ddof=1)) * np.sqrt(periods_per_year)
+
+
+def sortino_ratio(equity: np.ndarray, periods_per_year: float, risk_free: float = 0.0):
+    """연율화 Sortino ratio (하락 수익률의 RMS를 분모로 사용). 하락 기간이 없으면 nan"""
+    returns = period_returns(equity) - risk_free / periods_per_year
+    if returns.shape[-1] == 0:
+        return np.full(returns.shape[:-1], np.nan) if returns.ndim > 1 else np.nan
+    downside = np.sqrt(np.mean(np.minimum(returns, 0) ** 2, axis=-1))
+    return safe_divide(returns.mean(axis=-1), downside) * np.sqrt(periods_per_year)
+
+
+def exposure(enter_balance: np.ndarray, total_balance: np.ndarray) -> Dict[str, float]:
+    """time_in_market: 포지션이 있는 기록 비율, mean_exposure: 자산 대비 진입 금액 비율 평균"""
+    enter_balance = np.asarray(enter_balance, dtype=np.float64)
+    if len(enter_balance) == 0:
+        return {'time_in_market': 0.0, 'mean_exposure': 0.0}
+    return {'time_in_market': float(np.mean(enter_balance > 0))
+            , 'mean_exposure': float(np.nanmean(safe_divide(enter_balance, total_balance)))}
+
+
+def score_curves(equity: np.ndarray, periods_per_year: float, initial_balance=None) -> pd.DataFrame:
+    """(실행 수, bar 수) equity curve들의 total_return, max_drawdown, sharpe, sortino를 한 번에 계산.
+        equity는 periods_per_year에 맞는 일정한 간격의 기록. initial_balance가 없으면 첫 기록을 기준으로 total_return, max_drawdown 계산
+    """
+    equity = np.atleast_2d(np.asarray(equity, dtype=np.float64))
+    return pd.DataFrame({'total_return': safe_divide(equity[:, -1], equity[:, 0] if initial_balance is None else initial_balance) - 1
+                         , 'max_drawdown': max_drawdown(equity, initial_balance)
+                         , 'sharpe': sharpe_ratio(equity, periods_per_year)
+                         , 'sortino': sortino_ratio(equity, periods_per_year)})
+
+
+def trade_pnl(fills) -> pd.DataFrame:
+    """청산이 완료된 거래(clear=True 기록)별 strategy_name, Date, pnl. partial close의 중간 청산 손익은 거래 손익에 포함"""
+    clear = np.asarray(fills['clear'], dtype=bool)
+    pnl = np.asarray(fills['realized_total_amount'], dtype=np.float64)[clear] - np.asarray(fills['initial_balance'], dtype=np.float64)[clear]
+    columns = {'strategy_name': np.asarray(fills['strategy_name'])[clear], 'pnl': pnl}
+    if 'Date' in fills:
+        columns = {'Date': np.asarray(fills['Date'])[clear], **columns}
+    return pd.DataFrame(columns)
+
+
+def turnover(fills, mean_equity: float) -> float:
+    """청산된 수량의 진입 + 청산 notional 합 / 평균 자산"""
+    if 'close_size' not in fills or len(fills['close_size']) == 0:
+        return 0.0
+    close_size = np.asarray(fills['close_size'], dtype=np.float64)
+    notional = close_size * (np.asarray(fills['enter_price'], dtype=np.float64) + np.asarray(fills['close_price'], dtype=np.float64))
+    return safe_divide(notional.sum(), mean_equity)
+
+
+def strategy_metrics(fills) -> pd.DataFrame:
+    """전략(strategy_name)별 fills(청산 기록 수), trades(완료된 거래 수), hit_rate, pnl(완료된 거래 손익 합), mean_pnl, pnl_share"""
+    columns = ['fills', 'trades', 'wins', 'hit_rate', 'pnl', 'mean_pnl', 'pnl_share']
+    if 'clear' not in fills or len(fills['clear']) == 0:
+        return pd.DataFrame(columns=columns, index=pd.Index([], name='strategy_name'))
+
+    names, fill_group = np.unique(np.asarray(fills['strategy_name']), return_inverse=True)
+    clear = np.asarray(fills['clear'], dtype=bool)
+    pnl = np.asarray(fills['realized_total_amount'], dtype=np.float64) - np.asarray(fills['initial_balance'], dtype=np.float64)
+    trade_group, closed_pnl = fill_group[clear], pnl[clear]
+
+    count = len(names)
+    trades = np.bincount(trade_group, minlength=count)
+    wins = np.bincount(trade_group, weights=closed_pnl > 0, minlength=count).astype(np.int64)
+    total_pnl = np.bincount(trade_group, weights=closed_pnl, minlength=count)
+    return pd.DataFrame({'fills': np.bincount(fill_group, minlength=count)
+                         , 'trades': trades
+                         , 'wins': wins
+                         , 'hit_rate': safe_divide(wins, trades)
+                         , 'pnl': total_pnl
+                         , 'mean_pnl': safe_divide(total_pnl, trades)
+                         , 'pnl_share': safe_divide(total_pnl, np.abs(total_pnl).sum())}
+                        , index=pd.Index(names, name='strategy_name'))
+
+
+def evaluate_records(backtesting_info, strategy_clear_info, initial_balance: float = None) -> Dict[str, float]:
+    """backtesting_info, strategy_clear_info (DataFrame 또는 컬럼 배열 dict)로 전체 성과 요약.
+        initial_balance가 없으면 첫 기록의 total_balance를 초기 자산으로 사용.
+        sharpe, sortino는 Date 간격으로 연율화하며 간격이 일정하지 않으면 nan (periods_per_year)
+    """
+    total_balance = np.asarray(backtesting_info['total_balance'], dtype=np.float64)
+    enter_balance = np.asarray(backtesting_info['enter_balacne'], dtype=np.float64)
+    if initial_balance is None:
+        initial_balance = float(total_balance[0]) if len(total_balance) else np.nan
+    final_balance = float(total_balance[-1]) if len(total_balance) else initial_balance
+    year = periods_per_year(backtesting_info['Date'])
+
+    fills = strategy_clear_info
+    fill_count = len(fills['clear']) if 'clear' in fills else 0
+    trades = trade_pnl(fills)['pnl'].to_numpy() if fill_count else np.zeros(0)
+
+    summary = {'initial_balance': initial_balance
+               , 'final_balance': final_balance
+               , 'total_return': safe_divide(final_balance, initial_balance) - 1
+               , 'max_drawdown': float(max_drawdown(total_balance, initial_balance))
+               , 'sharpe': float(sharpe_ratio(total_balance, year))
+               , 'sortino': float(sortino_ratio(total_balance, year))}
+    summary.update(exposure(enter_balance, total_balance))
+    summary.update({'turnover': float(turnover(fills, total_balance.mean())) if fill_count else 0.0
+                    , 'trade_count': len(trades)
+                    , 'fill_count': fill_count
+                    , 'hit_rate': safe_divide(np.count_nonzero(trades > 0), len(trades))
+                    , 'closed_pnl': float(trades.sum())
+                    , 'open_pnl': final_balance - initial_balance - float(trades.sum())})
+    return summary
+
+
+def backtest_metrics(backtester) -> Dict[str, float]:
+    """Backtesting 실행 결과의 성과 요약 (evaluate_records). 기록 배열을 복사하지 않음"""
+    return evaluate_records(backtester.backtesting_info, backtester.strategy_clear_info, initial_balance=backtester.INITIAL_BALANCE)
@@ -0,0 +1,345 @@
+"""Online indicators
+
+bar가 하나씩 들어올 때 지표 값을 O(1)로 갱신하는 상태 객체. Backtesting.run_stream, 데이터 추가 후 지표 갱신에 사용.
+각 객체의 update(...)는 indicators 모듈 / Preprocessor의 batch 결과와 같은 연산 순서로 계산하므로,
+같은 데이터를 처음부터 넣거나 from_history로 앞 구간을 넣어 초기화하면 batch 계산과 값이 정확히 같다.
+(OnlineBollinger의 표준편차만 Welford 방식이라 batch와 부동소수점 오차 수준으로 다름) warm-up 구간은 NaN.
+
+    OnlineSMA          : 첫 값 기준 누적합과 최근 window+1개의 누적합 (indicators.sma)
+    OnlineEWM          : block 단위 누적합 방식의 지수가중평균 (indicators.ewm)
+    OnlineEMA, OnlineRSI
+    OnlineBollinger    : SMA + window 구간 Welford 분산 (indicators.bollinger_bands)
+    OnlineReturn, OnlineAngle, OnlinePercentAngle : diff bar 전 base 값 (Preprocessor.calculate_*)
+
+    from_history(...)  : 앞 구간 전체 입력 배열로 상태 초기화 (bar마다 update하지 않고 벡터 연산)
+
+    OnlineIndicators   : asset 하나의 필요한 컬럼(dependency 포함)을 Preprocessor.resolve 순서대로 갱신
+"""
+import numpy as np
+import pandas as pd
+from collections import deque
+from typing import Dict, List
+
+from indicators import MAX_BLOCK_SCALE
+
+
+class OnlineSMA:
+    def __init__(self, window: int):
+        self.window = window
+        self.offset = None
+        self.cumsum = 0.0
+        # 최근 window+1개의 누적합 (맨 앞은 window개 이전)
+        self.sums = deque([0.0], maxlen=window + 1)
+        self.count = 0
+
+    @classmethod
+    def from_history(cls, values, window: int) -> 'OnlineSMA':
+        sma = cls(window)
+        values = np.asarray(values, dtype=np.float64)
+        if len(values):
+            # indicators._window_sums와 같은 누적합
+            sma.offset = values[0]
+            cumsum = np.cumsum(values - sma.offset)
+            sma.cumsum = cumsum[-1]
+            sma.sums.extend(cumsum[-(window + 1):])
+            sma.count = len(values)
+        return sma
+
+    def update(self, value: float) -> float:
+        if self.offset is None:
+            self.offset = value
+        self.cumsum += value - self.offset
+        self.sums.append(self.cumsum)
+        self.count += 1
+        if self.count < self.window:
+            return np.nan
+        return ((self.sums[-1] - self.sums[0]) + self.offset * self.window) / self.window
+
+
+class OnlineEWM:
+    """adjust=False 지수가중평균. indicators.ewm과 같은 block 길이로 block 안의 누적합, block 시작 state를 유지"""
+    def __init__(self, alpha: float):
+        self.alpha = alpha
+        self.decay = 1.0 - alpha
+        if self.decay > 0.0:
+            self.block = max(1, int(np.log(MAX_BLOCK_SCALE) / -np.log(self.decay)))
+            self.powers = self.decay ** np.arange(self.block + 1)
+        self.state = None
+        self.position = 0       # block 안의 위치
+        self.block_sum = 0.0    # block 안의 cumsum(x[j] * decay^-j)
+
+    @classmethod
+    def from_history(cls, values, alpha: float) -> 'OnlineEWM':
+        ewm = cls(alpha)
+        values = np.asarray(values, dtype=np.float64)
+        if len(values) == 0 or ewm.decay <= 0.0:
+            return ewm
+
+        block, powers = ewm.block, ewm.powers
+        n_block, ewm.position = divmod(len(values), block)
+        # 끝난 block들의 state는 indicators.ewm과 같은 식으로 이어 붙임
+        zero_state = values[:n_block * block].reshape(n_block, block) / powers[:block]
+        block_end = np.cumsum(zero_state, axis=1)[:, -1] * (alpha * powers[block - 1]) if n_block else []
+        state = values[0]
+        for zero_state_end in block_end:
+            state = powers[block] * state + zero_state_end
+        ewm.state = state
+        if ewm.position:
+            ewm.block_sum = np.cumsum(values[n_block * block:] / powers[:ewm.position])[-1]
+        return ewm
+
+    def update(self, value: float) -> float:
+        if self.decay <= 0.0:
+            return value
+        if self.state is None:
+            self.state = value
+
+        position, powers = self.position, self.powers
+        self.block_sum += value / powers[position]
+        zero_state = self.block_sum * (self.alpha * powers[position])
+        result = zero_state + self.state * powers[position + 1]
+
+        self.position += 1
+        if self.position == self.block:
+            self.state = powers[self.block] * self.state + zero_state
+            self.position, self.block_sum = 0, 0.0
+        return float(result)
+
+
+class OnlineEMA:
+    """지수이동평균 (span=window, adjust=False). indicators.ema"""
+    def __init__(self, window: int):
+        self.window = window
+        self.ewm = OnlineEWM(2.0 / (window + 1))
+        self.count = 0
+
+    @classmethod
+    def from_history(cls, values, window: int) -> 'OnlineEMA':
+        ema = cls(window)
+        ema.ewm = OnlineEWM.from_history(values, 2.0 / (window + 1))
+        ema.count = len(values)
+        return ema
+
+    def update(self, value: float) -> float:
+        result = self.ewm.update(value)
+        self.count += 1
+        return np.nan if self.count < self.window else result
+
+
+class OnlineRSI:
+    """Wilder RSI (alpha=1/window). indicators.rsi"""
+    def __init__(self, window: int = 14):
+        self.window = window
+        self.up = OnlineEWM(1.0 / window)
+        self.down = OnlineEWM(1.0 / window)
+        self.previous = None
+        self.count = 0
+
+    @classmethod
+    def from_history(cls, values, window: int = 14) -> 'OnlineRSI':
+        rsi = cls(window)
+        values = np.asarray(values, dtype=np.float64)
+        if len(values):
+            diff = np.zeros(len(values))
+            diff[1:] = np.diff(values)
+            rsi.up = OnlineEWM.from_history(np.where(diff > 0, diff, 0.0), 1.0 / window)
+            rsi.down = OnlineEWM.from_history(np.where(diff < 0, -diff, 0.0), 1.0 / window)
+            rsi.previous = values[-1]
+            rsi.count = len(values)
+        return rsi
+
+    def update(self, value: float) -> float:
+        diff = 0.0 if self.previous is None else value - self.previous
+        self.previous = value
+        up = self.up.update(diff if diff > 0 else 0.0)
+        down = self.down.update(-diff if diff < 0 else 0.0)
+        self.count += 1
+        if self.count < self.window:
+            return np.nan
+        return 100.0 if down == 0 else 100.0 - 100.0 / (1.0 + up / down)
+
+
+class OnlineBollinger:
+    """Bollinger band (upper 또는 lower). 중심선은 OnlineSMA, 표준편차(ddof=0)는 window 구간 Welford 분산.
+        누적 오차가 쌓이지 않도록 window bar마다 구간 값으로 평균, 제곱합을 다시 계산 (평균 O(1))
+    """
+    def __init__(self, window: int = 20, window_dev: float = 2, band: str = 'upper'):
+        self.window = window
+        self.sign = window_dev if band == 'upper' else -window_dev
+        self.sma = OnlineSMA(window)
+        self.values = deque(maxlen=window)
+        self.mean = 0.0
+        self.m2 = 0.0           # 구간 값의 편차 제곱합
+        self.since_reset = 0
+
+    @classmethod
+    def from_history(cls, values, window: int = 20, window_dev: float = 2, band: str = 'upper') -> 'OnlineBollinger':
+        bollinger = cls(window, window_dev, band)
+        bollinger.sma = OnlineSMA.from_history(values, window)
+        bollinger.values.extend(np.asarray(values[-window:], dtype=np.float64).tolist())
+        bollinger.reset()
+        return bollinger
+
+    def reset(self):
+        """구간 값으로 평균, 제곱합 다시 계산 (two-pass)"""
+        values = np.fromiter(self.values, dtype=np.float64, count=len(self.values))
+        self.mean = float(values.mean()) if len(values) else 0.0
+        self.m2 = float(((values - self.mean) ** 2).sum())
+        self.since_reset = 0
+
+    def update(self, value: float) -> float:
+        mean = self.sma.update(value)
+        if len(self.values) < self.window:
+            # 구간이 찰 때까지는 값 추가만 (Welford)
+            self.values.append(value)
+            delta = value - self.mean
+            self.mean += delta / len(self.values)
+            self.m2 += delta * (value - self.mean)
+        else:
+            # 가장 오래된 값을 빼고 새 값 추가
+            oldest = self.values[0]
+            self.values.append(value)
+            previous_mean = self.mean
+            self.mean += (value - oldest) / self.window
+            self.m2 += (value - oldest) * (value - self.mean + oldest - previous_mean)
+            self.since_reset += 1
+            if self.since_reset >= self.window:
+                self.reset()
+        if self.sma.count < self.window:
+            return np.nan
+        return mean + self.sign * np.sqrt(max(self.m2, 0.0) / self.window)
+
+
+class OnlineShift:
+    """diff bar 전 base 값 (pd.Series.shift(diff))"""
+    def __init__(self, diff: int):
+        self.diff = diff
+        self.values = deque(maxlen=diff + 1)
+
+    @classmethod
+    def from_history(cls, values, diff: int) -> 'OnlineShift':
+        shift = cls(diff)
+        shift.values.extend(np.asarray(values[-(diff + 1):], dtype=np.float64).tolist())
+        return shift
+
+    def update(self, value: float) -> float:
+        self.values.append(value)
+        return self.values[0] if len(self.values) > self.diff else np.nan
+
+
+class OnlineReturn:
+    """Close / base.shift(diff) - 1. base가 Close이면 update(close)"""
+    def __init__(self, diff: int):
+        self.shift = OnlineShift(diff)
+
+    @classmethod
+    def from_history(cls, close, base=None, diff: int = 1) -> 'OnlineReturn':
+        returns = cls(diff)
+        returns.shift = OnlineShift.from_history(close if base is None else base, diff)
+        return returns
+
+    def update(self, close: float, base: float = None) -> float:
+        return np.float64(close) / self.shift.update(close if base is None else base) - 1
+
+
+class OnlineAngle:
+    """degrees(arctan((Close - base.shift(diff)) / 100))"""
+    def __init__(self, diff: int):
+        self.shift = OnlineShift(diff)
+
+    @classmethod
+    def from_history(cls, close, base=None, diff: int = 1) -> 'OnlineAngle':
+        angle = cls(diff)
+        angle.shift = OnlineShift.from_history(close if base is None else base, diff)
+        return angle
+
+    def update(self, close: float, base: float = None) -> float:
+        return float(np.degrees(np.arctan((close - self.shift.update(close if base is None else base)) / 100)))
+
+
+class OnlinePercentAngle:
+    """degrees(arctan(Return_{base}_{diff})). 상태 없음 (Return 컬럼을 입력으로 사용)"""
+    @classmethod
+    def from_history(cls, returns) -> 'OnlinePercentAngle':
+        return cls()
+
+    def update(self, returns: float) -> float:
+        return float(np.degrees(np.arctan(returns)))
+
+
+# Preprocessor spec kind -> (상태 객체 class, spec.params로 만든 생성 인자)
+ONLINE_INDICATORS = {
+    'MA'      : (OnlineSMA, lambda params: {'window': params['period']}),
+    'EMA'     : (OnlineEMA, lambda params: {'window': params['period']}),
+    'RSI'     : (OnlineRSI, lambda params: {'window': params['period']}),
+    'BBUpper' : (OnlineBollinger, lambda params: {'window': params['period'], 'band': 'upper'}),
+    'BBLower' : (OnlineBollinger, lambda params: {'window': params['period'], 'band': 'lower'}),
+    'Return'  : (OnlineReturn, lambda params: {'diff': params['diff']}),
+    'ANGLE'   : (OnlineAngle, lambda params: {'diff': params['diff']}),
+    'PANGLE'  : (OnlinePercentAngle, lambda params: {}),
+}
+
+
+class OnlineIndicators:
+    def __init__(self, preprocessor, columns: List[str], history=None):
+        """columns 지표와 dependency를 bar마다 갱신하는 객체
+
+        Args:
+            preprocessor (Preprocessor): 지표 이름 해석 (parse, resolve, warmup)
+            columns (list): 필요한 컬럼 이름. '4h:MA20' 같은 timeframe 컬럼은 지원하지 않음
+            history (pd.DataFrame | ColumnarFrame, optional): 이미 있는 앞 구간 데이터. 주면 이 데이터로 상태를 초기화해서
+                                                            이후 update 결과가 history + 새 bar 전체를 batch 계산한 값과 같음.
+                                                            history에 없는 지표 컬럼은 preprocessor로 계산. Defaults to None.
+        """
+        self.columns = list(columns)
+        self.states = []
+        self.count = 0
+        if history is not None:
+            history = pd.DataFrame({column: np.asarray(history[column]) for column in history.columns if column != 'Date'}, copy=False)
+            self.count = len(history)
+
+        for column in preprocessor.resolve(self.columns):
+            if preprocessor.split_timeframe(column)[0] is not None:
+                raise ValueError(f'Online indicators do not support timeframe column : {column}')
+            spec = preprocessor.parse(column)
+            if spec.kind == 'source':
+                continue
+            if spec.kind not in ONLINE_INDICATORS:
+                raise ValueError(f'Online indicators do not support : {column}, supported : {list(ONLINE_INDICATORS)}')
+
+            state_class, make_params = ONLINE_INDICATORS[spec.kind]
+            if history is None:
+                state = state_class(**make_params(spec.params))
+            else:
+                if column not in history:
+                    history[column] = preprocessor.make_column(column, history).to_numpy()
+                state = state_class.from_history(*(history[name].to_numpy() for name in spec.inputs), **make_params(spec.params))
+            self.states.append((column, spec.inputs, state))
+        self.warmup = max([preprocessor.warmup(column) for column in self.columns], default=0)
+
+    @property
+    def ready(self) -> bool:
+        """warm-up이 끝나서 모든 컬럼 값이 있는지 (batch의 align_frames 이후 첫 bar부터 True)"""
+        return self.count > self.warmup
+
+    def update(self, bar: Dict) -> Dict:
+        """원본 가격 bar {'Date':..., 'Close':..., ...}에 지표 값을 더한 row 반환"""
+        row = dict(bar)
+        for column, inputs, state in self.states:
+            row[column] = state.update(*(row[name] for name in inputs))
+        self.count += 1
+        return row
+
+    def extend(self, columns) -> Dict[str, np.ndarray]:
+        """새 bar들(컬럼별 배열 dict 또는 DataFrame)을 순서대로 update하고, 지표 컬럼별 새 bar 구간의 값 반환.
+            데이터를 추가한 뒤 지표 전체를 다시 계산하지 않고 뒤에 이어 붙일 때 사용
+        """
+        names = list(columns.keys())
+        arrays = [np.asarray(columns[name]) for name in names]
+        length = len(arrays[0]) if arrays else 0
+        values = {column: np.empty(length) for column, _, _ in self.states}
+        for idx in range(length):
+            row = self.update({name: array[idx] for name, array in zip(names, arrays)})
+            for column in values:
+                values[column][idx] = row[column]
+        return values
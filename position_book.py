@@ -0,0 +1,179 @@
+"""Position book
+
+진입 중인 포지션의 상태를 포지션별 StrategyManager 인스턴스 대신 struct-of-arrays(컬럼별 numpy 배열)로 관리.
+진입 순서대로 앞에서부터 채워지며 (청산되면 뒤의 포지션을 앞으로 당김), 모든 포지션의 평가 금액을
+bar마다 한 번의 벡터 연산으로 계산한다.
+
+    strategies      : 진입 순서대로의 전략 인스턴스 (청산 조건 판단에 사용)
+    asset           : asset 번호 (PositionBook.assets의 위치)
+    direction       : BUY 1, SELL -1
+    enter_price, position_size, leverage, trading_fee
+    balance, notional_position_size, realized_amount
+    signed_leverage, enter_amount, fee_factor : 평가 금액 계산용 (leverage * direction, enter_price * position_size, 1 - trading_fee)
+    update_hook     : update()를 override한 전략 (StrategyManager.has_update_hook). mark_to_market에서 벡터 평가 후 인스턴스의 update(close)를 호출하고 결과를 book에 반영
+"""
+import numpy as np
+from typing import Dict, List, Sequence
+from utils import Side
+
+# 포지션별로 저장하는 float 컬럼
+BOOK_COLUMNS = ['direction', 'enter_price', 'position_size', 'leverage', 'trading_fee', 'balance', 'notional_position_size', 'realized_amount'
+                , 'signed_leverage', 'enter_amount', 'fee_factor']
+
+
+class PositionBook:
+    def __init__(self, capacity: int = 16):
+        self.assets: List[str] = []
+        self.asset_index: Dict[str, int] = {}
+        self.strategies = []
+        self.asset = np.zeros(capacity, dtype=np.int64)
+        # 포지션별 청산 신호 번호 (close_signal_matrix의 열), 신호가 없으면 -1
+        self.close_signal = np.full(capacity, -1, dtype=np.int64)
+        self.update_hook = np.zeros(capacity, dtype=bool)
+        self.update_hook_count = 0
+        self.close_signal_ids: Dict = {}
+        self.close_signal_matrix = np.zeros((0, 0), dtype=bool)
+        for column in BOOK_COLUMNS:
+            setattr(self, column, np.zeros(capacity))
+
+    def __len__(self):
+        return len(self.strategies)
+
+    @property
+    def capacity(self) -> int:
+        return len(self.asset)
+
+    def add_asset(self, asset) -> int:
+        if asset not in self.asset_index:
+            self.asset_index[asset] = len(self.assets)
+            self.assets.append(asset)
+        return self.asset_index[asset]
+
+    def set_close_signals(self, close_signals: Dict):
+        """{key: bool 배열} 청산 신호 등록. bar별로 모든 신호를 한 번에 읽도록 (bar 수, 신호 수) 배열로 저장"""
+        self.close_signal_ids = {key: idx for idx, key in enumerate(close_signals)}
+        if close_signals:
+            self.close_signal_matrix = np.ascontiguousarray(np.stack([np.asarray(mask, dtype=bool) for mask in close_signals.values()], axis=1))
+        else:
+            self.close_signal_matrix = np.zeros((0, 0), dtype=bool)
+
+    def close_signal_id(self, key) -> int:
+        """등록된 청산 신호 번호. 없으면 -1"""
+        return self.close_signal_ids.get(key, -1)
+
+    def grow(self):
+        capacity = self.capacity * 2
+        for column in ['asset', 'close_signal', 'update_hook'] + BOOK_COLUMNS:
+            values = getattr(self, column)
+            grown = np.full(capacity, -1, dtype=values.dtype) if column == 'close_signal' else np.zeros(capacity, dtype=values.dtype)
+            grown[:len(values)] = values
+            setattr(self, column, grown)
+
+    def open(self, strategy_instance, close_signal: int = -1) -> int:
+        """open()된 전략 인스턴스의 포지션을 맨 뒤에 추가하고 위치 반환"""
+        slot = len(self.strategies)
+        if slot == self.capacity:
+            self.grow()
+        self.strategies.append(strategy_instance)
+        self.asset[slot] = self.add_asset(strategy_instance.ASSET)
+        self.close_signal[slot] = close_signal
+        self.update_hook[slot] = strategy_instance.has_update_hook()
+        self.update_hook_count += int(self.update_hook[slot])
+        self.direction[slot] = 1.0 if strategy_instance.SIDE == Side.BUY else -1.0
+        self.enter_price[slot] = strategy_instance.ENTER_PRICE
+        self.leverage[slot] = strategy_instance.LEVERAGE
+        self.trading_fee[slot] = strategy_instance.TRADING_FEE
+        self.signed_leverage[slot] = self.leverage[slot] * self.direction[slot]
+        self.fee_factor[slot] = 1 - self.trading_fee[slot]
+        self.sync(slot)
+        return slot
+
+    def sync(self, slot: int):
+        """close() 등으로 바뀐 인스턴스의 수량, 자산 정보를 book에 반영"""
+        strategy_instance = self.strategies[slot]
+        self.position_size[slot] = strategy_instance.position_size
+        self.enter_amount[slot] = self.enter_price[slot] * self.position_size[slot]
+        self.balance[slot] = strategy_instance.balance
+        self.notional_position_size[slot] = strategy_instance.notional_position_size
+        self.realized_amount[slot] = strategy_instance.realized_amount
+
+    def remove(self, slots: Sequence[int]):
+        """slots 위치의 포지션 제거. 남은 포지션은 진입 순서를 유지한 채 앞으로 당김"""
+        if len(slots) == 0:
+            return
+        count = len(self.strategies)
+        keep = np.ones(count, dtype=bool)
+        keep[list(slots)] = False
+        remain = int(keep.sum())
+        self.update_hook_count -= int(self.update_hook[list(slots)].sum())
+        for column in ['asset', 'close_signal', 'update_hook'] + BOOK_COLUMNS:
+            values = getattr(self, column)
+            values[:remain] = values[:count][keep]
+        self.strategies = [strategy_instance for strategy_instance, is_kept in zip(self.strategies, keep) if is_kept]
+
+    def close_candidates(self, didx: int) -> np.ndarray:
+        """didx bar에서 청산 조건을 확인해야 하는 포지션 위치 (청산 신호가 없거나 신호가 발생한 포지션).
+            asset 번호(assets 순서), 진입 순서로 정렬해서 반환
+        """
+        count = len(self.strategies)
+        if not self.close_signal_ids:
+            slots = np.arange(count)
+        else:
+            signal = self.close_signal[:count]
+            slots = np.flatnonzero((signal < 0) | self.close_signal_matrix[didx][signal])
+        if len(self.assets) > 1 and len(slots) > 1:
+            slots = slots[np.argsort(self.asset[slots], kind='stable')]
+        return slots
+
+    def position_value(self, close):
+        """close 가격 기준 포지션 평가 금액. StrategyManager.calculate_realized_amount와 같은 식
+            close는 (포지션 수,) 또는 (포지션 수, bar 수)
+        """
+        count = len(self.strategies)
+        shape = (count,) + (1,) * (np.ndim(close) - 1)
+        # ((enter_price * size) + leverage * (close - enter_price) * size) * (1 - fee) 를 같은 연산 순서로 in-place 계산
+        value = np.subtract(close, self.enter_price[:count].reshape(shape))
+        value *= self.signed_leverage[:count].reshape(shape)
+        value *= self.position_size[:count].reshape(shape)
+        value += self.enter_amount[:count].reshape(shape)
+        value *= self.fee_factor[:count].reshape(shape)
+        return value
+
+    def mark_to_market(self, asset_close: np.ndarray) -> float:
+        """asset별 close 가격(assets 순서)으로 모든 포지션의 balance, notional 갱신 후 balance 합계 반환"""
+        count = len(self.strategies)
+        if count == 0:
+            return 0.0
+        close = asset_close[self.asset[:count]]
+        np.multiply(close, self.position_size[:count], out=self.notional_position_size[:count])
+        self.balance[:count] = self.position_value(close)
+        if self.update_hook_count:
+            self.run_update_hooks(close)
+        # 진입 순서대로 더함 (포지션별로 더하던 기존 방식과 같은 결과)
+        return float(np.cumsum(self.balance[:count])[-1])
+
+    def run_update_hooks(self, close: np.ndarray):
+        """update()를 override한 포지션의 update(close) 호출 후 인스턴스 상태를 book에 반영 (진입 순서)"""
+        for slot in np.flatnonzero(self.update_hook[:len(self.strategies)]):
+            self.strategies[slot].update(float(close[slot]))
+            self.sync(slot)
+
+    def mark_to_market_range(self, asset_close: np.ndarray) -> np.ndarray:
+        """(asset 수, bar 수) close 가격으로 구간의 bar별 balance 합계 계산. 포지션 상태는 마지막 bar 기준으로 갱신
+            update()를 bar마다 호출하지 않으므로 update_hook이 있는 포지션에는 사용하지 않음 (Backtesting.run_prepared)
+        """
+        count = len(self.strategies)
+        if count == 0:
+            return np.zeros(asset_close.shape[1])
+        balance = self.position_value(asset_close[self.asset[:count]])
+        self.mark_to_market(asset_close[:, -1])
+        return np.cumsum(balance, axis=0)[-1]
+
+    def total_notional_position_size(self) -> float:
+        return float(self.notional_position_size[:len(self.strategies)].sum())
+
+    def sync_instances(self):
+        """book의 balance, notional을 전략 인스턴스에 반영 (run 종료 시점 등)"""
+        for slot, strategy_instance in enumerate(self.strategies):
+            strategy_instance.balance = float(self.balance[slot])
+            strategy_instance.notional_position_size = float(self.notional_position_size[slot])
@@ -1,75 +1,251 @@
+import re
 import pandas as pd
 import ta
 import numpy as np
 
+import indicators
+
+# 원본 가격 컬럼
+SOURCE_COLUMNS = ['Date', 'Open', 'High', 'Low', 'Close', 'Volume']
+
+# 지표 이름 문법. 위에서부터 전체 문자열이 일치(fullmatch)하는 첫 번째 kind로 해석
+#   base는 다른 지표 또는 원본 컬럼 이름 (MA1920, EMA50, Close ...)
+SPEC_GRAMMAR = [
+    ('source' , '(?P<name>' + '|'.join(SOURCE_COLUMNS) + ')'),
+    ('EMA'    , r'EMA(?P<period>\d+)'),
+    ('MA'     , r'MA(?P<period>\d+)'),
+    ('RSI'    , r'RSI(?P<period>\d+)?'),
+    ('BBUpper', r'BBUpper(?P<period>\d+)?'),
+    ('BBLower', r'BBLower(?P<period>\d+)?'),
+    ('Return' , r'Return(_(?P<base>[A-Za-z]+\d*)_(?P<diff>\d+))?'),
+    ('PANGLE' , r'PANGLE_(?P<base>[A-Za-z]+\d*)_(?P<diff>\d+)'),
+    ('ANGLE'  , r'ANGLE_(?P<base>[A-Za-z]+\d*)_(?P<diff>\d+)'),
+]
+SPEC_PATTERNS = [(kind, re.compile(pattern)) for kind, pattern in SPEC_GRAMMAR]
+
+# period가 없는 지표의 기본 기간
+DEFAULT_PERIODS = {'RSI': 14, 'BBUpper': 20, 'BBLower': 20}
+
+
+class IndicatorSpec:
+    """지표 이름을 해석한 결과.
+
+        name   : 컬럼 이름 (MA20, PANGLE_MA1920_100)
+        kind   : SPEC_GRAMMAR의 kind
+        params : period / base, diff
+        inputs : 계산에 필요한 컬럼 이름 (dependency)
+    """
+    __slots__ = ('name', 'kind', 'params', 'inputs')
+
+    def __init__(self, name, kind, params, inputs):
+        self.name = name
+        self.kind = kind
+        self.params = params
+        self.inputs = inputs
+
+    def __repr__(self):
+        return f'IndicatorSpec({self.name!r}, kind={self.kind!r}, params={self.params}, inputs={self.inputs})'
+
+
 class Preprocessor:
     """기술적 지표를 생성하기 위한 클래스"""
+    def __init__(self, cache=None):
+        # IndicatorCache. None이면 매번 계산
+        self.cache = cache
+        self.specs = {}
+    
     def possible_columns(self):
-        return ['EMA/{number/}', 'MA/{number/}', "RSI", 'BBUpper', 'BBLower', 'PANGLE', 'ANGLE']
+        # 모든 컬럼 앞에 '4h:'처럼 timeframe을 붙이면 해당 timeframe으로 resample한 지표 (Backtesting.ready_data)
+        # Return_{base}_{n}: Close / base.shift(n) - 1, Return은 Return_Close_1
+        return ['EMA/{number/}', 'MA/{number/}', "RSI", 'RSI/{number/}', 'BBUpper', 'BBLower', 'Return', 'Return_/{base/}_/{number/}', 'PANGLE_/{base/}_/{number/}', 'ANGLE_/{base/}_/{number/}']
     
-    def make_column(self, column, df):
-        df_copy = df.copy()
+    def parse(self, column) -> IndicatorSpec:
+        """지표 이름을 IndicatorSpec으로 해석. 문법에 맞지 않으면 ValueError"""
+        if column in self.specs:
+            return self.specs[column]
         
-        if 'EMA' in column and '_' not in column:
-            period = int(column[3:])
-            return self.exponential_moving_average(df_copy, period)
+        for kind, pattern in SPEC_PATTERNS:
+            match = pattern.fullmatch(column)
+            if match is not None:
+                break
+        else:
+            raise ValueError(f"Unknown indicator : {column}, possible columns : {self.possible_columns()}")
         
-        if 'MA' in column and '_' not in column:
-            period = int(column[2:])
-            return self.moving_average(df_copy, period)
+        groups = match.groupdict()
+        if kind == 'source':
+            params, inputs = {}, []
+        elif kind in ['Return', 'PANGLE', 'ANGLE']:
+            base, diff = groups['base'] or 'Close', int(groups['diff'] or 1)
+            params = {'base': base, 'diff': diff}
+            if kind == 'PANGLE':
+                # PANGLE은 Return을 중간 결과로 사용 (같은 Return을 쓰는 지표와 공유)
+                inputs = [f'Return_{base}_{diff}']
+            else:
+                inputs = list(dict.fromkeys(['Close', base]))
+        else:
+            params = {'period': int(groups['period'] or DEFAULT_PERIODS[kind])}
+            inputs = ['Close']
         
-        if column == 'RSI':
-            return self.rsi(df_copy)
+        spec = IndicatorSpec(column, kind, params, inputs)
+        # base 등 dependency도 문법에 맞는지 확인
+        for dependency in inputs:
+            self.parse(dependency)
+        self.specs[column] = spec
+        return spec
+    
+    def resolve(self, columns):
+        """columns와 dependency를 모두 포함해서 계산 순서(topological order)대로 정렬. 중복 없이 한 번씩만.
+            '4h:MA20'처럼 timeframe이 붙은 컬럼은 resample한 frame에서 따로 계산하므로 그대로 둠.
+        """
+        ordered = {}
+        def visit(column):
+            if column in ordered:
+                return
+            if self.split_timeframe(column)[0] is None:
+                for dependency in self.parse(column).inputs:
+                    visit(dependency)
+            else:
+                # timeframe 컬럼도 문법은 미리 확인
+                self.parse(self.split_timeframe(column)[1])
+            ordered[column] = None
         
-        if column == 'BBUpper':
-            return self.bollinger_bands(df_copy, 'upper')
+        for column in columns:
+            visit(column)
+        return list(ordered)
+    
+    def make_column(self, column, df, key=None):
+        """column 지표 계산. df는 수정, 복사하지 않음.
+            key=(asset, timeframe, data fingerprint)가 주어지고 cache가 있으면 캐시된 값을 사용.
+            cache는 복사본을 read-only로 저장하므로 계산한 Series와 캐시된 값의 Series는 메모리를 공유하지 않음.
+            df에 없는 dependency(PANGLE_MA1920_100의 MA1920 등)는 먼저 계산해서 사용.
+        """
+        missing = [dependency for dependency in self.resolve([column])[:-1] if dependency not in df]
+        if missing:
+            columns = {name: df[name] for name in df.columns}
+            for dependency in missing:
+                columns[dependency] = self.make_column(dependency, pd.DataFrame(columns, copy=False), key=key)
+            df = pd.DataFrame(columns, copy=False)
         
-        if column == 'BBLower':
-            return self.bollinger_bands(df_copy, 'lower')
+        if self.cache is None or key is None:
+            return self.compute_column(column, df)
         
-        if 'PANGLE' in column:
-            '''PANGLE_MA1920_100'''
-            base, diff = column.split('_')[1], int(column.split('_')[2])
-            return self.calculate_percent_angle(df_copy, column, base, diff)        
+        cache_key = self.cache.make_key(*key, column)
+        values = self.cache.get(cache_key)
+        if values is None:
+            series = self.compute_column(column, df)
+            self.cache.put(cache_key, series.to_numpy())
+            return series
+        return pd.Series(values, index=getattr(df, 'index', None), name=column)
+    
+    def split_timeframe(self, column):
+        """'4h:MA20' -> ('4h', 'MA20'), 'MA20' -> (None, 'MA20')"""
+        if ':' in column:
+            timeframe, base_column = column.split(':', 1)
+            return timeframe, base_column
+        return None, column
+    
+    def warmup(self, column) -> int:
+        """column 지표의 warm-up 길이 (앞쪽에 NaN이 생기는 bar 개수). dependency의 warm-up을 포함."""
+        spec = self.parse(column)
+        if spec.kind in ['Return', 'ANGLE']:
+            own = spec.params['diff']
+        elif 'period' in spec.params:
+            own = spec.params['period'] - 1
+        else:
+            own = 0
+        return own + max([self.warmup(dependency) for dependency in spec.inputs], default=0)
+    
+    def compute_column(self, column, df):
+        """column 지표 계산. dependency 컬럼은 df에 있어야 함 (make_column, resolve 참고)"""
+        spec = self.parse(column)
+        params = spec.params
+        
+        if spec.kind == 'source':
+            return df[column].rename(column)
+        
+        if spec.kind == 'EMA':
+            return self.exponential_moving_average(df, params['period'])
+        
+        if spec.kind == 'MA':
+            return self.moving_average(df, params['period'])
+        
+        if spec.kind == 'RSI':
+            return self.rsi(df, params['period']).rename(column)
+        
+        if spec.kind == 'BBUpper':
+            return self.bollinger_bands(df, 'upper', params['period']).rename(column)
         
-        if 'ANGLE' in column:
-            '''PANGLE_MA1920_100'''
-            base, diff = column.split('_')[1], int(column.split('_')[2])
-            return self.calculate_angle(df_copy, column, base, diff)
+        if spec.kind == 'BBLower':
+            return self.bollinger_bands(df, 'lower', params['period']).rename(column)
         
+        if spec.kind == 'Return':
+            return self.calculate_return(df, column, params['base'], params['diff'])
         
-    def moving_average(self, df_copy, n):
-        df_copy[f'MA{n}'] = ta.trend.sma_indicator(df_copy['Close'], window=n)
-        return df_copy[f'MA{n}']
+        if spec.kind == 'PANGLE':
+            # PANGLE_MA1920_100
+            return self.calculate_percent_angle(df, column, params['base'], params['diff'])
+        
+        if spec.kind == 'ANGLE':
+            # ANGLE_MA1920_100
+            return self.calculate_angle(df, column, params['base'], params['diff'])
+        
+        
+    def close_values(self, df):
+        """indicators kernel 입력용 Close 배열. NaN이 있으면 None (ta로 계산)"""
+        close = np.asarray(df['Close'], dtype=np.float64)
+        return None if np.isnan(close).any() else close
     
-    def exponential_moving_average(self, df_copy, n):
-        df_copy[f'EMA{n}'] = ta.trend.ema_indicator(df_copy['Close'], window=n)
-        return df_copy[f'EMA{n}']
+    def moving_average(self, df, n):
+        close = self.close_values(df)
+        if close is None:
+            return ta.trend.sma_indicator(df['Close'], window=n).rename(f'MA{n}')
+        return pd.Series(indicators.sma(close, n), index=df.index, name=f'MA{n}')
     
-    def rsi(self, df_copy, window=14):
-        df_copy['RSI'] = ta.momentum.rsi(df_copy['Close'], window=window)
-        return df_copy['RSI']
+    def moving_average_batch(self, df, windows):
+        """여러 기간의 이동평균을 한 번에 계산. MA{n} 컬럼의 DataFrame 반환"""
+        close = self.close_values(df)
+        if close is None:
+            return pd.DataFrame({f'MA{n}': self.moving_average(df, n) for n in windows}, index=df.index)
+        values = indicators.sma_batch(close, windows)
+        return pd.DataFrame(values.T, index=df.index, columns=[f'MA{n}' for n in windows])
     
-    def bollinger_bands(self, df_copy, band_type='upper', window=20, window_dev=2):
-        indicator_bb = ta.volatility.BollingerBands(close=df_copy['Close'], window=window, window_dev=window_dev)
+    def exponential_moving_average(self, df, n):
+        close = self.close_values(df)
+        if close is None:
+            return ta.trend.ema_indicator(df['Close'], window=n).rename(f'EMA{n}')
+        return pd.Series(indicators.ema(close, n), index=df.index, name=f'EMA{n}')
+    
+    def rsi(self, df, window=14):
+        close = self.close_values(df)
+        if close is None:
+            return ta.momentum.rsi(df['Close'], window=window).rename('RSI')
+        return pd.Series(indicators.rsi(close, window), index=df.index, name='RSI')
+    
+    def bollinger_bands(self, df, band_type='upper', window=20, window_dev=2):
+        close = self.close_values(df)
+        if close is None:
+            indicator_bb = ta.volatility.BollingerBands(close=df['Close'], window=window, window_dev=window_dev)
+            upper, lower = indicator_bb.bollinger_hband(), indicator_bb.bollinger_lband()
+        else:
+            upper, lower = indicators.bollinger_bands(close, window, window_dev)
         
         if band_type == 'upper':
-            df_copy['BBUpper'] = indicator_bb.bollinger_hband()
-            return df_copy['BBUpper']
+            return pd.Series(upper, index=df.index, name='BBUpper')
         
         if band_type == 'lower':
-            df_copy['BBLower'] = indicator_bb.bollinger_lband()
-            return df_copy['BBLower']
+            return pd.Series(lower, index=df.index, name='BBLower')
     
 
-    def calculate_angle(self, df_copy, column, base, diff):
-        df_copy[column] = np.degrees(np.arctan((df_copy['Close'] - df_copy[base].shift(diff)) / 100))
-        return df_copy[column]
+    def calculate_angle(self, df, column, base, diff):
+        return np.degrees(np.arctan((df['Close'] - df[base].shift(diff)) / 100)).rename(column)
+    
+    def calculate_return(self, df, column, base, diff):
+        # diff기간 전 base에 대한 현재수익률
+        return ((df['Close'] / df[base].shift(diff)) - 1).rename(column)
     
-    def calculate_percent_angle(self, df_copy, column, base, diff):
-        # 100기간의 base에 대한 현재수익률 계산
-        df_copy['Return'] = (df_copy['Close'] / df_copy[base].shift(diff)) - 1
+    def calculate_percent_angle(self, df, column, base, diff):
+        # 100기간의 base에 대한 현재수익률 (Return_{base}_{diff} 컬럼)
+        returns = df[f'Return_{base}_{diff}']
         # 각도 계산
-        df_copy[column] = np.degrees(np.arctan(df_copy['Return']))    
-        return df_copy[column]
+        return np.degrees(np.arctan(returns)).rename(column)
     
\ No newline at end of file
@@ -0,0 +1,148 @@
+"""Backtesting profiler
+
+Backtesting(..., profiler=Profiler())로 켜는 계측. 켜지 않으면 (profiler=None) run_bar에서 None 확인만 한다.
+Profiler(timing=False)면 hook과 횟수만 기록하고 단계별 시간은 측정하지 않는다 (Backtesting.phase_timer가 None).
+
+    phase    : run 단계별 호출 횟수, 누적 시간
+               ready_data, ready_signals, close(청산 확인), open(진입 확인), mark_to_market, record,
+               next_event, fill_mark_to_market (event_driven), online_indicators (run_stream)
+    strategy : 전략 class별 전략 메서드 호출 횟수, 누적 시간
+               bar마다 확인하는 open_condition, close_condition, 벡터화 신호(ready_signals)의 open_signals, close_signals,
+               override한 update (진입 중 bar마다 평가)
+               (전략 인스턴스를 만들 때 메서드를 감싸므로 run_bar에는 분기가 없음)
+    event    : 전략 class별 진입(open), 청산(close) 횟수
+
+Hook을 상속해서 on_bar, on_open, on_close, on_end를 구현하면 run 중에 호출된다. event_driven으로 건너뛴 bar에서는 on_bar가 호출되지 않음.
+
+    class PrintClose(Hook):
+        def on_close(self, backtester, strategy_instance, close_info, didx):
+            print(didx, close_info['strategy_name'], close_info['realized_now_amount'])
+
+    backtester = Backtesting(strategy_list, profiler=Profiler(hooks=[PrintClose()], print_report=True))
+    backtester.run(datalist)
+    backtester.profiler.report()
+"""
+import pandas as pd
+from collections import defaultdict
+from time import perf_counter
+from typing import List
+
+
+class Hook:
+    """Profiler hook. 필요한 메서드만 구현"""
+    def on_bar(self, backtester, didx):
+        pass
+
+    def on_open(self, backtester, strategy_instance, didx):
+        pass
+
+    def on_close(self, backtester, strategy_instance, close_info, didx):
+        pass
+
+    def on_end(self, backtester):
+        pass
+
+
+class Profiler:
+    def __init__(self, hooks: List[Hook] = (), timing: bool = True, print_report: bool = False):
+        """
+        Args:
+            hooks (list, optional): Hook 인스턴스 리스트. Defaults to ().
+            timing (bool, optional): 단계별, 전략별 시간 측정. False면 hook과 횟수만 (run_bar에서 perf_counter를 호출하지 않음). Defaults to True.
+            print_report (bool, optional): run이 끝나면 format_report() 출력. Defaults to False.
+        """
+        self.hooks = list(hooks)
+        self.timing = timing
+        self.print_report = print_report
+        # name -> [호출 횟수, 누적 시간]
+        self.phases = defaultdict(lambda: [0, 0.0])
+        self.strategies = defaultdict(lambda: [0, 0.0])
+        self.events = defaultdict(lambda: [0, 0.0])
+        self.bars = 0
+        self.run_start = None
+        self.run_time = 0.0
+        # 구현된 hook만 호출
+        self.bar_hooks = [hook.on_bar for hook in self.hooks if type(hook).on_bar is not Hook.on_bar]
+        self.open_hooks = [hook.on_open for hook in self.hooks if type(hook).on_open is not Hook.on_open]
+        self.close_hooks = [hook.on_close for hook in self.hooks if type(hook).on_close is not Hook.on_close]
+        self.end_hooks = [hook.on_end for hook in self.hooks if type(hook).on_end is not Hook.on_end]
+
+    def start(self):
+        """run 시작 시각 기록. 이미 시작했으면 (run -> run_prepared) 유지"""
+        if self.run_start is None:
+            self.run_start = perf_counter()
+
+    def add_phase(self, name: str, start: float) -> float:
+        """start(perf_counter 값)부터 지금까지를 name 단계 시간으로 더하고 현재 시각 반환"""
+        now = perf_counter()
+        stats = self.phases[name]
+        stats[0] += 1
+        stats[1] += now - start
+        return now
+
+    def wrap_strategy(self, strategy_instance):
+        """전략 인스턴스의 open_condition, close_condition, open_signals, close_signals와 override한 update를 시간 측정 함수로 감쌈"""
+        if not self.timing:
+            return strategy_instance
+        class_name = type(strategy_instance).__name__
+        methods = ['open_condition', 'close_condition', 'open_signals', 'close_signals']
+        if strategy_instance.has_update_hook():
+            methods.append('update')
+        for method in methods:
+            setattr(strategy_instance, method, self.timed(self.strategies[f'{class_name}.{method}'], getattr(strategy_instance, method)))
+        return strategy_instance
+
+    def timed(self, stats, function):
+        def timed_function(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                stats[0] += 1
+                stats[1] += perf_counter() - start
+        return timed_function
+
+    def on_bar(self, backtester, didx):
+        self.bars += 1
+        for hook in self.bar_hooks:
+            hook(backtester, didx)
+
+    def on_open(self, backtester, strategy_instance, didx):
+        self.events[f'{type(strategy_instance).__name__}.open'][0] += 1
+        for hook in self.open_hooks:
+            hook(backtester, strategy_instance, didx)
+
+    def on_close(self, backtester, strategy_instance, close_info, didx):
+        self.events[f'{type(strategy_instance).__name__}.close'][0] += 1
+        for hook in self.close_hooks:
+            hook(backtester, strategy_instance, close_info, didx)
+
+    def finish(self, backtester):
+        if self.run_start is not None:
+            self.run_time += perf_counter() - self.run_start
+            self.run_start = None
+        for hook in self.end_hooks:
+            hook(backtester)
+        if self.print_report:
+            print(self.format_report())
+
+    def report(self) -> pd.DataFrame:
+        """kind(phase, strategy, event), name별 calls, total(s), mean(us), share(run 시간 대비)"""
+        rows = []
+        for kind, stats in [('phase', self.phases), ('strategy', self.strategies), ('event', self.events)]:
+            for name, (calls, total) in stats.items():
+                rows.append({'kind': kind
+                             , 'name': name
+                             , 'calls': calls
+                             , 'total(s)': total if kind != 'event' else None
+                             , 'mean(us)': total / calls * 1e6 if calls and kind != 'event' else None
+                             , 'share': total / self.run_time if self.run_time and kind != 'event' else None})
+        return pd.DataFrame(rows, columns=['kind', 'name', 'calls', 'total(s)', 'mean(us)', 'share'])
+
+    def format_report(self) -> str:
+        bars_per_second = self.bars / self.run_time if self.run_time else 0
+        lines = [f'Backtesting {self.bars} bars, {self.run_time:.3f}s ({bars_per_second:,.0f} bars/s)']
+        df = self.report()
+        if len(df):
+            lines.append(df.to_string(index=False, float_format=lambda value: f'{value:.4g}'))
+        return '\n'.join(lines)
@@ -0,0 +1,245 @@
+"""Backtesting recorder
+
+bar별 자산 정보(backtesting_info)와 청산 정보(strategy_clear_info)를 dict 리스트 대신 컬럼별 numpy 배열에 기록.
+
+    BalanceRecorder : bar 수만큼 미리 할당한 배열에 total_balance, enter_balacne, remain_balance, entered_strategy_cnt 기록
+                      every=N이면 N bar마다, events_only=True이면 진입/청산이 일어난 bar만 기록 (마지막 bar는 항상 기록)
+                      bar 수를 모르면 (length=None, run_stream) 배열이 찰 때마다 두 배로 늘림
+    FillRecorder    : close()가 반환한 청산 정보를 key별 배열에 기록. 배열이 차면 두 배로 늘림
+
+sink가 있으면 배열을 늘리는 대신 기록한 구간을 DataFrame으로 sink에 넘기고 비운다 (flush). 메모리는 배열 크기로 고정되고
+to_frame()은 아직 넘기지 않은 구간만 반환한다.
+
+dates(bar별 Date 배열)가 없으면 record에 전달된 date를 함께 저장한다 (run_stream).
+
+to_frame()은 기록된 구간의 배열을 복사하지 않고 감싼 pd.DataFrame을 반환한다.
+"""
+import numpy as np
+import pandas as pd
+from typing import Callable, Dict
+
+# BalanceRecorder 컬럼 (기존 backtesting_info dict의 key와 같음)
+BALANCE_COLUMNS = {'total_balance': np.float64, 'enter_balacne': np.float64, 'remain_balance': np.float64, 'entered_strategy_cnt': np.int64}
+# bar 수를 모를 때 (length=None) BalanceRecorder 초기 배열 크기. sink가 있으면 flush 단위
+STREAM_CAPACITY = 1024
+
+
+def column_dtype(value):
+    """청산 정보 값의 배열 dtype"""
+    if isinstance(value, (bool, np.bool_)):
+        return np.bool_
+    if isinstance(value, (int, np.integer)):
+        return np.int64
+    if isinstance(value, (float, np.floating)):
+        return np.float64
+    return object
+
+
+def grow_array(values: np.ndarray, capacity: int) -> np.ndarray:
+    grown = np.full(capacity, None, dtype=object) if values.dtype == object else np.zeros(capacity, dtype=values.dtype)
+    grown[:len(values)] = values
+    return grown
+
+
+def dates_at(dates, bars: np.ndarray, count: int):
+    """bar 위치의 Date. 0부터 모든 bar가 기록되었으면 slice (복사 없음)"""
+    if count == 0 or bars[count - 1] == count - 1:
+        return dates[:count]
+    return dates[bars[:count]]
+
+
+def empty_value(dtype):
+    """기록이 없는 칸의 값 (숫자는 NaN, object는 None)"""
+    return np.nan if dtype == np.float64 else None if dtype == object else 0
+
+
+class BalanceRecorder:
+    def __init__(self, length: int = 0, dates=None, every: int = 1, events_only: bool = False, sink: Callable = None):
+        """
+        Args:
+            length (int): 전체 bar 수. None이면 알 수 없음 (배열을 늘려가며 기록)
+            dates (array, optional): bar별 Date (ColumnarFrame['Date']). to_frame에서 Date 컬럼으로 사용
+            every (int, optional): N bar마다 기록. Defaults to 1.
+            events_only (bool, optional): 진입/청산이 일어난 bar만 기록. Defaults to False.
+            sink (callable, optional): 배열이 차면 sink(DataFrame)으로 기록한 구간을 넘기고 비움. Defaults to None.
+        """
+        assert every >= 1, 'every must be >= 1'
+        self.length = length
+        self.dates = dates
+        self.every = every
+        self.events_only = events_only
+        self.sink = sink
+        self.count = 0
+        self.flushed = 0        # sink로 넘긴 기록 수
+        self.last_bar = None    # 마지막으로 기록한 bar (flush 후에도 유지)
+        if length is None:
+            capacity = STREAM_CAPACITY
+        else:
+            capacity = length if (events_only or every == 1) else -(-length // every) + 1
+        self.bar = np.zeros(capacity, dtype=np.int64)
+        for column, dtype in BALANCE_COLUMNS.items():
+            setattr(self, column, np.zeros(capacity, dtype=dtype))
+        self.date = np.zeros(capacity, dtype='datetime64[ms]') if dates is None else None
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def capacity(self) -> int:
+        return len(self.bar)
+
+    def grow(self, size: int):
+        capacity = max(self.capacity * 2, self.count + size)
+        for column in ['bar', 'date'] + list(BALANCE_COLUMNS):
+            if getattr(self, column) is not None:
+                setattr(self, column, grow_array(getattr(self, column), capacity))
+
+    def reserve(self, size: int):
+        """size개를 기록할 자리 확보. sink가 있으면 기록한 구간을 넘기고, 그래도 모자라면 배열을 늘림"""
+        if self.count + size <= self.capacity:
+            return
+        if self.sink is not None:
+            self.flush()
+        if self.count + size > self.capacity:
+            self.grow(size)
+
+    def flush(self):
+        """기록한 구간을 sink로 넘기고 비움 (배열은 다시 사용하므로 복사해서 넘김)"""
+        if self.sink is None or self.count == 0:
+            return
+        self.sink(self.to_frame().copy())
+        self.flushed += self.count
+        self.count = 0
+
+    def should_record(self, didx: int, event: bool = False) -> bool:
+        if self.length is not None and didx == self.length - 1:
+            return True
+        if self.events_only:
+            return event
+        return didx % self.every == 0
+
+    def record(self, didx: int, total_balance, enter_balance, remain_balance, entered_strategy_cnt, event: bool = False
+               , date=None, force: bool = False):
+        """didx bar의 자산 정보 기록. event는 해당 bar에서 진입/청산이 일어났는지 여부, force=True면 항상 기록"""
+        if not (force or self.should_record(didx, event)):
+            return
+        self.reserve(1)
+        idx = self.count
+        self.bar[idx] = didx
+        self.last_bar = didx
+        if self.date is not None:
+            self.date[idx] = date
+        self.total_balance[idx] = total_balance
+        self.enter_balacne[idx] = enter_balance
+        self.remain_balance[idx] = remain_balance
+        self.entered_strategy_cnt[idx] = entered_strategy_cnt
+        self.count += 1
+
+    def record_range(self, start: int, end: int, total_balance: np.ndarray, enter_balance: np.ndarray, remain_balance, entered_strategy_cnt):
+        """이벤트가 없는 [start, end) 구간의 자산 정보 기록 (Backtesting.fill_mark_to_market)"""
+        bars = np.arange(start, end)
+        if self.events_only:
+            keep = bars == self.length - 1
+        elif self.every == 1:
+            keep = slice(None)
+        else:
+            keep = (bars % self.every == 0) | (bars == self.length - 1)
+        bars = bars[keep]
+        count = len(bars)
+        if count == 0:
+            return
+        self.reserve(count)
+        idx = self.count
+        self.last_bar = int(bars[-1])
+        self.bar[idx:idx + count] = bars
+        self.total_balance[idx:idx + count] = total_balance[keep]
+        self.enter_balacne[idx:idx + count] = enter_balance[keep]
+        self.remain_balance[idx:idx + count] = remain_balance
+        self.entered_strategy_cnt[idx:idx + count] = entered_strategy_cnt
+        self.count += count
+
+    def to_frame(self) -> pd.DataFrame:
+        """기록된 bar의 DataFrame (Date, total_balance, enter_balacne, remain_balance, entered_strategy_cnt)"""
+        if self.dates is None:
+            columns = {'Date': self.date[:self.count]}
+        else:
+            columns = {'Date': dates_at(self.dates, self.bar, self.count)}
+        columns.update({column: getattr(self, column)[:self.count] for column in BALANCE_COLUMNS})
+        return pd.DataFrame(columns, copy=False)
+
+
+class FillRecorder:
+    def __init__(self, dates=None, capacity: int = 64, sink: Callable = None):
+        """
+        Args:
+            dates (array, optional): bar별 Date. to_frame에서 청산이 일어난 bar의 Date 컬럼으로 사용
+            capacity (int, optional): 초기 배열 크기. sink가 있으면 flush 단위. Defaults to 64.
+            sink (callable, optional): 배열이 차면 sink(DataFrame)으로 기록한 구간을 넘기고 비움. Defaults to None.
+        """
+        self.dates = dates
+        self.sink = sink
+        self.count = 0
+        self.flushed = 0
+        self.bar = np.zeros(capacity, dtype=np.int64)
+        self.date = np.zeros(capacity, dtype='datetime64[ms]') if dates is None else None
+        self.columns: Dict[str, np.ndarray] = {}
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def capacity(self) -> int:
+        return len(self.bar)
+
+    def grow(self):
+        capacity = self.capacity * 2
+        self.bar = grow_array(self.bar, capacity)
+        if self.date is not None:
+            self.date = grow_array(self.date, capacity)
+        self.columns = {name: grow_array(values, capacity) for name, values in self.columns.items()}
+
+    def flush(self):
+        """기록한 구간을 sink로 넘기고 비움. 다음 기록에 없는 key가 이전 값으로 남지 않도록 배열도 비움"""
+        if self.sink is None or self.count == 0:
+            return
+        self.sink(self.to_frame().copy())
+        for values in self.columns.values():
+            values[:self.count] = empty_value(values.dtype)
+        self.flushed += self.count
+        self.count = 0
+
+    def add_column(self, name, value):
+        """처음 나온 key의 배열 생성. 앞선 기록은 NaN (숫자) 또는 None"""
+        dtype = column_dtype(value)
+        if self.count > 0 and dtype in (np.bool_, np.int64):
+            dtype = object
+        values = np.full(self.capacity, None if dtype == object else 0, dtype=dtype)
+        if dtype == np.float64:
+            values[:self.count] = np.nan
+        self.columns[name] = values
+
+    def record(self, didx: int, info: Dict, date=None):
+        """didx bar에서 발생한 청산 정보(StrategyManager.close의 반환값) 기록"""
+        if self.count == self.capacity:
+            self.flush() if self.sink is not None else self.grow()
+        idx = self.count
+        self.bar[idx] = didx
+        if self.date is not None:
+            self.date[idx] = date
+        for name, value in info.items():
+            values = self.columns.get(name)
+            if values is None:
+                self.add_column(name, value)
+                values = self.columns[name]
+            elif values.dtype.kind in 'biu' and column_dtype(value) != values.dtype:
+                # int 컬럼에 float 값 등 dtype이 다른 값이 들어오면 넓은 dtype으로 변환
+                values = values.astype(np.float64 if column_dtype(value) == np.float64 and values.dtype.kind != 'b' else object)
+                self.columns[name] = values
+            values[idx] = value
+        self.count += 1
+
+    def to_frame(self) -> pd.DataFrame:
+        """기록된 청산 정보의 DataFrame (Date와 close()가 반환한 key)"""
+        columns = {'Date': self.date[:self.count] if self.dates is None else self.dates[self.bar[:self.count]]}
+        columns.update({name: values[:self.count] for name, values in self.columns.items()})
+        return pd.DataFrame(columns, copy=False)
@@ -1,7 +1,8 @@
-from typing import Tuple
+from typing import Tuple, Dict
 from utils import Side, Status
+import numpy as np
 import pandas as pd
-from strategy.base import StrategyManager
+from strategy.strategy_manager import StrategyManager
     
 class SimpleMovingAverageStrategy(StrategyManager):
     def __init__(self, asset, strategy_name, trading_fee=0.045):
@@ -44,6 +45,20 @@ class SimpleMovingAverageStrategy(StrategyManager):
         is_close, close_size, close_price = False, 0.0, 0.0
         return is_close, close_size, close_price
 
+    def open_signals(self, data) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """open_condition의 벡터화 버전"""
+        ma5, ma20 = data['MA5'], data['MA20']
+        is_open = (ma5 > ma20) | (ma5 < ma20)
+        side = np.full(len(ma5), Side.NONE, dtype=object)
+        side[ma5 > ma20], side[ma5 < ma20] = Side.BUY, Side.SELL
+        enter_price = np.where(is_open, data['Close'], 0.0)
+        return is_open, side, enter_price
+    
+    def close_signals(self, data) -> Dict[str, np.ndarray]:
+        """close_condition의 벡터화 버전"""
+        ma5, ma20 = data['MA5'], data['MA20']
+        return {Side.BUY: ma5 < ma20, Side.SELL: ma5 > ma20}
+
     
     
 class PartialCloseMovingAverageStrategy(StrategyManager):
@@ -101,9 +116,24 @@ class PartialCloseMovingAverageStrategy(StrategyManager):
         
         is_close, close_size, close_price = False, 0.0, 0.0
         return is_close, close_size, close_price
+
+    def open_signals(self, data) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """open_condition의 벡터화 버전"""
+        ma5, ma20 = data['MA5'], data['MA20']
+        is_open = (ma5 > ma20) | (ma5 < ma20)
+        side = np.full(len(ma5), Side.NONE, dtype=object)
+        side[ma5 > ma20], side[ma5 < ma20] = Side.BUY, Side.SELL
+        enter_price = np.where(is_open, data['Close'], 0.0)
+        return is_open, side, enter_price
+    
+    def close_signals(self, data) -> Dict[str, np.ndarray]:
+        """close_condition의 벡터화 버전"""
+        ma5, ma20 = data['MA5'], data['MA20']
+        return {Side.BUY: ma5 < ma20, Side.SELL: ma5 > ma20}
     
-    def update(self, close):
-        super().update(close)
-        # 포지션 청산 후 포지션이 없으면 플래그 초기화
+    def close(self, close_size, close_price):
+        close_info = super().close(close_size, close_price)
+        # 포지션 청산 후 포지션이 없으면 플래그 초기화 (포지션 변화에만 반응하므로 update() 대신 close()에서 처리)
         if self.position_size == 0:
-            self.partial_close_done = False
\ No newline at end of file
+            self.partial_close_done = False
+        return close_info
\ No newline at end of file
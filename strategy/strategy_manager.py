@@ -1,5 +1,6 @@
 # 진입 자금, 진입 
-from typing import Tuple, List
+import numpy as np
+from typing import Tuple, List, Dict, Optional
 # size: 진입 사이즈, notional_size, entry_price, margin, unrealized_pnl, realized_pnl
 
 class Side:
@@ -9,6 +10,19 @@ class Side:
     
 
 class StrategyManager:
+    """전략 하나의 포지션(진입 1회)을 관리. Backtesting은 진입할 때마다 새 인스턴스를 만든다.
+
+    Backtesting이 호출하는 hook
+        open_condition / open_signals   : 진입 여부 (진입 전 인스턴스)
+        close_condition / close_signals : 청산 여부 (진입 중 인스턴스)
+        open(side, initial_balance, open_price), close(close_size, close_price) : 진입, (부분) 청산할 때 한 번씩
+        update(close) : 진입 중인 bar마다 평가 금액 갱신. 기본 구현은 호출하지 않고 Backtesting의 position_book이
+                        모든 포지션을 한 번에 평가하며, override한 전략(has_update_hook)만 벡터 평가 후 bar마다 호출하고
+                        인스턴스의 balance, position_size 등을 position_book에 반영한다.
+                        update()를 override한 전략이 있으면 event_driven=True여도 bar 단위로 실행되고 (run_prepared),
+                        ensemble.EnsembleEvaluator에서는 사용할 수 없다.
+        청산 후 상태 초기화처럼 포지션 변화에만 반응하는 처리는 update() 대신 close()를 override (PartialCloseMovingAverageStrategy).
+    """
     def __init__(self
                  , asset
                  , strategy_name
@@ -65,6 +79,7 @@ class StrategyManager:
                 , 'enter_price': self.ENTER_PRICE
                 , 'realized_now_amount': self.realized_amount if (self.close_count == 1) else realized_amount
                 , 'realized_total_amount': self.realized_amount
+                , 'initial_balance': self.INITIAL_BALANCE # 진입 금액 (청산 완료 시 realized_total_amount - initial_balance가 거래 손익)
                 , 'leverage': self.LEVERAGE
                 , 'pnl(%)': ((close_price/self.ENTER_PRICE) - 1) * self.LEVERAGE if self.SIDE == Side.BUY \
                                 else ((self.ENTER_PRICE/close_price) - 1) * self.LEVERAGE 
@@ -74,6 +89,10 @@ class StrategyManager:
     def update(self, close):
         self.notional_position_size = close * self.position_size
         self.balance = self.update_balance(self.position_size, close)
+    
+    def has_update_hook(self) -> bool:
+        """update()를 override했는지. override한 전략은 진입 중 bar마다 update(close)가 호출된다"""
+        return type(self).update is not StrategyManager.update
         
 
     def calculate_realized_amount(self, close_size, close):
@@ -101,4 +120,22 @@ class StrategyManager:
             input: check_data (pd.DataFrame)
             output: Tuple[is_close, close_size, close_price]: (bool, float, float)
         """
-        pass
\ No newline at end of file
+        pass
+    
+    
+    def open_signals(self, data) -> Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        """(선택) 포지션 진입 조건의 벡터화 버전. 구현하지 않으면 open_condition을 bar 단위로 호출.
+            input: data (ColumnarFrame) - data['MA5'] 형태로 컬럼 전체 배열 접근
+            output: Tuple[is_open, side, enter_price]: (bool 배열, Side 배열, float 배열)
+                    각 bar에서 open_condition(check_data)와 동일한 값을 가져야 함.
+        """
+        return None
+    
+    def close_signals(self, data) -> Optional[Dict[str, np.ndarray]]:
+        """(선택) 포지션 청산 조건의 벡터화 버전. 구현하지 않으면 close_condition을 bar 단위로 호출.
+            input: data (ColumnarFrame)
+            output: {Side.BUY: bool 배열, Side.SELL: bool 배열}
+                    해당 side 포지션에서 close_condition이 청산을 반환하는 bar만 True.
+                    청산 수량, 가격은 신호가 발생한 bar에서 close_condition으로 결정.
+        """
+        return None
\ No newline at end of file
@@ -0,0 +1,159 @@
+"""Parameter sweep runner
+
+Backtesting 파라미터(strategy_list, max_strategy_cnt, ...) 조합을 ProcessPoolExecutor로 병렬 실행.
+가격 데이터는 shared memory에 한 번만 올려두고 worker는 이를 attach해서 사용 (task마다 pickle 하지 않음).
+datalist에 memory-map ColumnarFrame을 넣으면 worker는 shared memory 대신 같은 파일을 직접 map.
+
+    param_grid = {
+        'strategy_list': [strategy_list_a, strategy_list_b],
+        'max_strategy_cnt': [3, 5, 9],
+        'max_strategy_simultaneously_cnt': [1, 3],
+    }
+    df_result = run_sweep(param_grid, datalist, max_workers=4)
+"""
+import itertools
+import numpy as np
+import pandas as pd
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List
+
+from backtester import Backtesting
+from indicator_cache import IndicatorCache
+from columnar import ColumnarFrame
+from metrics import backtest_metrics
+
+
+# worker process에서 attach한 shared memory와 데이터 정보
+_WORKER_SHM = []
+_WORKER_DATA = []
+# worker process 단위 지표 캐시 - 같은 데이터, 같은 지표는 조합이 달라도 한 번만 계산
+_WORKER_CACHE = []
+
+
+def is_shareable(dtype) -> bool:
+    """shared memory 블록(int64 view)에 그대로 담을 수 있는 dtype (8byte float, int, uint, tz 없는 datetime64)"""
+    return isinstance(dtype, np.dtype) and dtype.kind in 'fiuM' and dtype.itemsize == 8
+
+
+def share_datalist(datalist: List[Dict[str, pd.DataFrame]]):
+    """datalist의 각 DataFrame을 shared memory 블록(컬럼 x bar, 8byte)으로 복사.
+    8byte가 아닌 컬럼(bool, int32, float32, object, tz가 있는 Date 등)은 블록에 넣지 않고 spec에 담아 pickle로 전달.
+
+    Returns:
+        (shm 리스트, worker에 전달할 spec 리스트)
+    """
+    shm_list, specs = [], []
+    for data_info in datalist:
+        for asset, df in data_info.items():
+            if isinstance(df, ColumnarFrame):
+                # memory-map frame은 파일 위치만 전달, worker가 같은 파일을 map
+                specs.append({'asset': asset, 'frame': df})
+                continue
+            
+            shared = [column for column in df.columns if is_shareable(df[column].dtype)]
+            dtypes = [df[column].dtype.str for column in shared]
+            shape = (len(shared), len(df))
+            
+            shm = shared_memory.SharedMemory(create=True, size=max(8 * shape[0] * shape[1], 1))
+            block = np.ndarray(shape, dtype=np.int64, buffer=shm.buf)
+            for i, column in enumerate(shared):
+                # 8byte 컬럼만 담으므로 int64 view로 저장하고 worker에서 원래 dtype으로 view
+                block[i] = df[column].to_numpy().view(np.int64)
+            
+            shm_list.append(shm)
+            specs.append({'asset': asset, 'name': shm.name, 'shape': shape, 'columns': list(df.columns), 'shared': shared, 'dtypes': dtypes
+                          , 'pickled': {column: df[column].array for column in df.columns if column not in shared}})
+    return shm_list, specs
+
+
+def attach_datalist(specs) -> List[Dict[str, pd.DataFrame]]:
+    """shared memory에서 datalist 복원. 컬럼은 shared memory의 view로 구성."""
+    datalist = []
+    for spec in specs:
+        if 'frame' in spec:
+            datalist.append({spec['asset']: spec['frame']})
+            continue
+        
+        shm = shared_memory.SharedMemory(name=spec['name'])
+        _WORKER_SHM.append(shm)
+        block = np.ndarray(spec['shape'], dtype=np.int64, buffer=shm.buf)
+        shared = {column: block[i].view(dtype) for i, (column, dtype) in enumerate(zip(spec['shared'], spec['dtypes']))}
+        # 원래 컬럼 순서대로 (pickle로 받은 컬럼은 dtype을 유지하는 pandas array)
+        datalist.append({spec['asset']: {column: shared[column] if column in shared else spec['pickled'][column] for column in spec['columns']}})
+    return datalist
+
+
+def _init_worker(specs, cache_dir):
+    _WORKER_DATA.extend(attach_datalist(specs))
+    _WORKER_CACHE.append(IndicatorCache(cache_dir=cache_dir))
+
+
+def evaluate(backtester: Backtesting) -> Dict[str, float]:
+    """백테스팅 결과 요약: 최종 자산, 거래 횟수, 최대 낙폭과 metrics.backtest_metrics의 성과 지표"""
+    summary = backtest_metrics(backtester)
+    result = {'final_balance': backtester.total_balance
+              , 'trade_count': summary.pop('trade_count')
+              , 'fill_count': summary.pop('fill_count')
+              , 'max_drawdown': summary.pop('max_drawdown')}
+    result.update({key: value for key, value in summary.items() if key not in ('initial_balance', 'final_balance')})
+    return result
+
+
+def _run_task(task):
+    combo_idx, params, event_driven = task
+    # ready_data가 컬럼을 추가하므로 task마다 shared memory view로 새 DataFrame 구성 (가격 배열은 복사하지 않음)
+    datalist = [{asset: columns if isinstance(columns, ColumnarFrame) else pd.DataFrame(columns, copy=False)
+                 for asset, columns in data_info.items()} for data_info in _WORKER_DATA]
+    
+    backtester = Backtesting(**params, indicator_cache=_WORKER_CACHE[0])
+    backtester.run(datalist, event_driven=event_driven, progress=False)
+    return combo_idx, evaluate(backtester)
+
+
+def make_param_combinations(param_grid: Dict[str, list]) -> List[Dict]:
+    """param_grid의 모든 조합 생성"""
+    keys = list(param_grid.keys())
+    return [dict(zip(keys, values)) for values in itertools.product(*(param_grid[key] for key in keys))]
+
+
+def run_sweep(param_grid: Dict[str, list]
+              , datalist: List[Dict[str, pd.DataFrame]]
+              , max_workers: int = None
+              , event_driven: bool = False
+              , chunksize: int = 1
+              , cache_dir: str = None) -> pd.DataFrame:
+    """param_grid의 모든 조합에 대해 Backtesting을 병렬 실행하고 결과 테이블 반환.
+
+    Args:
+        param_grid (dict): Backtesting 인자 이름 -> 후보 값 리스트. 'strategy_list'는 필수.
+        datalist (list): Backtesting.run에 전달하는 형태의 데이터 [{'BTCUSDT': pd.DataFrame}, ...]
+        max_workers (int, optional): worker process 개수. Defaults to None (cpu 개수).
+        event_driven (bool, optional): Backtesting.run의 event_driven 옵션. Defaults to False.
+        chunksize (int, optional): executor.map chunksize. Defaults to 1.
+        cache_dir (str, optional): worker끼리 공유하는 지표 디스크 캐시 경로. Defaults to None (worker별 메모리 캐시만 사용).
+
+    Returns:
+        pd.DataFrame: 조합별 파라미터와 evaluate 결과 (final_balance, trade_count, fill_count, max_drawdown, sharpe, ...).
+                      strategy_list는 param_grid['strategy_list']에서의 위치로 기록.
+    """
+    assert 'strategy_list' in param_grid, 'param_grid must contain strategy_list'
+    combinations = make_param_combinations(param_grid)
+    tasks = [(combo_idx, params, event_driven) for combo_idx, params in enumerate(combinations)]
+    
+    shm_list, specs = share_datalist(datalist)
+    try:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(specs, cache_dir)) as executor:
+            results = dict(executor.map(_run_task, tasks, chunksize=chunksize))
+    finally:
+        for shm in shm_list:
+            shm.close()
+            shm.unlink()
+    
+    rows = []
+    for combo_idx, params in enumerate(combinations):
+        row = {key: value for key, value in params.items() if key != 'strategy_list'}
+        row['strategy_list'] = next(i for i, candidate in enumerate(param_grid['strategy_list']) if candidate is params['strategy_list'])
+        row.update(results[combo_idx])
+        rows.append(row)
+    return pd.DataFrame(rows)
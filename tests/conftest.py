@@ -0,0 +1,5 @@
+import os
+import sys
+
+# repo root의 flat module(backtester, indicators, ...)과 data package를 import
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
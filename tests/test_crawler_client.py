@@ -0,0 +1,151 @@
+"""data/crawler.py RestClient, Crawler를 local aiohttp server로 확인"""
+import asyncio
+import sys
+
+import aiohttp
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from data.crawler import DEFAULT_USER_AGENT, Crawler, RestClient
+
+
+def make_app():
+    peers = set()
+
+    async def ok(request):
+        peers.add(request.transport.get_extra_info('peername'))
+        return web.json_response({'user_agent': request.headers.get('User-Agent')})
+
+    async def slow(request):
+        await asyncio.sleep(1)
+        return web.json_response({})
+
+    async def rate_limited(request):
+        return web.json_response({'code': -1003}, status=429)
+
+    app = web.Application()
+    app.router.add_get('/ok', ok)
+    app.router.add_get('/slow', slow)
+    app.router.add_get('/429', rate_limited)
+    return app, peers
+
+
+def run_with_server(test):
+    """local server를 띄우고 test(server, peers) 실행"""
+    async def main():
+        app, peers = make_app()
+        async with TestServer(app) as server:
+            await test(server, peers)
+    asyncio.run(main())
+
+
+def test_session_reuse():
+    async def test(server, peers):
+        async with RestClient(limit_per_host=2, user_agent='test-agent') as client:
+            session = client.sessions[0]
+            responses = await asyncio.gather(*[client.get(str(server.make_url('/ok'))) for _ in range(20)])
+            responses.append(await client.get(str(server.make_url('/ok'))))
+            assert client.sessions == [session]
+        assert all(response['user_agent'] == 'test-agent' for response in responses)
+        # 21개 요청이 host당 최대 2개 connection을 재사용
+        assert 1 <= len(peers) <= 2
+    run_with_server(test)
+
+
+def test_timeout():
+    async def test(server, peers):
+        async with RestClient(timeout=0.2, user_agent='test-agent') as client:
+            with pytest.raises(asyncio.TimeoutError):
+                await client.get(str(server.make_url('/slow')))
+        # 요청별 timeout이 client timeout보다 우선
+        async with RestClient(timeout=10, user_agent='test-agent') as client:
+            with pytest.raises(asyncio.TimeoutError):
+                await client.get(str(server.make_url('/slow')), timeout=0.2)
+    run_with_server(test)
+
+
+def test_raise_for_status():
+    async def test(server, peers):
+        async with RestClient(user_agent='test-agent') as client:
+            with pytest.raises(aiohttp.ClientResponseError) as error:
+                await client.get(str(server.make_url('/429')))
+        assert error.value.status == 429
+    run_with_server(test)
+
+
+def test_close():
+    async def test(server, peers):
+        client = RestClient(ip_address=['0.0.0.0', '0.0.0.0'], user_agent='test-agent')
+        assert client.closed
+        await client.get(str(server.make_url('/ok')))
+        sessions = list(client.sessions)
+        assert len(sessions) == 2 and not client.closed
+
+        await client.close()
+        assert client.closed and all(session.closed for session in sessions)
+
+        # close 후 다시 요청하면 session을 새로 만듦
+        await client.get(str(server.make_url('/ok')))
+        assert not client.closed and client.sessions[0] not in sessions
+        await client.close()
+    run_with_server(test)
+
+
+def test_aexit_closes_on_error():
+    async def test(server, peers):
+        client = RestClient(user_agent='test-agent')
+        with pytest.raises(aiohttp.ClientResponseError):
+            async with client:
+                sessions = list(client.sessions)
+                await client.get(str(server.make_url('/429')))
+        assert client.closed and all(session.closed for session in sessions)
+    run_with_server(test)
+
+
+def test_user_agent_fallback(monkeypatch):
+    # fake_useragent를 import할 수 없으면 DEFAULT_USER_AGENT 사용
+    monkeypatch.setitem(sys.modules, 'fake_useragent', None)
+    assert RestClient().user_agent == DEFAULT_USER_AGENT
+
+
+def klines_app(failures, status=429):
+    """처음 failures번은 status로 실패하고 이후 2 page(3개, 1개)를 주는 klines stub"""
+    calls = []
+    candles = [[open_ms, '1', '1', '1', '1', '1', open_ms + 999, '0', 1, '0', '0', '0'] for open_ms in range(0, 4000, 1000)]
+
+    async def klines(request):
+        calls.append(int(request.query['startTime']))
+        if len(calls) <= failures:
+            return web.json_response({'code': -1003}, status=status)
+        start, limit = int(request.query['startTime']), int(request.query['limit'])
+        return web.json_response([candle for candle in candles if candle[0] >= start][:limit])
+
+    app = web.Application()
+    app.router.add_get('/klines', klines)
+    return app, calls
+
+
+def run_candle_all(app, **kwargs):
+    async def main():
+        async with TestServer(app) as server:
+            async with Crawler(RestClient(user_agent='test-agent')) as crawler:
+                return await crawler.get_coin_candle_all(str(server.make_url('/klines')), 'BTCUSDT', '1s', startTime=0, limit=3
+                                                         , sleep=0, backoff=0.01, **kwargs)
+    return asyncio.run(main())
+
+
+def test_candle_all_retries_failed_page():
+    # 429, 5xx는 재시도해서 빈 page(데이터 끝)와 구분
+    app, calls = klines_app(failures=2, status=503)
+    df = run_candle_all(app)
+    assert df['Open time'].tolist() == [0, 1000, 2000, 3000]
+    assert calls == [0, 0, 0, 3000, 4000]
+
+
+def test_candle_all_raises_after_retries():
+    # 재시도가 모두 실패하면 일부 데이터를 반환하지 않고 예외를 올림
+    app, calls = klines_app(failures=10)
+    with pytest.raises(aiohttp.ClientResponseError) as error:
+        run_candle_all(app, max_retries=2)
+    assert error.value.status == 429 and calls == [0, 0, 0]
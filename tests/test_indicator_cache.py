@@ -0,0 +1,48 @@
+"""indicator_cache.IndicatorCache와 frame이 메모리를 공유하지 않는지 확인"""
+import numpy as np
+import pytest
+
+from backtester import Backtesting
+from indicator_cache import IndicatorCache, fingerprint
+from preprocessor import Preprocessor
+from strategy.moving_average import SimpleMovingAverageStrategy
+from tests.test_update_hook import random_walk, strategy_list
+
+
+def test_cached_values_are_read_only_copies():
+    df = random_walk(200)
+    cache = IndicatorCache()
+    preprocessor = Preprocessor(cache=cache)
+    key = ('BTCUSDT', '1h', fingerprint(df))
+
+    computed = preprocessor.make_column('MA20', df, key=key)
+    expected = computed.to_numpy().copy()
+    # 계산한 Series를 수정해도 캐시는 그대로
+    computed.iloc[-1] = -1.0
+    cached = preprocessor.make_column('MA20', df, key=key).to_numpy()
+    np.testing.assert_array_equal(cached, expected)
+    with pytest.raises(ValueError):
+        cached[-1] = -1.0
+
+
+def test_runs_sharing_cache_do_not_share_writable_buffers():
+    datalist = [{'BTCUSDT': random_walk(500)}]
+    cache = IndicatorCache()
+    first = Backtesting(strategy_list(SimpleMovingAverageStrategy), indicator_cache=cache)
+    first.run(datalist, progress=False)
+    assert len(cache.memory) and not any(cached.flags.writeable for cached in cache.memory.values())
+
+    for _ in range(2):
+        frame = Backtesting(strategy_list(SimpleMovingAverageStrategy), indicator_cache=cache).ready_data(datalist)[0]['BTCUSDT']
+        for column in ['MA5', 'MA20']:
+            values = frame[column]
+            # frame 컬럼은 캐시와 메모리를 공유하지 않거나, 공유한다면 수정할 수 없음
+            if values.flags.writeable:
+                assert not any(np.shares_memory(values, cached) for cached in cache.memory.values())
+            else:
+                with pytest.raises(ValueError):
+                    values[-1] = 0.0
+
+    second = Backtesting(strategy_list(SimpleMovingAverageStrategy), indicator_cache=cache)
+    second.run(datalist, progress=False)
+    np.testing.assert_array_equal(second.backtesting_info['total_balance'], first.backtesting_info['total_balance'])
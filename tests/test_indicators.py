@@ -0,0 +1,53 @@
+"""indicators.py kernel을 pandas/ta 결과와 비교"""
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import pytest
+import ta
+from numpy.lib.stride_tricks import sliding_window_view
+
+import indicators
+
+
+def random_walk(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return 30000 * np.exp(np.cumsum(rng.normal(0, 0.003, n)))
+
+
+@pytest.mark.parametrize('window', [1, 2, 20, 64, 65, 200, 4096, 4097, 5000])
+def test_rolling_std_matches_numpy(window):
+    # block 경계(ROLLING_BLOCK_SIZE // window, 4096)를 여러 번 지나는 길이
+    close = random_walk(9000)
+    expected = sliding_window_view(close, window).std(axis=1)
+    result = indicators.rolling_std(close, window)
+    assert np.isnan(result[:window - 1]).all()
+    np.testing.assert_allclose(result[window - 1:], expected, rtol=1e-7, atol=1e-6)
+
+
+def test_rolling_std_short_input():
+    assert np.isnan(indicators.rolling_std(np.arange(5.0), 10)).all()
+    np.testing.assert_allclose(indicators.rolling_std(np.arange(5.0), 5)[-1], np.arange(5.0).std())
+
+
+def test_rolling_std_large_window_memory():
+    # n x window 배열을 만들면 2e5 * 1e4 * 8 bytes = 16 GB
+    n, window = 200_000, 10_000
+    close = random_walk(n)
+    tracemalloc.start()
+    try:
+        result = indicators.rolling_std(close, window)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert peak < 4 * n * 8
+    expected = pd.Series(close).rolling(window).std(ddof=0).to_numpy()
+    np.testing.assert_allclose(result[window - 1:], expected[window - 1:], rtol=1e-7)
+
+
+def test_bollinger_bands_matches_ta():
+    close = random_walk(5000, seed=1)
+    bands = ta.volatility.BollingerBands(pd.Series(close), window=20, window_dev=2)
+    upper, lower = indicators.bollinger_bands(close, 20, 2)
+    np.testing.assert_allclose(upper[19:], bands.bollinger_hband().to_numpy()[19:], rtol=1e-9)
+    np.testing.assert_allclose(lower[19:], bands.bollinger_lband().to_numpy()[19:], rtol=1e-9)
@@ -0,0 +1,39 @@
+"""data/loader.py의 csv -> store 변환"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from data.loader import load_price_data
+from data.store import PriceStore
+
+HOUR_MS = 60 * 60 * 1000
+
+
+def write_csv(path, close):
+    open_time = np.arange(len(close), dtype=np.int64) * HOUR_MS + pd.Timestamp('2024-01-01').value // 10**6
+    pd.DataFrame({'Open time': open_time, 'Open': close, 'High': close, 'Low': close, 'Close': close, 'Volume': 1.0
+                  , 'Close time': open_time + HOUR_MS - 1}).to_csv(path, index=False)
+
+
+def load(timeframe='1h'):
+    return load_price_data(market='crypto', symbol='btc', timeframe=timeframe, start_date='2023-01-01', end_date='2025-01-01', save_name='btc.csv')
+
+
+def test_store_is_converted_again_when_csv_changes(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('data/crypto/1h')
+    csv_path = 'data/crypto/1h/btc.csv'
+    write_csv(csv_path, np.arange(48, dtype=np.float64))
+    np.testing.assert_array_equal(load()['Close'], np.arange(48))
+    assert PriceStore('data/crypto/1h/btc_store').matches_csv(csv_path)
+
+    # 같은 길이로 값만 바뀐 csv (다시 crawling, 수정)
+    write_csv(csv_path, np.arange(48, dtype=np.float64) + 1000)
+    os.utime(csv_path, ns=(0, os.stat(csv_path).st_mtime_ns + 10**9))
+    np.testing.assert_array_equal(load()['Close'], np.arange(48) + 1000)
+    # resample한 store도 다시 계산
+    np.testing.assert_array_equal(load('4h')['Close'], np.arange(3, 48, 4) + 1000)
+
+    write_csv(csv_path, np.arange(96, dtype=np.float64))
+    assert len(load()) == 96 and len(load('4h')) == 24
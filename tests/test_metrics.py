@@ -0,0 +1,44 @@
+"""metrics.py의 max_drawdown 초기 자산, 기록 간격에 따른 연율화"""
+import numpy as np
+import pandas as pd
+
+from backtester import Backtesting
+from metrics import backtest_metrics, max_drawdown, periods_per_year, score_curves
+from strategy.moving_average import SimpleMovingAverageStrategy
+from tests.test_update_hook import random_walk, strategy_list
+
+
+def hourly_dates(hours):
+    return pd.Timestamp('2024-01-01') + pd.to_timedelta(np.asarray(hours), unit='h')
+
+
+def test_max_drawdown_includes_initial_balance():
+    # 첫 기록에서 이미 손실
+    assert max_drawdown([90.0, 95.0, 100.0]) == 0.0
+    assert np.isclose(max_drawdown([90.0, 95.0, 100.0], initial_balance=100.0), 0.1)
+    np.testing.assert_allclose(max_drawdown([[90.0, 100.0], [100.0, 80.0]], initial_balance=[100.0, 100.0]), [0.1, 0.2])
+    assert max_drawdown([], initial_balance=100.0) == 0.0
+    np.testing.assert_allclose(score_curves([[90.0, 100.0]], 365, initial_balance=100.0)['max_drawdown'], [0.1])
+
+
+def test_periods_per_year_from_dates():
+    assert np.isclose(periods_per_year(hourly_dates(np.arange(100))), 365 * 24)
+    # record_every=24: 마지막 bar는 항상 기록되어 마지막 간격만 짧음
+    assert np.isclose(periods_per_year(hourly_dates(np.r_[np.arange(0, 240, 24), 230])), 365 * 24 * 10 / 230)
+    # 빠진 bar가 조금 있어도 경과 시간 기준으로 계산
+    assert np.isclose(periods_per_year(hourly_dates(np.r_[np.arange(50), np.arange(52, 100)])), 365 * 24 * 97 / 99)
+    # 진입/청산 bar만 기록한 불규칙한 간격
+    assert np.isnan(periods_per_year(hourly_dates([0, 3, 4, 20, 21, 50, 51, 90])))
+    assert np.isnan(periods_per_year(hourly_dates([0])))
+
+
+def test_sharpe_is_nan_for_irregular_recording():
+    datalist = [{'BTCUSDT': random_walk(2000)}]
+    summaries = {}
+    for name, kwargs in {'every': {}, 'daily': {'record_every': 24}, 'events': {'record_events_only': True}}.items():
+        backtester = Backtesting(strategy_list(SimpleMovingAverageStrategy), **kwargs)
+        backtester.run(datalist, progress=False)
+        summaries[name] = backtest_metrics(backtester)
+    assert np.isfinite(summaries['every']['sharpe']) and np.isfinite(summaries['daily']['sharpe'])
+    assert np.isnan(summaries['events']['sharpe']) and np.isnan(summaries['events']['sortino'])
+    assert summaries['every']['max_drawdown'] >= summaries['daily']['max_drawdown']
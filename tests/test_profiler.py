@@ -0,0 +1,54 @@
+"""profiler.Profiler on/off 결과 비교"""
+import numpy as np
+
+import backtester as backtester_module
+from backtester import Backtesting
+from profiler import Hook, Profiler
+from strategy.moving_average import PartialCloseMovingAverageStrategy
+from tests.test_update_hook import CountingStrategy, random_walk, strategy_list
+
+
+class CountBars(Hook):
+    def __init__(self):
+        self.bars = 0
+
+    def on_bar(self, backtester, didx):
+        self.bars += 1
+
+
+def run(profiler):
+    backtester = Backtesting(strategy_list(PartialCloseMovingAverageStrategy, 3), max_strategy_cnt=6, total_balance=1e6, profiler=profiler)
+    backtester.run([{'BTCUSDT': random_walk(3000)}], progress=False)
+    return backtester
+
+
+def test_timing_disabled_skips_phase_timing(monkeypatch):
+    calls = []
+    monkeypatch.setattr(backtester_module, 'perf_counter', lambda: calls.append(1) or 0.0)
+    hook = CountBars()
+    backtester = run(Profiler(hooks=[hook], timing=False))
+    assert calls == [] and not backtester.profiler.phases
+    assert hook.bars == backtester.profiler.bars == len(backtester.backtesting_info)
+
+
+def test_profiler_does_not_change_results():
+    reference = run(None)
+    for profiler in [Profiler(timing=False), Profiler()]:
+        backtester = run(profiler)
+        np.testing.assert_array_equal(backtester.backtesting_info['total_balance'], reference.backtesting_info['total_balance'])
+    assert set(profiler.phases) >= {'ready_data', 'ready_signals', 'close', 'open', 'mark_to_market', 'record'}
+
+
+def test_strategy_timing_covers_signals_and_update():
+    profiler = Profiler()
+    backtester = Backtesting(strategy_list(CountingStrategy, 2), max_strategy_cnt=4, total_balance=1e6, profiler=profiler)
+    backtester.run([{'BTCUSDT': random_walk(1000)}], progress=False)
+    calls = {name: stats[0] for name, stats in profiler.strategies.items()}
+    # 같은 신호는 한 번만 계산
+    assert calls['CountingStrategy.open_signals'] == calls['CountingStrategy.close_signals'] == 2
+    assert calls['CountingStrategy.update'] > 0
+
+    profiler = Profiler()
+    run(profiler)
+    assert 'PartialCloseMovingAverageStrategy.update' not in profiler.strategies
+    assert profiler.strategies['PartialCloseMovingAverageStrategy.open_signals'][0] > 0
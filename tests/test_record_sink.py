@@ -0,0 +1,47 @@
+"""run_stream의 record_sink (기록을 sink로 넘기고 recorder 배열 크기 고정)"""
+import asyncio
+from collections import defaultdict
+
+import pandas as pd
+
+from backtester import Backtesting
+from data.feed import iter_frame_bars
+from recorder import STREAM_CAPACITY
+from strategy.moving_average import PartialCloseMovingAverageStrategy
+from tests.test_update_hook import random_walk, strategy_list
+
+N_BAR = 3 * STREAM_CAPACITY + 100
+
+
+def make_backtester(**kwargs):
+    return Backtesting(strategy_list(PartialCloseMovingAverageStrategy, 3), max_strategy_cnt=6, total_balance=1e6, **kwargs)
+
+
+def test_sink_receives_same_records_with_fixed_memory():
+    datalist = [{'BTCUSDT': random_walk(N_BAR)}]
+    reference = make_backtester()
+    reference.run_stream(iter_frame_bars(datalist), progress=False)
+
+    chunks = defaultdict(list)
+    backtester = make_backtester(record_sink=lambda name, frame: chunks[name].append(frame))
+    backtester.run_stream(iter_frame_bars(datalist), progress=False)
+
+    assert len(chunks['backtesting_info']) > 1 and len(chunks['strategy_clear_info']) > 1
+    assert backtester.balance_recorder.capacity == STREAM_CAPACITY
+    assert backtester.fill_recorder.capacity == 64
+    assert len(backtester.backtesting_info) == 0 and len(backtester.strategy_clear_info) == 0
+    for name in ['backtesting_info', 'strategy_clear_info']:
+        pd.testing.assert_frame_equal(pd.concat(chunks[name], ignore_index=True), getattr(reference, name))
+
+
+def test_arun_stream_sink_with_record_every():
+    datalist = [{'BTCUSDT': random_walk(N_BAR)}]
+    chunks = defaultdict(list)
+    backtester = make_backtester(record_every=STREAM_CAPACITY, record_sink=lambda name, frame: chunks[name].append(frame))
+    asyncio.run(backtester.arun_stream(iter_frame_bars(datalist), progress=False))
+
+    reference = make_backtester(record_every=STREAM_CAPACITY)
+    reference.run_stream(iter_frame_bars(datalist), progress=False)
+    info = pd.concat(chunks['backtesting_info'], ignore_index=True)
+    pd.testing.assert_frame_equal(info, reference.backtesting_info)
+    assert info['Date'].is_unique
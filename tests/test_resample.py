@@ -0,0 +1,73 @@
+"""data/resample.py의 끝나지 않은 마지막 구간 처리"""
+import numpy as np
+import pandas as pd
+
+from data.resample import resample_ohlcv, resample_store
+from data.store import PriceStore
+
+HOUR_MS = 60 * 60 * 1000
+
+
+def hourly_columns(length):
+    # Date는 bar 종료 시각. 2024-01-01 00:00 시작 1h bar
+    dates = pd.Timestamp('2024-01-01').value // 10**6 + (np.arange(length, dtype=np.int64) + 1) * HOUR_MS
+    close = np.arange(length, dtype=np.float64)
+    return {'Date': dates, 'Open': close, 'High': close + 0.5, 'Low': close - 0.5, 'Close': close, 'Volume': np.ones(length)}
+
+
+def test_exact_boundary_keeps_last_bar():
+    resampled = resample_ohlcv(hourly_columns(8), '4h')
+    np.testing.assert_array_equal(resampled['Close'], [3, 7])
+    np.testing.assert_array_equal(resampled['Volume'], [4, 4])
+    assert resampled['Date'][-1] == hourly_columns(8)['Date'][-1]
+    assert not resample_ohlcv(hourly_columns(8), '4h', drop_partial=False)['Partial'].any()
+
+
+def test_partial_last_bucket_is_dropped_or_flagged():
+    resampled = resample_ohlcv(hourly_columns(10), '4h')
+    np.testing.assert_array_equal(resampled['Date'], resample_ohlcv(hourly_columns(8), '4h')['Date'])
+    np.testing.assert_array_equal(resampled['High'], [3.5, 7.5])
+
+    flagged = resample_ohlcv(hourly_columns(10), '4h', drop_partial=False)
+    np.testing.assert_array_equal(flagged['Partial'], [False, False, True])
+    np.testing.assert_array_equal(flagged['Close'], [3, 7, 9])
+    np.testing.assert_array_equal(flagged['Volume'], [4, 4, 2])
+
+    # 한 구간도 끝나지 않은 데이터
+    assert len(resample_ohlcv(hourly_columns(3), '4h')['Date']) == 0
+    np.testing.assert_array_equal(resample_ohlcv(hourly_columns(3), '4h', drop_partial=False)['Partial'], [True])
+
+
+def test_partial_first_bucket_is_dropped_or_flagged():
+    # 02:00 시작 (첫 4h 구간은 02:00 ~ 04:00 두 bar만 있음)
+    columns = {column: values[2:] for column, values in hourly_columns(12).items()}
+    resampled = resample_ohlcv(columns, '4h')
+    np.testing.assert_array_equal(resampled['Open'], [4, 8])
+    np.testing.assert_array_equal(resampled['Low'], [3.5, 7.5])
+    np.testing.assert_array_equal(resampled['Volume'], [4, 4])
+
+    flagged = resample_ohlcv(columns, '4h', drop_partial=False)
+    np.testing.assert_array_equal(flagged['Partial'], [True, False, False])
+    np.testing.assert_array_equal(flagged['Open'], [2, 4, 8])
+    np.testing.assert_array_equal(flagged['Volume'], [2, 4, 4])
+
+    # 처음과 마지막이 같은 구간, bar 길이를 직접 준 경우
+    both = {column: values[1:3] for column, values in hourly_columns(12).items()}
+    assert len(resample_ohlcv(both, '4h')['Date']) == 0
+    np.testing.assert_array_equal(resample_ohlcv(both, '4h', drop_partial=False)['Partial'], [True])
+    # bar가 하나면 bar 길이를 알 수 없으므로 base_ms를 줄 때만 처음 구간 확인
+    single = {column: values[3:4] for column, values in hourly_columns(12).items()}
+    assert len(resample_ohlcv(single, '4h')['Date']) == 1
+    assert len(resample_ohlcv(single, '4h', base_ms=HOUR_MS)['Date']) == 0
+
+
+def test_resample_store_adds_bucket_once_it_is_complete(tmp_path):
+    source = PriceStore(str(tmp_path / 'btc_store'))
+    columns = hourly_columns(12)
+    source.write({column: values[:10] for column, values in columns.items()})
+    assert len(resample_store(source, '4h', str(tmp_path / 'btc_4h'))) == 2
+
+    source.append({column: values[10:] for column, values in columns.items()})
+    store = resample_store(source, '4h', str(tmp_path / 'btc_4h'))
+    np.testing.assert_array_equal(store.column('Close'), [3, 7, 11])
+    np.testing.assert_array_equal(store.column('Open'), [0, 4, 8])
@@ -0,0 +1,168 @@
+"""data/store.py coverage와 data/loader.py의 missing range crawling을 local Binance klines stub으로 확인"""
+import asyncio
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+from aiohttp import web
+
+from data.crawler import Crawler, TokenBucket
+from data.loader import find_missing_ranges, update_store
+from data.store import PriceStore, to_epoch_ms
+
+HOUR_MS = 60 * 60 * 1000
+# stub 거래소의 상장 시각 (이전 open time에는 candle이 없음)
+LISTING_MS = to_epoch_ms('2023-12-01')
+
+
+def candle(open_ms):
+    price = 100.0 + (open_ms // HOUR_MS) % 1000
+    return [open_ms, str(price), str(price + 1), str(price - 1), str(price + 0.5), '10.0', open_ms + HOUR_MS - 1, '0', 1, '0', '0', '0']
+
+
+class KlinesStub:
+    """/fapi/v1/klines (1h만 지원). 요청한 [startTime, endTime] 구간을 requests에 기록"""
+    def __init__(self):
+        self.requests = []
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+
+    async def klines(self, request):
+        assert request.query['interval'] == '1h'
+        start, limit = int(request.query['startTime']), int(request.query['limit'])
+        end = int(request.query.get('endTime', start + limit * HOUR_MS))
+        self.requests.append((start, end))
+        first = max(-(-start // HOUR_MS) * HOUR_MS, LISTING_MS)
+        return web.json_response([candle(open_ms) for open_ms in range(first, end + 1, HOUR_MS)][:limit])
+
+    async def start_server(self):
+        app = web.Application()
+        app.router.add_get('/fapi/v1/klines', self.klines)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        await site.start()
+        return site._server.sockets[0].getsockname()[1]
+
+    def start(self):
+        self.thread.start()
+        port = asyncio.run_coroutine_threadsafe(self.start_server(), self.loop).result()
+        self.url = f'http://127.0.0.1:{port}/fapi/v1/klines'
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self.runner.cleanup(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+
+@pytest.fixture
+def stub():
+    stub = KlinesStub()
+    stub.start()
+    yield stub
+    stub.stop()
+
+
+def expected_dates(start_date, end_date):
+    """Date(bar 종료 시각)가 [start_date, end_date]이고 상장 이후인 bar"""
+    first = max(to_epoch_ms(start_date, ceil=True), LISTING_MS + HOUR_MS)
+    first = -(-first // HOUR_MS) * HOUR_MS
+    return np.arange(first, to_epoch_ms(end_date) + 1, HOUR_MS)
+
+
+def test_coverage_of_empty_csv(tmp_path):
+    csv_path = tmp_path / 'btc.csv'
+    pd.DataFrame(columns=['Open time', 'Open', 'High', 'Low', 'Close', 'Volume', 'Close time']).to_csv(csv_path, index=False)
+    store = PriceStore.from_csv(str(csv_path))
+    assert len(store) == 0 and store.coverage() is None
+    assert find_missing_ranges(store, '1h', 0, HOUR_MS) == [(0, HOUR_MS)]
+
+
+def test_update_store_crawls_only_missing_ranges(tmp_path, stub):
+    store = PriceStore(str(tmp_path / 'btc_store'))
+    update_store(store, 'btc', '1h', '2024-01-10', '2024-01-20', url=stub.url)
+    np.testing.assert_array_equal(store.column('Date'), expected_dates('2024-01-10', '2024-01-20'))
+    assert store.coverage() == (to_epoch_ms('2024-01-10'), to_epoch_ms('2024-01-20'))
+
+    # 같은 구간은 다시 요청하지 않음
+    stub.requests.clear()
+    update_store(PriceStore(store.path), 'btc', '1h', '2024-01-12', '2024-01-18', url=stub.url)
+    assert stub.requests == []
+
+    # 앞쪽(merge), 뒤쪽(append) 구간만 요청
+    update_store(store, 'btc', '1h', '2024-01-05', '2024-01-25', url=stub.url)
+    assert all(end < to_epoch_ms('2024-01-10') or start >= to_epoch_ms('2024-01-20') - HOUR_MS for start, end in stub.requests)
+    df = store.load('2024-01-05', '2024-01-25')
+    np.testing.assert_array_equal(df['Date'].to_numpy().astype('datetime64[ms]').view(np.int64), expected_dates('2024-01-05', '2024-01-25'))
+    expected = [float(candle(date - HOUR_MS)[4]) for date in expected_dates('2024-01-05', '2024-01-25')]
+    np.testing.assert_array_equal(df['Close'].to_numpy(), expected)
+
+
+def test_update_store_records_range_before_listing(tmp_path, stub):
+    # 상장 전 구간은 데이터가 없어도 확인한 구간으로 기록되어 다시 요청하지 않음
+    store = PriceStore(str(tmp_path / 'btc_store'))
+    update_store(store, 'btc', '1h', '2023-11-20', '2023-12-05', url=stub.url)
+    assert store.column('Date')[0] == LISTING_MS + HOUR_MS
+    stub.requests.clear()
+    update_store(store, 'btc', '1h', '2023-11-20', '2023-12-03', url=stub.url)
+    assert stub.requests == []
+
+
+def test_stream_append_extends_coverage(tmp_path, stub):
+    # crawler main과 같이 stream_coin_candle_range로 append한 구간도 coverage에 포함
+    store = PriceStore(str(tmp_path / 'btc_store'))
+    update_store(store, 'btc', '1h', '2024-01-10', '2024-01-12', url=stub.url)
+
+    async def stream():
+        crawler = Crawler()
+        await crawler.stream_coin_candle_range(url=stub.url, symbol='BTCUSDT', interval='1h', store=store
+                                               , startTime='2024-01-10', endTime=to_epoch_ms('2024-01-15') - HOUR_MS
+                                               , rate_limiter=TokenBucket(), flush_pages=1, limit=24)
+    asyncio.run(stream())
+    assert store.last_date() == to_epoch_ms('2024-01-15')
+    assert store.coverage() == (to_epoch_ms('2024-01-10'), to_epoch_ms('2024-01-15'))
+    assert find_missing_ranges(PriceStore(store.path), '1h', to_epoch_ms('2024-01-10'), to_epoch_ms('2024-01-15')) == []
+
+
+def hourly_columns(hours, close=1.0):
+    dates = np.asarray(hours, dtype=np.int64) * HOUR_MS
+    return {'Date': dates, **{column: np.full(len(dates), close) for column in ['Open', 'High', 'Low', 'Close', 'Volume']}}
+
+
+def written_store(tmp_path, hours):
+    store = PriceStore(str(tmp_path / 'btc_store'))
+    columns = hourly_columns(hours)
+    store.write(columns, coverage=[int(columns['Date'][0]), int(columns['Date'][-1])])
+    return store
+
+
+def test_missing_ranges_at_both_edges_and_gaps(tmp_path):
+    store = written_store(tmp_path, [10, 11, 12, 15, 16, 20])
+    # 앞쪽, 뒤쪽 구간
+    assert find_missing_ranges(store, '1h', 5 * HOUR_MS, 25 * HOUR_MS) == [(5 * HOUR_MS, 10 * HOUR_MS - 1), (20 * HOUR_MS + 1, 25 * HOUR_MS)]
+    # coverage 안쪽이면 요청하지 않음, 경계가 같으면 빈 구간 없음
+    assert find_missing_ranges(store, '1h', 10 * HOUR_MS, 20 * HOUR_MS) == []
+    assert find_missing_ranges(store, '1h', 12 * HOUR_MS, 14 * HOUR_MS) == []
+    # 중간에 빠진 bar는 fill_gaps=True일 때만, 요청 구간과 겹치는 gap만
+    assert find_missing_ranges(store, '1h', 10 * HOUR_MS, 20 * HOUR_MS, fill_gaps=True) == [(12 * HOUR_MS + 1, 15 * HOUR_MS - 1), (16 * HOUR_MS + 1, 20 * HOUR_MS - 1)]
+    assert find_missing_ranges(store, '1h', 17 * HOUR_MS, 22 * HOUR_MS, fill_gaps=True) == [(16 * HOUR_MS + 1, 20 * HOUR_MS - 1), (20 * HOUR_MS + 1, 22 * HOUR_MS)]
+
+
+def test_merge_with_overlap_keeps_new_data_and_extends_coverage(tmp_path):
+    store = written_store(tmp_path, range(10, 20))
+    store.merge(hourly_columns(range(5, 13), close=2.0))
+    np.testing.assert_array_equal(store.column('Date'), np.arange(5, 20) * HOUR_MS)
+    np.testing.assert_array_equal(store.column('Close'), [2.0] * 8 + [1.0] * 7)
+    assert store.coverage() == (5 * HOUR_MS, 19 * HOUR_MS)
+
+    # 빈 데이터는 아무것도 바꾸지 않음
+    store.merge(hourly_columns([]))
+    assert len(store) == 15 and store.coverage() == (5 * HOUR_MS, 19 * HOUR_MS)
+
+
+def test_append_extends_coverage(tmp_path):
+    store = written_store(tmp_path, range(10, 20))
+    store.append(hourly_columns(range(20, 25)))
+    assert store.coverage() == (10 * HOUR_MS, 24 * HOUR_MS)
+    assert find_missing_ranges(PriceStore(store.path), '1h', 10 * HOUR_MS, 24 * HOUR_MS) == []
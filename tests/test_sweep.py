@@ -0,0 +1,31 @@
+"""sweep.share_datalist / attach_datalist의 dtype별 전달"""
+import pickle
+
+import numpy as np
+import pandas as pd
+
+import sweep
+from sweep import attach_datalist, share_datalist
+
+
+def test_share_datalist_keeps_every_dtype():
+    df = pd.DataFrame({'Date': pd.date_range('2024-01-01', periods=5, freq='h', tz='UTC')
+                       , 'Open': np.arange(5, dtype=np.float64)
+                       , 'Close': np.arange(5, dtype=np.float32)
+                       , 'Volume': np.arange(5, dtype=np.int32)
+                       , 'Count': np.arange(5, dtype=np.int64)
+                       , 'Flag': [True, False, True, False, True]
+                       , 'Note': list('abcde')})
+    shm_list, specs = share_datalist([{'BTCUSDT': df}])
+    try:
+        # worker에는 spec이 pickle로 전달됨
+        spec = pickle.loads(pickle.dumps(specs))[0]
+        assert spec['shared'] == ['Open', 'Count']
+        restored = pd.DataFrame(attach_datalist([spec])[0]['BTCUSDT'], copy=False)
+        pd.testing.assert_frame_equal(restored, df)
+    finally:
+        for shm in sweep._WORKER_SHM + shm_list:
+            shm.close()
+        sweep._WORKER_SHM.clear()
+        for shm in shm_list:
+            shm.unlink()
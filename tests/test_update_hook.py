@@ -0,0 +1,68 @@
+"""StrategyManager.update()를 override한 전략이 진입 중 bar마다 호출되는지 확인"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from backtester import Backtesting
+from ensemble import EnsembleEvaluator
+from strategy.moving_average import SimpleMovingAverageStrategy
+
+
+def random_walk(n_bar, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, n_bar)))
+    return pd.DataFrame({'Date': pd.Timestamp('2024-01-01') + pd.to_timedelta(np.arange(1, n_bar + 1), unit='h')
+                         , 'Open': close, 'High': close, 'Low': close, 'Close': close, 'Volume': 1.0})
+
+
+class CountingStrategy(SimpleMovingAverageStrategy):
+    """update 호출을 기록 (평가 금액은 기본 구현과 같음)"""
+    calls = []
+
+    def update(self, close):
+        super().update(close)
+        CountingStrategy.calls.append((id(self), close))
+
+
+class HaircutStrategy(SimpleMovingAverageStrategy):
+    """평가 금액을 10% 낮게 보는 전략"""
+    def update(self, close):
+        super().update(close)
+        self.balance *= 0.9
+
+
+def strategy_list(strategy_object, count=2):
+    return [{'object': strategy_object, 'parameter': {'asset': 'BTCUSDT', 'strategy_name': f'sma{i}', 'trading_fee': 0.0005}}
+            for i in range(count)]
+
+
+def run(strategy_object, event_driven=False):
+    backtester = Backtesting(strategy_list(strategy_object), max_strategy_cnt=4, total_balance=1e6)
+    backtester.run([{'BTCUSDT': random_walk(2000)}], event_driven=event_driven, progress=False)
+    return backtester
+
+
+def test_default_update_is_not_a_hook():
+    assert not SimpleMovingAverageStrategy('BTCUSDT', 'sma').has_update_hook()
+    assert CountingStrategy('BTCUSDT', 'sma').has_update_hook()
+
+
+@pytest.mark.parametrize('event_driven', [False, True])
+def test_overridden_update_is_called_every_bar(event_driven):
+    CountingStrategy.calls = []
+    backtester = run(CountingStrategy, event_driven=event_driven)
+    reference = run(SimpleMovingAverageStrategy)
+    # 평가 금액이 기본 구현과 같으면 결과도 같음
+    np.testing.assert_array_equal(backtester.backtesting_info['total_balance'], reference.backtesting_info['total_balance'])
+    # 진입 중인 포지션 수의 합만큼 호출 (event_driven이어도 bar 단위로 실행)
+    assert len(CountingStrategy.calls) == backtester.backtesting_info['entered_strategy_cnt'].sum()
+
+
+def test_update_result_is_used_for_balance():
+    backtester, reference = run(HaircutStrategy), run(SimpleMovingAverageStrategy)
+    np.testing.assert_allclose(backtester.backtesting_info['enter_balacne'], reference.backtesting_info['enter_balacne'] * 0.9)
+
+
+def test_ensemble_rejects_update_hook():
+    with pytest.raises(ValueError, match='update'):
+        EnsembleEvaluator(strategy_list(CountingStrategy), [{'BTCUSDT': random_walk(500)}])
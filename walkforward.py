@@ -0,0 +1,158 @@
+"""Walk-forward / rolling-window evaluation
+
+지표는 전체 기간에 대해 한 번만 계산하고 (Backtesting.ready_data), 각 window는 준비된 ColumnarFrame의 slice(view)로
+Backtesting.run_prepared를 실행한다. window마다 데이터를 다시 불러오거나 지표를 다시 계산하지 않으며
+window 시작부터 지표가 채워져 있으므로 warm-up 구간도 잘리지 않는다.
+
+    train 구간에서 param_grid의 조합을 모두 실행해서 metric이 가장 좋은 조합을 고르고, 바로 다음 test 구간에서 그 조합을 실행.
+    조합이 하나면 rolling-window 평가 (train/test 구간의 결과 비교).
+
+    param_grid = {'strategy_list': [strategy_list_a, strategy_list_b], 'max_strategy_cnt': [3, 5]}
+    df_result = run_walk_forward(param_grid, datalist, train_size=24 * 180, test_size=24 * 30, max_workers=4)
+
+train, test window는 sweep.py와 같이 ProcessPoolExecutor로 병렬 실행하고, 준비된 데이터는 shared memory에 한 번만 올린다.
+"""
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List
+
+from backtester import Backtesting
+from columnar import ColumnarFrame
+from sweep import _WORKER_DATA, _init_worker, evaluate, make_param_combinations, share_datalist
+
+
+def make_windows(length: int, train_size: int, test_size: int, step: int = None, anchored: bool = False) -> List[Dict[str, int]]:
+    """bar 위치 기준 [train_start, train_end), [test_start, test_end) window 목록.
+
+    Args:
+        length (int): 전체 bar 수
+        train_size (int): train 구간 bar 수. anchored=True면 첫 window의 train 구간 bar 수
+        test_size (int): test 구간 bar 수
+        step (int, optional): window 이동 bar 수. Defaults to None (test_size, test 구간이 겹치지 않음).
+        anchored (bool, optional): train 시작을 0으로 고정 (expanding window). Defaults to False.
+    """
+    assert train_size > 0 and test_size > 0, 'train_size and test_size must be > 0'
+    step = test_size if step is None else step
+    assert step > 0, 'step must be > 0'
+
+    windows = []
+    train_end = train_size
+    while train_end + test_size <= length:
+        windows.append({'train_start': 0 if anchored else train_end - train_size
+                        , 'train_end': train_end
+                        , 'test_start': train_end
+                        , 'test_end': train_end + test_size})
+        train_end += step
+    return windows
+
+
+def prepare_datalist(param_grid: Dict[str, list], datalist: List[Dict[str, pd.DataFrame]], **kwargs) -> List[Dict[str, ColumnarFrame]]:
+    """param_grid의 모든 strategy_list가 필요로 하는 지표를 전체 기간에 대해 한 번 계산 (Backtesting.ready_data)"""
+    strategy_list = [strategy for candidate in param_grid['strategy_list'] for strategy in candidate]
+    return Backtesting(strategy_list, **kwargs).ready_data(datalist)
+
+
+def shareable_datalist(prepared: List[Dict[str, ColumnarFrame]]) -> List[Dict]:
+    """share_datalist 입력 형태로 변환. 모든 컬럼이 memory-map이면 frame 그대로 (worker가 같은 파일을 map)"""
+    datalist = []
+    for data_info in prepared:
+        for asset, frame in data_info.items():
+            if set(frame.sources) == set(frame.columns):
+                datalist.append({asset: frame})
+            else:
+                datalist.append({asset: pd.DataFrame(frame.columns, copy=False)})
+    return datalist
+
+
+# worker process에서 준비된 데이터로 만든 ColumnarFrame (window는 이 frame의 slice)
+_WORKER_FRAMES = []
+
+
+def worker_frames() -> List[Dict[str, ColumnarFrame]]:
+    """worker에 attach한 준비된 데이터 (shared memory view)"""
+    return [{asset: columns if isinstance(columns, ColumnarFrame) else ColumnarFrame(pd.DataFrame(columns, copy=False))
+             for asset, columns in data_info.items()} for data_info in _WORKER_DATA]
+
+
+def _run_window_task(task):
+    task_idx, params, start, end, event_driven = task
+    if not _WORKER_FRAMES:
+        _WORKER_FRAMES.append(worker_frames())
+    datalist = [{asset: frame.slice(start, end) for asset, frame in data_info.items()} for data_info in _WORKER_FRAMES[0]]
+
+    backtester = Backtesting(**params)
+    backtester.run_prepared(datalist, event_driven=event_driven, progress=False)
+    return task_idx, evaluate(backtester)
+
+
+def run_walk_forward(param_grid: Dict[str, list]
+                     , datalist: List[Dict[str, pd.DataFrame]]
+                     , train_size: int
+                     , test_size: int
+                     , step: int = None
+                     , anchored: bool = False
+                     , metric: str = 'final_balance'
+                     , maximize: bool = True
+                     , max_workers: int = None
+                     , event_driven: bool = False
+                     , chunksize: int = 1
+                     , **kwargs) -> pd.DataFrame:
+    """walk-forward 평가. window별 train 최적 조합과 test 결과를 하나의 테이블로 반환.
+
+    Args:
+        param_grid (dict): Backtesting 인자 이름 -> 후보 값 리스트. 'strategy_list'는 필수 (sweep.run_sweep과 같음).
+        datalist (list): Backtesting.run에 전달하는 형태의 데이터 [{'BTCUSDT': pd.DataFrame}, ...]
+        train_size, test_size, step, anchored: make_windows 참고. bar 수는 warm-up을 제외한 준비된 데이터 기준.
+        metric (str, optional): train 구간에서 조합을 고르는 기준 (evaluate 결과의 key). Defaults to 'final_balance'.
+        maximize (bool, optional): metric이 클수록 좋은지 (max_drawdown이면 False). Defaults to True.
+        max_workers (int, optional): worker process 개수. Defaults to None (cpu 개수).
+        event_driven (bool, optional): Backtesting.run의 event_driven 옵션. Defaults to False.
+        chunksize (int, optional): executor.map chunksize. Defaults to 1.
+        **kwargs: 지표 계산에 사용할 Backtesting 인자 (indicator_cache, timeframe, mmap_dir)
+
+    Returns:
+        pd.DataFrame: window별 train/test 구간 Date, 선택한 조합의 파라미터 (strategy_list는 위치),
+                      train_<결과>, test_<결과> (sweep.evaluate의 final_balance, trade_count, max_drawdown, sharpe, ...)
+    """
+    assert 'strategy_list' in param_grid, 'param_grid must contain strategy_list'
+    combinations = make_param_combinations(param_grid)
+    prepared = prepare_datalist(param_grid, datalist, **kwargs)
+    dates = np.asarray(next(iter(prepared[0].values()))['Date'])
+    windows = make_windows(len(dates), train_size, test_size, step=step, anchored=anchored)
+
+    shm_list, specs = share_datalist(shareable_datalist(prepared))
+    try:
+        # (1) 모든 window의 train 구간 x 조합
+        train_tasks = [(widx * len(combinations) + combo_idx, params, window['train_start'], window['train_end'], event_driven)
+                       for widx, window in enumerate(windows) for combo_idx, params in enumerate(combinations)]
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(specs, None)) as executor:
+            train_results = dict(executor.map(_run_window_task, train_tasks, chunksize=chunksize))
+
+            # (2) window별 train metric이 가장 좋은 조합으로 test 구간 실행
+            sign = 1 if maximize else -1
+            best = [max(range(len(combinations)), key=lambda combo_idx: sign * train_results[widx * len(combinations) + combo_idx][metric])
+                    for widx in range(len(windows))]
+            test_tasks = [(widx, combinations[best[widx]], window['test_start'], window['test_end'], event_driven)
+                          for widx, window in enumerate(windows)]
+            test_results = dict(executor.map(_run_window_task, test_tasks, chunksize=chunksize))
+    finally:
+        for shm in shm_list:
+            shm.close()
+            shm.unlink()
+
+    rows = []
+    for widx, window in enumerate(windows):
+        params = combinations[best[widx]]
+        row = {'window': widx
+               , 'train_start': dates[window['train_start']]
+               , 'train_end': dates[window['train_end'] - 1]
+               , 'test_start': dates[window['test_start']]
+               , 'test_end': dates[window['test_end'] - 1]
+               , 'combination': best[widx]}
+        row.update({key: value for key, value in params.items() if key != 'strategy_list'})
+        row['strategy_list'] = next(i for i, candidate in enumerate(param_grid['strategy_list']) if candidate is params['strategy_list'])
+        row.update({f'train_{key}': value for key, value in train_results[widx * len(combinations) + best[widx]].items()})
+        row.update({f'test_{key}': value for key, value in test_results[widx].items()})
+        rows.append(row)
+    return pd.DataFrame(rows)